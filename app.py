@@ -12,11 +12,11 @@ import logging
 import uuid
 from typing import Optional, List, Dict, Any
 from datetime import datetime
-from contextlib import asynccontextmanager
+from contextlib import aclosing, asynccontextmanager
 from urllib.parse import unquote
 
 from fastapi import FastAPI, Request, HTTPException, Depends, Header
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, Response
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.exceptions import RequestValidationError
 from fastapi import status
@@ -27,7 +27,12 @@ from sse_starlette.sse import EventSourceResponse
 from services.gemini_service import GeminiService
 from services.search_service import SearchService
 from services.cache_service import CacheService
+from services.cache_key_service import CacheKeyService
 from services.content_service import ContentService
+from services.document_service import DocumentService
+from services.generation_cache import GenerationCache
+from services.executor_service import executor_stats, shutdown_executors
+from services.loop_monitor import EventLoopMonitor
 
 # Load environment variables
 load_dotenv()
@@ -61,9 +66,15 @@ if not API_BEARER_TOKEN:
 
 # Initialize services
 gemini_service = GeminiService()
-search_service = SearchService()
+# One fetch/parse layer (and document cache) shared by search and content
+document_service = DocumentService()
 cache_service = CacheService()
-content_service = ContentService()
+cache_key_service = CacheKeyService()
+# Generations keyed by article content hash, shared across URLs and content_ids
+generation_cache = GenerationCache(cache_service, cache_key_service)
+search_service = SearchService(document_service=document_service, generation_cache=generation_cache)
+content_service = ContentService(document_service=document_service)
+loop_monitor = EventLoopMonitor()
 
 
 async def verify_bearer_token(authorization: str = Header(default=None)) -> None:
@@ -92,9 +103,16 @@ async def verify_bearer_token(authorization: str = Header(default=None)) -> None
 async def lifespan(app: FastAPI):
     # Startup
     logger.info("Starting AIGC MVP API Server")
+    cache_service.start_sweeper()
+    loop_monitor.start()
     yield
     # Shutdown
     logger.info("Shutting down AIGC MVP API Server")
+    await cache_service.stop_sweeper()
+    await loop_monitor.stop()
+    # Also closes the shared document service
+    await content_service.close()
+    shutdown_executors()
 
 app = FastAPI(
     title="AIGC MVP API",
@@ -157,20 +175,62 @@ class GetAnswerRequest(BaseModel):
     user: str = "uuid_user"
     stream: Optional[bool] = False
 
+# Soft TTLs (seconds) of each endpoint's responses; generations reused
+# across URLs/content_ids for the same article use the same TTL. A response
+# refresh recomputes a stale generation instead of storing it again
+QUESTIONS_CACHE_TTL = 600
+METADATA_CACHE_TTL = 3600
+ANSWER_CACHE_TTL = 300
+
 # Helper functions
 
 def generate_uuid(key: str) -> str:
     """Generate UUID from key string"""
     return hashlib.sha256(key.encode()).hexdigest()
 
-def get_cache_key(endpoint: str, inputs: Dict, user: str = "") -> str:
-    """Generate cache key for endpoint (sanitized for filesystem compatibility)"""
-    key_parts = [endpoint, json.dumps(inputs, sort_keys=True), user]
-    key = ":".join(key_parts)
-    # Use hash only to avoid invalid filesystem characters on Windows/Linux
-    hash_key = hashlib.sha256(key.encode()).hexdigest()
-    # Sanitize: replace colons with underscores for filesystem compatibility
-    return f"ai_{endpoint}_{hash_key}"
+def get_cache_key(endpoint: str, inputs: Dict, scope: Optional[Dict] = None) -> str:
+    """
+    Generate cache key for endpoint (sanitized for filesystem compatibility)
+    
+    URLs in inputs are canonicalized; of the request fields in scope (user,
+    type, ...) only those configured via CACHE_KEY_SCOPES split the key.
+    """
+    return cache_key_service.build(endpoint, inputs, scope)
+
+def render_json(content: Any) -> bytes:
+    """Render content exactly as JSONResponse would"""
+    return json.dumps(
+        content,
+        ensure_ascii=False,
+        allow_nan=False,
+        indent=None,
+        separators=(",", ":")
+    ).encode("utf-8")
+
+async def cached_json_response(cache_key: str, build_response, ttl: int) -> Response:
+    """
+    Serve an endpoint response through the cache as pre-rendered JSON bytes
+    
+    The rendered body is what gets cached, so a hit is returned as-is with
+    no JSON decoding or re-encoding. On a miss, identical requests (here and
+    on other instances) share one build_response call.
+    
+    Args:
+        cache_key: Key from get_cache_key
+        build_response: Coroutine function producing the response dict
+        ttl: Soft TTL in seconds
+        
+    Returns:
+        Response with the JSON body
+    """
+    async def build_body() -> bytes:
+        return render_json(await build_response())
+    
+    body = await cache_service.get_or_compute(cache_key, build_body, ttl=ttl)
+    if isinstance(body, (bytes, bytearray, memoryview)):
+        return Response(content=bytes(body), media_type="application/json")
+    # Entries cached as decoded JSON by earlier releases
+    return JSONResponse(content=body)
 
 # Endpoints
 
@@ -214,84 +274,98 @@ async def generate_questions(request: GenerateQuestionsRequest):
                 "url": inputs.url or "",
                 "context": inputs.context or "",
                 "lang": inputs.lang,
+                "prompt": inputs.prompt or "",
+                "previous_questions": inputs.previous_questions or []
+            },
+            {
+                "user": request.user,
                 "type": request.type or "",
                 "source_url": request.source_url or ""
-            },
-            request.user
-        )
-        
-        # Check cache
-        cached_result = await cache_service.get(cache_key)
-        if cached_result:
-            logger.info(f"Cache hit for questions: {cache_key[:20]}...")
-            return JSONResponse(content=cached_result)
-        
-        # Get content if URL provided
-        content_text = inputs.context
-        if inputs.url and not content_text:
-            content_text = await content_service.fetch_content(inputs.url)
-        
-        # Generate questions using Gemini
-        questions_result = await gemini_service.generate_questions(
-            content=content_text or "",
-            lang=inputs.lang or "zh-tw",
-            max_questions=5,
-            previous_questions=inputs.previous_questions or [],
-            custom_prompt=inputs.prompt
+            }
         )
         
-        # Generate content_id if not provided
-        content_id = questions_result.get("content_id")
-        if not content_id:
-            # Generate content_id from context or URL
-            content_source = inputs.context or inputs.url or ""
-            if content_source:
-                content_id = await content_service.reserve_content_id_from_url(content_source)
-            else:
-                content_id = str(uuid.uuid4())
-        
-        # Save content with content_id for later retrieval
-        if content_text:
-            await content_service.save_content(content_id, content_text, inputs.url or request.source_url)
-        
-        # Convert questions array to object format (question_1, question_2, etc.)
-        questions_list = questions_result.get("questions", [])
-        questions_dict = {}
-        for i, question in enumerate(questions_list, 1):
-            # Extract question text - handle both dict and string formats
-            if isinstance(question, dict):
-                question_text = question.get("text", question.get("question", str(question)))
-            else:
-                question_text = str(question)
-            questions_dict[f"question_{i}"] = question_text
-        
-        # Calculate timestamps
-        created_at = int(start_time)
-        finished_at = int(time.time())
-        elapsed_time = time.time() - start_time
-        
-        # Generate task_id
-        task_id = str(uuid.uuid4())
-        
-        # Build response matching expected format
-        response = {
-            "task_id": task_id,
-            "data": {
-                "status": "succeeded",
-                "outputs": {
-                    "result": questions_dict,
-                    "content_id": content_id
+        async def build_response() -> Dict[str, Any]:
+            # Get content if URL provided
+            content_text = inputs.context
+            if inputs.url and not content_text:
+                content_text = await content_service.fetch_content(inputs.url)
+            
+            # Generate questions using Gemini (shared by every source with
+            # the same article text)
+            async def generate() -> Dict[str, Any]:
+                return await gemini_service.generate_questions(
+                    content=content_text or "",
+                    lang=inputs.lang or "zh-tw",
+                    max_questions=5,
+                    previous_questions=inputs.previous_questions or [],
+                    custom_prompt=inputs.prompt
+                )
+            
+            questions_result = await generation_cache.get_or_generate(
+                "questions",
+                content_text or "",
+                {
+                    "lang": inputs.lang or "zh-tw",
+                    "previous_questions": inputs.previous_questions or [],
+                    "prompt": inputs.prompt or ""
                 },
-                "elapsed_time": elapsed_time,
-                "created_at": created_at,
-                "finished_at": finished_at
+                generate,
+                ttl=QUESTIONS_CACHE_TTL
+            )
+            
+            # Generate content_id if not provided
+            content_id = questions_result.get("content_id")
+            if not content_id:
+                # Generate content_id from context or URL
+                content_source = inputs.context or inputs.url or ""
+                if content_source:
+                    content_id = await content_service.reserve_content_id_from_url(content_source)
+                else:
+                    content_id = str(uuid.uuid4())
+            
+            # Save content with content_id for later retrieval
+            if content_text:
+                await content_service.save_content(content_id, content_text, inputs.url or request.source_url)
+            
+            # Convert questions array to object format (question_1, question_2, etc.)
+            questions_list = questions_result.get("questions", [])
+            questions_dict = {}
+            for i, question in enumerate(questions_list, 1):
+                # Extract question text - handle both dict and string formats
+                if isinstance(question, dict):
+                    question_text = question.get("text", question.get("question", str(question)))
+                else:
+                    question_text = str(question)
+                questions_dict[f"question_{i}"] = question_text
+            
+            # Calculate timestamps
+            created_at = int(start_time)
+            finished_at = int(time.time())
+            elapsed_time = time.time() - start_time
+            
+            # Generate task_id
+            task_id = str(uuid.uuid4())
+            
+            # Build response matching expected format
+            response = {
+                "task_id": task_id,
+                "data": {
+                    "status": "succeeded",
+                    "outputs": {
+                        "result": questions_dict,
+                        "content_id": content_id
+                    },
+                    "elapsed_time": elapsed_time,
+                    "created_at": created_at,
+                    "finished_at": finished_at
+                }
             }
-        }
-        
-        # Cache result (10 minutes)
-        await cache_service.set(cache_key, response, ttl=600)
+            
+            return response
         
-        return JSONResponse(content=response)
+        # Check cache; on a miss identical requests (here and on other
+        # instances) share one generation, cached for 10 minutes
+        return await cached_json_response(cache_key, build_response, ttl=QUESTIONS_CACHE_TTL)
         
     except ValueError as e:
         # Location restriction, connection timeout, or configuration error
@@ -346,73 +420,69 @@ async def get_metadata(request: GetMetadataRequest):
         # Generate cache key
         cache_key = get_cache_key(
             "metadata",
-            {"url": inputs.url, "query": inputs.query or ""},
-            request.user
+            {"url": inputs.url, "query": inputs.query or "", "tag_prompt": inputs.tag_prompt or ""},
+            {"user": request.user}
         )
         
-        # Check cache
-        cached_result = await cache_service.get(cache_key)
-        if cached_result:
-            logger.info(f"Cache hit for metadata: {cache_key[:20]}...")
-            return JSONResponse(content=cached_result)
-        
-        # Fetch content and metadata
-        metadata_result = await search_service.get_metadata(
-            url=inputs.url,
-            query=inputs.query or "",
-            tag_prompt=inputs.tag_prompt
-        )
-        
-        # Calculate timestamps
-        created_at = int(start_time)
-        finished_at = int(time.time())
-        elapsed_time = time.time() - start_time
-        
-        # Generate task_id
-        task_id = str(uuid.uuid4())
-        
-        # Format tag (single string, not array)
-        tags_list = metadata_result.get("tags", [])
-        tag = ", ".join(tags_list) if tags_list else ""
-        
-        # Format images as nested JSON string
-        images_list = metadata_result.get("images", [])
-        images_json = json.dumps({"images": images_list}, ensure_ascii=False, indent=2)
-        images_output = [{"images": images_json}] if images_list else [{"images": json.dumps({"images": []}, ensure_ascii=False)}]
-        
-        # Format sources as nested JSON string with citations
-        sources_list = metadata_result.get("sources", [])
-        citations = [
-            {
-                "title": s.get("title", ""),
-                "url": s.get("url", ""),
-                "content": s.get("snippet", "")
-            }
-            for s in sources_list
-        ]
-        sources_json = json.dumps({"citations": citations}, ensure_ascii=False, indent=2)
-        sources_output = [{"sources": sources_json}] if citations else [{"sources": json.dumps({"citations": []}, ensure_ascii=False)}]
-        
-        # Build response matching Vext API format from spec
-        response = {
-            "task_id": task_id,
-            "data": {
-                "status": "succeeded",
-                "outputs": {
-                    "tag": tag,
-                    "images": images_output,
-                    "sources": sources_output
-                },
-                "elapsed_time": elapsed_time,
-                "created_at": created_at,
-                "finished_at": finished_at
+        async def build_response() -> Dict[str, Any]:
+            # Fetch content and metadata
+            metadata_result = await search_service.get_metadata(
+                url=inputs.url,
+                query=inputs.query or "",
+                tag_prompt=inputs.tag_prompt
+            )
+            
+            # Calculate timestamps
+            created_at = int(start_time)
+            finished_at = int(time.time())
+            elapsed_time = time.time() - start_time
+            
+            # Generate task_id
+            task_id = str(uuid.uuid4())
+            
+            # Format tag (single string, not array)
+            tags_list = metadata_result.get("tags", [])
+            tag = ", ".join(tags_list) if tags_list else ""
+            
+            # Format images as nested JSON string
+            images_list = metadata_result.get("images", [])
+            images_json = json.dumps({"images": images_list}, ensure_ascii=False, indent=2)
+            images_output = [{"images": images_json}] if images_list else [{"images": json.dumps({"images": []}, ensure_ascii=False)}]
+            
+            # Format sources as nested JSON string with citations
+            sources_list = metadata_result.get("sources", [])
+            citations = [
+                {
+                    "title": s.get("title", ""),
+                    "url": s.get("url", ""),
+                    "content": s.get("snippet", "")
+                }
+                for s in sources_list
+            ]
+            sources_json = json.dumps({"citations": citations}, ensure_ascii=False, indent=2)
+            sources_output = [{"sources": sources_json}] if citations else [{"sources": json.dumps({"citations": []}, ensure_ascii=False)}]
+            
+            # Build response matching Vext API format from spec
+            response = {
+                "task_id": task_id,
+                "data": {
+                    "status": "succeeded",
+                    "outputs": {
+                        "tag": tag,
+                        "images": images_output,
+                        "sources": sources_output
+                    },
+                    "elapsed_time": elapsed_time,
+                    "created_at": created_at,
+                    "finished_at": finished_at
+                }
             }
-        }
-        
-        # Cache result (1 hour)
-        await cache_service.set(cache_key, response, ttl=3600)
+            
+            return response
         
-        return JSONResponse(content=response)
+        # Check cache; on a miss identical requests (here and on other
+        # instances) share one fetch/generation, cached for 1 hour
+        return await cached_json_response(cache_key, build_response, ttl=METADATA_CACHE_TTL)
         
     except ValueError as e:
         # Location restriction, connection timeout, or configuration error
@@ -465,15 +535,18 @@ async def get_answer(request: GetAnswerRequest):
                 detail="Query is required"
             )
         
-        # If content_id provided, fetch content; otherwise use URL
-        content_text = ""
-        if inputs.content_id:
-            content_text = await content_service.get_content(inputs.content_id)
-        elif inputs.url:
-            content_text = await content_service.fetch_content(inputs.url)
+        async def load_content() -> str:
+            # If content_id provided, fetch content; otherwise use URL
+            if inputs.content_id:
+                return await content_service.get_content(inputs.content_id)
+            elif inputs.url:
+                return await content_service.fetch_content(inputs.url)
+            return ""
 
         # Streaming response
         if request.stream:
+            content_text = await load_content()
+            
             async def stream_answer():
                 try:
                     # Send workflow event
@@ -484,16 +557,19 @@ async def get_answer(request: GetAnswerRequest):
                     yield f"event: workflow_started\ndata: {event_data}\n\n"
                     
                     # Stream answer from Gemini
+                    # Closed with this generator when the client disconnects,
+                    # releasing its Gemini concurrency slot right away
                     full_answer = ""
-                    async for chunk in gemini_service.stream_answer(
+                    async with aclosing(gemini_service.stream_answer(
                         content=content_text,
                         question=inputs.query,
                         prompt=inputs.prompt or "",
                         lang=inputs.lang or "zh-tw"
-                    ):
-                        full_answer += chunk
-                        chunk_data = json.dumps({"chunk": chunk})
-                        yield f"event: token_chunk\ndata: {chunk_data}\n\n"
+                    )) as answer_stream:
+                        async for chunk in answer_stream:
+                            full_answer += chunk
+                            chunk_data = json.dumps({"chunk": chunk})
+                            yield f"event: token_chunk\ndata: {chunk_data}\n\n"
                     
                     # Extract citations
                     citations = await gemini_service.extract_citations(
@@ -535,53 +611,67 @@ async def get_answer(request: GetAnswerRequest):
                     "query": inputs.query,
                     "content_id": inputs.content_id or "",
                     "url": inputs.url or "",
-                    "lang": inputs.lang
+                    "lang": inputs.lang,
+                    "prompt": inputs.prompt or ""
                 },
-                request.user
-            )
-            
-            # Check cache
-            cached_result = await cache_service.get(cache_key)
-            if cached_result:
-                logger.info(f"Cache hit for answer: {cache_key[:20]}...")
-                return JSONResponse(content=cached_result)
-            
-            # Generate answer
-            answer_result = await gemini_service.generate_answer(
-                content=content_text,
-                question=inputs.query,
-                prompt=inputs.prompt or "",
-                lang=inputs.lang or "zh-tw",
-                max_tokens=800
+                {"user": request.user}
             )
             
-            # Calculate timestamps
-            created_at = int(start_time)
-            finished_at = int(time.time())
-            elapsed_time = time.time() - start_time
-            
-            # Generate task_id
-            task_id = str(uuid.uuid4())
-            
-            # Build response matching Vext API format from spec
-            response = {
-                "event": "workflow_finished",
-                "task_id": task_id,
-                "data": {
-                    "status": "succeeded",
-                    "outputs": {
-                        "result": answer_result.get("answer", "")
+            async def build_response() -> Dict[str, Any]:
+                # Content is only needed on a cache miss
+                content_text = await load_content()
+                
+                # Generate answer (shared by every content_id/URL with the
+                # same article text)
+                async def generate() -> Dict[str, Any]:
+                    return await gemini_service.generate_answer(
+                        content=content_text,
+                        question=inputs.query,
+                        prompt=inputs.prompt or "",
+                        lang=inputs.lang or "zh-tw",
+                        max_tokens=800
+                    )
+                
+                answer_result = await generation_cache.get_or_generate(
+                    "answer",
+                    content_text,
+                    {
+                        "query": inputs.query,
+                        "prompt": inputs.prompt or "",
+                        "lang": inputs.lang or "zh-tw"
                     },
-                    "elapsed_time": elapsed_time,
-                    "created_at": created_at,
-                    "finished_at": finished_at
+                    generate,
+                    ttl=ANSWER_CACHE_TTL
+                )
+                
+                # Calculate timestamps
+                created_at = int(start_time)
+                finished_at = int(time.time())
+                elapsed_time = time.time() - start_time
+                
+                # Generate task_id
+                task_id = str(uuid.uuid4())
+                
+                # Build response matching Vext API format from spec
+                response = {
+                    "event": "workflow_finished",
+                    "task_id": task_id,
+                    "data": {
+                        "status": "succeeded",
+                        "outputs": {
+                            "result": answer_result.get("answer", "")
+                        },
+                        "elapsed_time": elapsed_time,
+                        "created_at": created_at,
+                        "finished_at": finished_at
+                    }
                 }
-            }
-            
-            # Cache result (5 minutes)
-            await cache_service.set(cache_key, response, ttl=300)
+                
+                return response
             
-            return JSONResponse(content=response)
+            # Check cache; on a miss identical requests (here and on other
+            # instances) share one generation, cached for 5 minutes
+            return await cached_json_response(cache_key, build_response, ttl=ANSWER_CACHE_TTL)
             
     except ValueError as e:
         # Location restriction, connection timeout, or configuration error
@@ -626,6 +716,20 @@ async def health_check():
     """Health check endpoint"""
     return {"status": "healthy", "timestamp": datetime.utcnow().isoformat()}
 
+@app.get("/metrics", dependencies=[Depends(verify_bearer_token)])
+async def metrics():
+    """Internal performance metrics (executor queues, event-loop lag, cache and request coalescing)"""
+    return {
+        "executors": executor_stats(),
+        "event_loop": loop_monitor.stats(),
+        "cache": cache_service.stats(),
+        "cache_keys": cache_key_service.stats(),
+        "documents": document_service.stats(),
+        "content": content_service.stats(),
+        "generation": generation_cache.stats(),
+        "timestamp": datetime.utcnow().isoformat()
+    }
+
 # if __name__ == "__main__":
 #     import uvicorn
 #     uvicorn.run(app, host="0.0.0.0", port=8888)
@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark cache entry formats on representative endpoint payloads
+
+Compares the legacy JSON text entries with the binary codec for each
+available serializer and compression setting, reporting stored bytes and
+encode/decode time per entry for generateQuestions, getMetadata and
+getAnswer responses.
+
+Usage:
+    python benchmarks/bench_cache_codec.py --iterations 2000
+"""
+
+import argparse
+import json
+import math
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.cache_codec import CacheCodec, msgpack, orjson, zstandard  # noqa: E402
+from services.cache_service import ENTRY_MARKER  # noqa: E402
+
+PARAGRAPH = (
+    "台積電今日公布第三季財報，營收與獲利雙雙創下歷史新高，法人預期先進製程需求將持續成長。"
+    "The company also raised its full-year guidance, citing strong AI accelerator demand. "
+)
+
+
+def payloads() -> dict:
+    """Responses shaped like app.py builds them"""
+    images = [{"url": f"https://cdn.example.com/news/{i}.jpg", "alt": f"圖片 {i}"} for i in range(12)]
+    citations = [
+        {"title": f"相關新聞 {i}", "url": f"https://news.example.com/article/{i}", "snippet": PARAGRAPH[:120]}
+        for i in range(8)
+    ]
+    return {
+        "generateQuestions": {
+            "content_id": "a" * 32,
+            "questions": [{"question": f"這篇文章的第 {i} 個重點是什麼？"} for i in range(5)],
+        },
+        "getMetadata": {
+            "images": [{"images": json.dumps({"images": images}, ensure_ascii=False, indent=2)}],
+            "sources": [{"sources": json.dumps({"citations": citations}, ensure_ascii=False, indent=2)}],
+            "tag": "財經, 半導體, AI",
+        },
+        "getAnswer": {
+            "answer": PARAGRAPH * 12,
+            "sources": [{"title": c["title"], "url": c["url"]} for c in citations[:4]],
+        },
+    }
+
+
+def legacy_encode(value):
+    return json.dumps({
+        ENTRY_MARKER: 1, "value": value, "stale_at": time.time(), "expires_at": math.inf, "delta": 0.5,
+    }).encode()
+
+
+def legacy_decode(data):
+    return json.loads(data)["value"]
+
+
+def formats() -> dict:
+    serializers = ["json"] + (["orjson"] if orjson else []) + (["msgpack"] if msgpack else [])
+    compressions = ["none", "zlib"] + (["zstd"] if zstandard else [])
+    result = {"legacy-json": (legacy_encode, legacy_decode)}
+    for serializer in serializers:
+        for compression in compressions:
+            codec = CacheCodec(serializer=serializer, compression=compression, compress_min_bytes=1024)
+            result[f"{serializer}+{compression}"] = (
+                lambda value, codec=codec: codec.encode(value, time.time(), math.inf, 0.5),
+                lambda data, codec=codec: codec.decode(data)[0],
+            )
+    return result
+
+
+def measure(encode, decode, value, iterations: int) -> tuple:
+    data = encode(value)
+    assert decode(data) == value
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        encode(value)
+    encode_us = (time.perf_counter() - start) / iterations * 1e6
+
+    start = time.perf_counter()
+    for _ in range(iterations):
+        decode(data)
+    decode_us = (time.perf_counter() - start) / iterations * 1e6
+    return len(data), encode_us, decode_us
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--iterations", type=int, default=2000, help="encode/decode calls per measurement")
+    args = parser.parse_args()
+
+    print(f"{'endpoint':<18} {'format':<16} {'bytes':>8} {'encode us':>10} {'decode us':>10}")
+    for endpoint, value in payloads().items():
+        for name, (encode, decode) in formats().items():
+            size, encode_us, decode_us = measure(encode, decode, value, args.iterations)
+            print(f"{endpoint:<18} {name:<16} {size:>8} {encode_us:>10.1f} {decode_us:>10.1f}")
+        print()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+#!/usr/bin/env python3
+"""
+Benchmark disk cache tiers (one file per key, log-structured segments, SQLite WAL)
+
+Writes N entries of a fixed size through each store, then reads random
+keys with a fixed concurrency, the way CacheService does when Redis is
+down and the L1 tier misses. Reports write/read throughput, read latency,
+sweep time and on-disk footprint (files and allocated bytes).
+
+Usage:
+    python benchmarks/bench_cache_stores.py --entries 20000 --value-bytes 2048
+"""
+
+import argparse
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from services.file_cache_store import FileCacheStore  # noqa: E402
+from services.log_cache_store import LogCacheStore  # noqa: E402
+from services.sqlite_cache_store import SQLiteCacheStore  # noqa: E402
+
+STORES = {
+    "file": lambda root: FileCacheStore(root / "file", max_bytes=0),
+    "log": lambda root: LogCacheStore(root / "log", max_bytes=0),
+    "sqlite": lambda root: SQLiteCacheStore(root / "sqlite" / "cache.sqlite3", max_bytes=0),
+}
+
+
+def disk_usage(path: Path) -> tuple:
+    files = 0
+    allocated = 0
+    for p in path.rglob("*"):
+        if p.is_file():
+            files += 1
+            allocated += p.stat().st_blocks * 512
+    return files, allocated
+
+
+async def run_store(name: str, root: Path, entries: int, value_bytes: int, reads: int,
+                    concurrency: int) -> dict:
+    store = STORES[name](root)
+    keys = [f"ai_{i:016x}" for i in range(entries)]
+    value = os.urandom(value_bytes // 2).hex().encode()
+    expires_at = time.time() + 3600
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def bounded(coro):
+        async with semaphore:
+            return await coro
+
+    start = time.perf_counter()
+    await asyncio.gather(*[bounded(store.set(key, value, expires_at)) for key in keys])
+    write_s = time.perf_counter() - start
+
+    latencies = []
+
+    async def one_read(key):
+        async with semaphore:
+            t = time.perf_counter()
+            data = await store.get(key)
+            latencies.append(time.perf_counter() - t)
+            assert data == value
+
+    sample = [random.choice(keys) for _ in range(reads)]
+    start = time.perf_counter()
+    await asyncio.gather(*[one_read(key) for key in sample])
+    read_s = time.perf_counter() - start
+    latencies.sort()
+
+    start = time.perf_counter()
+    await store.sweep()
+    sweep_s = time.perf_counter() - start
+
+    await store.close()
+    files, allocated = disk_usage(root / name)
+    return {
+        "store": name,
+        "write_ops": entries / write_s,
+        "read_ops": reads / read_s,
+        "p50_us": latencies[len(latencies) // 2] * 1e6,
+        "p99_us": latencies[int(len(latencies) * 0.99) - 1] * 1e6,
+        "sweep_ms": sweep_s * 1000,
+        "files": files,
+        "disk_mb": allocated / (1024 * 1024),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--entries", type=int, default=20000, help="entries written per store")
+    parser.add_argument("--value-bytes", type=int, default=2048, help="size of each entry")
+    parser.add_argument("--reads", type=int, default=50000, help="random reads per store")
+    parser.add_argument("--concurrency", type=int, default=64, help="in-flight operations")
+    parser.add_argument("--stores", default=",".join(STORES), help="comma-separated stores to run")
+    args = parser.parse_args()
+
+    print(f"{args.entries} entries x {args.value_bytes} bytes, {args.reads} reads, concurrency {args.concurrency}")
+    print(
+        f"{'store':<8} {'writes/s':>10} {'reads/s':>10} {'p50 us':>9} {'p99 us':>9} "
+        f"{'sweep ms':>9} {'files':>7} {'disk MB':>8}"
+    )
+    for name in args.stores.split(","):
+        with tempfile.TemporaryDirectory() as tmp:
+            result = asyncio.run(run_store(
+                name, Path(tmp), args.entries, args.value_bytes, args.reads, args.concurrency
+            ))
+        print(
+            f"{result['store']:<8} {result['write_ops']:>10.0f} {result['read_ops']:>10.0f} "
+            f"{result['p50_us']:>9.0f} {result['p99_us']:>9.0f} {result['sweep_ms']:>9.1f} "
+            f"{result['files']:>7} {result['disk_mb']:>8.1f}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark event-loop lag while article pages are fetched and parsed
+
+Serves a corpus of saved pages through a mock HTTP transport and fetches
+them through DocumentService while an EventLoopMonitor samples how late
+the loop runs. Each DOM backend is measured parsing on the event loop
+(before) and in the parse process pool (after), next to the incremental
+stream backend.
+
+Usage:
+    python benchmarks/bench_event_loop_lag.py --pad-paragraphs 3000 --pages 100
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_html_extractors import DEFAULT_CORPUS, load_corpus  # noqa: E402
+from services.document_service import DocumentService  # noqa: E402
+from services.executor_service import shutdown_executors  # noqa: E402
+from services.html_extractor import EXTRACTORS  # noqa: E402
+from services.loop_monitor import EventLoopMonitor  # noqa: E402
+
+# mode -> (HTML_PARSER_BACKEND, parse bodies of at least this many bytes in the pool)
+MODES = {
+    "bs4 inline": ("bs4", sys.maxsize),
+    "bs4 pool": ("bs4", 16384),
+    "lxml inline": ("lxml", sys.maxsize),
+    "lxml pool": ("lxml", 16384),
+    "stream": ("stream", sys.maxsize),
+}
+
+
+async def run_mode(backend: str, inline_bytes: int, bodies: list, pages: int, concurrency: int) -> dict:
+    os.environ["HTML_PARSER_BACKEND"] = backend
+    os.environ["DOCUMENT_PARSE_INLINE_BYTES"] = str(inline_bytes)
+
+    async def handler(request):
+        index = int(request.url.path.rsplit("/", 1)[1])
+        return httpx.Response(200, content=bodies[index % len(bodies)], headers={"content-type": "text/html"})
+
+    documents = DocumentService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+    # Warm the process pool (worker spawn and imports) outside the measurement
+    await documents.get_document("https://example.com/warmup/0")
+
+    monitor = EventLoopMonitor(interval=0.005)
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(i):
+        async with semaphore:
+            await documents.get_document(f"https://example.com/page/{i}")
+
+    monitor.start()
+    start = time.perf_counter()
+    await asyncio.gather(*[fetch(i) for i in range(pages)])
+    elapsed = time.perf_counter() - start
+    await monitor.stop()
+    await documents.close()
+    return {"pages_per_sec": pages / elapsed, **monitor.stats()}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="directory of saved .html pages")
+    parser.add_argument("--pad-paragraphs", type=int, default=3000, help="filler paragraphs appended to every page")
+    parser.add_argument("--pages", type=int, default=100, help="page fetches per mode")
+    parser.add_argument("--concurrency", type=int, default=8, help="concurrent fetches")
+    args = parser.parse_args()
+
+    bodies = [html.encode() for _, html in load_corpus(args.corpus, args.pad_paragraphs)]
+    average_kib = sum(len(body) for body in bodies) / len(bodies) / 1024
+    print(f"{len(bodies)} pages, {average_kib:.0f} KiB average, {args.pages} fetches per mode\n")
+
+    print(f"{'mode':<12} {'pages/s':>8} {'p50 lag ms':>11} {'p99 lag ms':>11} {'max lag ms':>11}")
+    for mode, (backend, inline_bytes) in MODES.items():
+        if backend not in EXTRACTORS:
+            continue
+        result = asyncio.run(run_mode(backend, inline_bytes, bodies, args.pages, args.concurrency))
+        print(
+            f"{mode:<12} {result['pages_per_sec']:>8.1f} {result['p50_lag_ms']:>11.1f} "
+            f"{result['p99_lag_ms']:>11.1f} {result['max_lag_ms']:>11.1f}"
+        )
+    shutdown_executors(wait=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+#!/usr/bin/env python3
+"""
+Benchmark GeminiService backends (async vs executor) against a local fake Gemini endpoint
+
+Starts an in-process gRPC server that implements GenerateContent /
+StreamGenerateContent with a fixed artificial latency, points both the
+synchronous and asyncio Gemini clients at it and fires N concurrent
+generate_answer calls through each backend.
+
+Usage:
+    python benchmarks/bench_gemini_backends.py --requests 500 --latency 0.5
+"""
+
+import argparse
+import asyncio
+import os
+import sys
+import threading
+import time
+
+import grpc
+from google.ai import generativelanguage_v1beta as glm
+from google.ai.generativelanguage_v1beta.services.generative_service.transports import (
+    GenerativeServiceGrpcAsyncIOTransport,
+    GenerativeServiceGrpcTransport,
+)
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("GEMINI_API_KEY", "benchmark_key")
+
+from services.gemini_service import GeminiService  # noqa: E402
+
+SERVICE_NAME = "google.ai.generativelanguage.v1beta.GenerativeService"
+
+
+def _response(text: str) -> glm.GenerateContentResponse:
+    return glm.GenerateContentResponse(
+        candidates=[glm.Candidate(content=glm.Content(parts=[glm.Part(text=text)], role="model"))]
+    )
+
+
+class FakeGeminiServer:
+    """Fake Gemini gRPC endpoint running on its own event loop thread"""
+
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.port = None
+        self._loop = asyncio.new_event_loop()
+        self._started = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    async def _generate(self, request, context):
+        await asyncio.sleep(self.latency)
+        return _response("fake answer")
+
+    async def _stream(self, request, context):
+        for i in range(5):
+            await asyncio.sleep(self.latency / 5)
+            yield _response(f"chunk{i} ")
+
+    async def _serve(self):
+        server = grpc.aio.server(options=[("grpc.max_concurrent_streams", 10000)])
+        handler = grpc.method_handlers_generic_handler(SERVICE_NAME, {
+            "GenerateContent": grpc.unary_unary_rpc_method_handler(
+                self._generate,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+            "StreamGenerateContent": grpc.unary_stream_rpc_method_handler(
+                self._stream,
+                request_deserializer=glm.GenerateContentRequest.deserialize,
+                response_serializer=glm.GenerateContentResponse.serialize,
+            ),
+        })
+        server.add_generic_rpc_handlers((handler,))
+        self.port = server.add_insecure_port("127.0.0.1:0")
+        await server.start()
+        self._started.set()
+        await server.wait_for_termination()
+
+    def _run(self):
+        self._loop.run_until_complete(self._serve())
+
+    def start(self):
+        self._thread.start()
+        self._started.wait()
+        return f"127.0.0.1:{self.port}"
+
+
+def make_service(backend: str, address: str) -> GeminiService:
+    """Build a GeminiService whose SDK clients talk to the fake endpoint"""
+    os.environ["GEMINI_BACKEND"] = backend
+    service = GeminiService()
+    service.model._client = glm.GenerativeServiceClient(
+        transport=GenerativeServiceGrpcTransport(channel=grpc.insecure_channel(address))
+    )
+    service.model._async_client = glm.GenerativeServiceAsyncClient(
+        transport=GenerativeServiceGrpcAsyncIOTransport(channel=grpc.aio.insecure_channel(address))
+    )
+    return service
+
+
+async def run_backend(backend: str, address: str, requests: int) -> dict:
+    service = make_service(backend, address)
+    latencies = []
+
+    async def one_call():
+        start = time.perf_counter()
+        await service.generate_answer(content="benchmark content", question="benchmark?")
+        latencies.append(time.perf_counter() - start)
+
+    # Warm up channels before measuring
+    await one_call()
+    latencies.clear()
+
+    threads_before = threading.active_count()
+    start = time.perf_counter()
+    await asyncio.gather(*[one_call() for _ in range(requests)])
+    wall = time.perf_counter() - start
+    latencies.sort()
+
+    return {
+        "backend": backend,
+        "requests": requests,
+        "wall_s": wall,
+        "throughput_rps": requests / wall,
+        "p50_ms": latencies[len(latencies) // 2] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "extra_threads": threading.active_count() - threads_before,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--requests", type=int, default=500, help="concurrent calls per backend")
+    parser.add_argument("--latency", type=float, default=0.5, help="fake endpoint latency in seconds")
+    args = parser.parse_args()
+
+    address = FakeGeminiServer(args.latency).start()
+    print(f"Fake Gemini endpoint on {address} (latency {args.latency * 1000:.0f} ms)")
+    print(f"{'backend':<10} {'requests':>8} {'wall s':>8} {'req/s':>9} {'p50 ms':>9} {'p99 ms':>9} {'threads':>8}")
+    for backend in ("executor", "async"):
+        result = asyncio.run(run_backend(backend, address, args.requests))
+        print(
+            f"{result['backend']:<10} {result['requests']:>8} {result['wall_s']:>8.2f} "
+            f"{result['throughput_rps']:>9.1f} {result['p50_ms']:>9.1f} {result['p99_ms']:>9.1f} "
+            f"{result['extra_threads']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark HTML extraction backends over a local corpus of article pages
+
+Each backend runs in a fresh process and reports pages/sec and peak memory:
+the Python heap peak from tracemalloc, plus the growth of the process's
+peak RSS, which also counts libxml2's C allocations that tracemalloc does
+not see. Documents from every backend are compared against the first
+backend's documents, and any mismatches are reported.
+
+Usage:
+    python benchmarks/bench_html_extractors.py --corpus ./saved_pages --repeat 20
+    python benchmarks/bench_html_extractors.py --pad-paragraphs 20000 --repeat 2
+"""
+
+import argparse
+import multiprocessing
+import os
+import resource
+import sys
+import time
+import tracemalloc
+from concurrent.futures import ProcessPoolExecutor
+from pathlib import Path
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+from services.html_extractor import EXTRACTORS, get_extractor  # noqa: E402
+
+DEFAULT_CORPUS = os.path.join(ROOT, "tests", "fixtures", "html")
+
+
+def load_corpus(corpus: str, pad_paragraphs: int = 0) -> list:
+    """Pages as (name, html); pad_paragraphs appends filler to mimic very long articles"""
+    padding = "".join(
+        f"<p>Filler paragraph {i} with enough words to look like article text.</p>\n" for i in range(pad_paragraphs)
+    )
+    pages = []
+    for path in sorted(Path(corpus).rglob("*.htm*")):
+        html = path.read_bytes().decode("utf-8", "replace")
+        if padding:
+            html = html.replace("</body>", padding + "</body>", 1)
+        pages.append((path.name, html))
+    return pages
+
+
+def run_backend(backend: str, corpus: str, repeat: int, pad_paragraphs: int) -> dict:
+    """Runs in a child process so memory numbers are per backend"""
+    pages = load_corpus(corpus, pad_paragraphs)
+    extractor = get_extractor(backend)
+    url = "https://example.com/news/1"
+    documents = {name: extractor.extract(html, url) for name, html in pages}
+
+    start = time.perf_counter()
+    for _ in range(repeat):
+        for _, html in pages:
+            extractor.extract(html, url)
+    elapsed = time.perf_counter() - start
+
+    # Memory is measured on a separate pass: tracemalloc slows parsing down
+    rss_before = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    tracemalloc.start()
+    for _, html in pages:
+        extractor.extract(html, url)
+    _, heap_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    rss_growth = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before
+
+    return {
+        "pages_per_sec": len(pages) * repeat / elapsed,
+        "heap_peak_kib": heap_peak / 1024,
+        # ru_maxrss is KiB on Linux, bytes on macOS
+        "rss_growth_kib": rss_growth / 1024 if sys.platform == "darwin" else rss_growth,
+        "documents": documents,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--corpus", default=DEFAULT_CORPUS, help="directory of saved .html pages")
+    parser.add_argument("--repeat", type=int, default=20, help="passes over the corpus per backend")
+    parser.add_argument("--pad-paragraphs", type=int, default=0,
+                        help="append this many paragraphs to every page (long-article case)")
+    parser.add_argument("--backend", action="append", choices=sorted(EXTRACTORS), help="backend(s) to run")
+    args = parser.parse_args()
+
+    pages = load_corpus(args.corpus, args.pad_paragraphs)
+    if not pages:
+        parser.error(f"no .html pages under {args.corpus}")
+    corpus_kib = sum(len(html.encode()) for _, html in pages) / 1024
+    print(f"corpus: {len(pages)} pages, {corpus_kib:.0f} KiB, {args.repeat} passes\n")
+
+    print(f"{'backend':<8} {'pages/s':>10} {'heap peak KiB':>14} {'RSS growth KiB':>15} {'mismatches':>11}")
+    reference = None
+    for backend in args.backend or sorted(EXTRACTORS):
+        context = multiprocessing.get_context("spawn")
+        with ProcessPoolExecutor(max_workers=1, mp_context=context) as pool:
+            result = pool.submit(run_backend, backend, args.corpus, args.repeat, args.pad_paragraphs).result()
+        documents = result["documents"]
+        reference = reference or documents
+        mismatches = [name for name in documents if documents[name] != reference[name]]
+        print(
+            f"{backend:<8} {result['pages_per_sec']:>10.1f} {result['heap_peak_kib']:>14.0f} "
+            f"{result['rss_growth_kib']:>15.0f} {len(mismatches):>11}"
+        )
+        for name in mismatches:
+            print(f"    differs: {name}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,169 @@
+"""
+Cache Codec - Versioned binary format for stored cache entries
+"""
+
+import os
+import json
+import zlib
+import struct
+import logging
+from typing import Any, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - optional speedup
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:  # pragma: no cover - optional format
+    msgpack = None
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional compression
+    zstandard = None
+
+logger = logging.getLogger(__name__)
+
+# 0xC4 0xE1 is never valid UTF-8, so legacy JSON text can't be mistaken for a header
+MAGIC = b"\xc4\xe1"
+FORMAT_VERSION = 1
+# magic | version | serializer | flags | stale_at | expires_at | delta
+HEADER = struct.Struct("<2sBBBddd")
+
+SERIALIZER_JSON = 0
+SERIALIZER_ORJSON = 1
+SERIALIZER_MSGPACK = 2
+SERIALIZER_RAW = 3  # bytes values (e.g. pre-rendered HTTP bodies), stored verbatim
+
+SERIALIZER_IDS = {"json": SERIALIZER_JSON, "orjson": SERIALIZER_ORJSON, "msgpack": SERIALIZER_MSGPACK}
+
+FLAG_ZSTD = 0x01
+FLAG_ZLIB = 0x02
+
+
+def _default_serializer() -> str:
+    return "orjson" if orjson is not None else "json"
+
+
+class CacheCodec:
+    """
+    Encode cache entries as header + (optionally compressed) payload
+
+    The header carries the format version, the serializer used and the
+    entry's freshness metadata, so readers never parse the payload just to
+    check expiry and entries written with another serializer (or by an
+    older release, as plain JSON text) remain readable.
+    """
+
+    def __init__(self, serializer: Optional[str] = None, compress_min_bytes: Optional[int] = None,
+                 compression: Optional[str] = None):
+        serializer = (serializer or os.getenv("CACHE_SERIALIZER") or _default_serializer()).lower()
+        if serializer == "orjson" and orjson is None or serializer == "msgpack" and msgpack is None:
+            logger.warning(f"CACHE_SERIALIZER '{serializer}' is not installed, using json")
+            serializer = "json"
+        if serializer not in SERIALIZER_IDS:
+            logger.warning(f"Unknown CACHE_SERIALIZER '{serializer}', using json")
+            serializer = "json"
+        self.serializer = serializer
+        self.serializer_id = SERIALIZER_IDS[serializer]
+
+        if compress_min_bytes is None:
+            compress_min_bytes = int(os.getenv("CACHE_COMPRESS_MIN_BYTES", "1024"))
+        self.compress_min_bytes = compress_min_bytes
+
+        compression = (compression or os.getenv("CACHE_COMPRESSION") or "zstd").lower()
+        if compression == "zstd" and zstandard is None:
+            compression = "zlib"
+        self.compression = compression if compression in ("zstd", "zlib") else "none"
+        if self.compression == "zstd":
+            self._zstd_compressor = zstandard.ZstdCompressor(level=3)
+        self._zstd_decompressor = zstandard.ZstdDecompressor() if zstandard is not None else None
+
+    def _dumps(self, value: Any) -> bytes:
+        if self.serializer_id == SERIALIZER_ORJSON:
+            return orjson.dumps(value)
+        if self.serializer_id == SERIALIZER_MSGPACK:
+            return msgpack.packb(value, use_bin_type=True)
+        return json.dumps(value, ensure_ascii=False, separators=(",", ":")).encode()
+
+    @staticmethod
+    def _loads(serializer_id: int, payload: bytes) -> Any:
+        if serializer_id == SERIALIZER_RAW:
+            return payload
+        if serializer_id == SERIALIZER_ORJSON:
+            # orjson output is plain JSON; fall back if this host lacks orjson
+            return orjson.loads(payload) if orjson is not None else json.loads(payload)
+        if serializer_id == SERIALIZER_MSGPACK:
+            if msgpack is None:
+                raise ValueError("Cache entry uses msgpack, which is not installed")
+            return msgpack.unpackb(payload, raw=False)
+        if serializer_id == SERIALIZER_JSON:
+            return json.loads(payload)
+        raise ValueError(f"Unknown cache serializer {serializer_id}")
+
+    def encode(self, value: Any, stale_at: float, expires_at: float, delta: float) -> bytes:
+        """
+        Serialize an entry
+
+        Args:
+            value: Value to store; bytes are stored as-is and returned as bytes
+            stale_at: Soft expiry (unix time)
+            expires_at: Hard expiry (unix time)
+            delta: Seconds the value took to compute
+
+        Returns:
+            Header followed by the payload
+        """
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            serializer_id, payload = SERIALIZER_RAW, bytes(value)
+        else:
+            serializer_id, payload = self.serializer_id, self._dumps(value)
+
+        flags = 0
+        if self.compression != "none" and len(payload) >= self.compress_min_bytes:
+            if self.compression == "zstd":
+                compressed = self._zstd_compressor.compress(payload)
+                flag = FLAG_ZSTD
+            else:
+                compressed = zlib.compress(payload, 1)
+                flag = FLAG_ZLIB
+            if len(compressed) < len(payload):
+                payload = compressed
+                flags |= flag
+
+        header = HEADER.pack(MAGIC, FORMAT_VERSION, serializer_id, flags, stale_at, expires_at, delta)
+        return header + payload
+
+    def decode(self, data: bytes) -> Optional[Tuple[Any, float, float, float]]:
+        """
+        Parse an entry written by encode
+
+        Args:
+            data: Stored bytes
+
+        Returns:
+            (value, stale_at, expires_at, delta), or None if data is not
+            in this format (legacy JSON text)
+
+        Raises:
+            ValueError: Newer format version or unavailable decoder
+        """
+        if data[:2] != MAGIC:
+            return None
+        _, version, serializer_id, flags, stale_at, expires_at, delta = HEADER.unpack_from(data)
+        if version > FORMAT_VERSION:
+            raise ValueError(f"Cache entry format version {version} is newer than {FORMAT_VERSION}")
+
+        payload = memoryview(data)[HEADER.size:]
+        if flags & FLAG_ZSTD:
+            if self._zstd_decompressor is None:
+                raise ValueError("Cache entry uses zstd, which is not installed")
+            payload = self._zstd_decompressor.decompress(payload)
+        elif flags & FLAG_ZLIB:
+            payload = zlib.decompress(payload)
+        else:
+            payload = bytes(payload)
+
+        return self._loads(serializer_id, payload), stale_at, expires_at, delta
@@ -0,0 +1,129 @@
+"""
+Cache Key Service - Canonical, configurably scoped cache keys for endpoints
+"""
+
+import os
+import json
+import hashlib
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from services.url_normalizer import canonicalize_url
+
+logger = logging.getLogger(__name__)
+
+# Request fields (beyond the endpoint inputs) that split the cache by default.
+# Responses carry no per-user data, so user is opt-in.
+DEFAULT_SCOPES: Dict[str, Tuple[str, ...]] = {
+    "questions": ("type",),
+    "metadata": (),
+    "answer": (),
+}
+
+# Input fields holding URLs, canonicalized before hashing
+URL_FIELDS = ("url", "source_url")
+
+
+def parse_scopes(spec: str) -> Dict[str, Tuple[str, ...]]:
+    """
+    Parse CACHE_KEY_SCOPES, e.g. "questions=type,user;answer=user"
+
+    Args:
+        spec: Semicolon-separated endpoint=field,field entries
+
+    Returns:
+        Scope fields per endpoint (endpoints not listed keep their default)
+    """
+    scopes = dict(DEFAULT_SCOPES)
+    for entry in spec.split(";"):
+        if not entry.strip():
+            continue
+        endpoint, _, fields = entry.partition("=")
+        scopes[endpoint.strip()] = tuple(f.strip() for f in fields.split(",") if f.strip())
+    return scopes
+
+
+class CacheKeyService:
+    """
+    Builds cache keys from canonicalized inputs and per-endpoint scope fields
+
+    URLs are canonicalized (host aliases, tracking parameters, fragments)
+    so variants of one article share an entry, and only the configured
+    scope fields (user, type, ...) split the key. For observability it
+    tracks how many distinct raw requests collapse into each canonical key.
+    """
+
+    def __init__(self):
+        self.scopes = parse_scopes(os.getenv("CACHE_KEY_SCOPES", ""))
+        self.max_tracked = int(os.getenv("CACHE_KEY_TRACKED", "10000"))
+        # canonical key -> fingerprints of the raw requests that mapped to it
+        self._variants: "OrderedDict[str, set]" = OrderedDict()
+        self.requests = 0
+
+    @staticmethod
+    def _digest(parts: Any) -> str:
+        return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+    @staticmethod
+    def canonical_inputs(inputs: Dict[str, Any]) -> Dict[str, Any]:
+        """Canonicalize URL fields and trim surrounding whitespace from strings"""
+        canonical = {}
+        for name, value in inputs.items():
+            if isinstance(value, str):
+                value = value.strip()
+                if name in URL_FIELDS and value:
+                    value = canonicalize_url(value)
+            canonical[name] = value
+        return canonical
+
+    def build(self, endpoint: str, inputs: Dict[str, Any], scope: Optional[Dict[str, Any]] = None) -> str:
+        """
+        Generate the cache key for a request (sanitized for filesystem compatibility)
+
+        Args:
+            endpoint: Endpoint name (also the key prefix)
+            inputs: Fields that determine the response
+            scope: Request fields that may split the key (user, type, ...);
+                only those configured for the endpoint are used
+
+        Returns:
+            Cache key
+        """
+        scope = scope or {}
+        fields = self.scopes.get(endpoint, ())
+        scoped = {name: scope.get(name, "") for name in fields}
+        canonical = [endpoint, self.canonical_inputs(inputs), scoped]
+        # Use hash only to avoid invalid filesystem characters on Windows/Linux
+        key = f"ai_{endpoint}_{self._digest(canonical)}"
+
+        self._track(key, self._digest([endpoint, inputs, scope])[:16])
+        return key
+
+    def _track(self, key: str, raw_fingerprint: str):
+        self.requests += 1
+        variants = self._variants.get(key)
+        if variants is None:
+            variants = self._variants[key] = set()
+            if len(self._variants) > self.max_tracked:
+                self._variants.popitem(last=False)
+        else:
+            self._variants.move_to_end(key)
+        if len(variants) < 1000:
+            variants.add(raw_fingerprint)
+
+    def stats(self, top: int = 10) -> Dict[str, Any]:
+        """Collapse metrics over the tracked (most recently used) keys"""
+        counts = [(len(v), k) for k, v in self._variants.items()]
+        raw_keys = sum(c for c, _ in counts)
+        counts.sort(reverse=True)
+        return {
+            "scopes": {endpoint: list(fields) for endpoint, fields in self.scopes.items()},
+            "requests": self.requests,
+            "canonical_keys": len(counts),
+            "raw_keys": raw_keys,
+            "collapsed_keys": raw_keys - len(counts),
+            "top_collapsed": [
+                {"key": k[:40], "raw_variants": c} for c, k in counts[:top] if c > 1
+            ],
+        }
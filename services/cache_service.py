@@ -4,30 +4,130 @@ Cache Service - Multi-tier caching with Redis and file fallback
 
 import os
 import json
+import math
+import time
+import uuid
+import random
+import asyncio
 import logging
-from typing import Optional, Any
+from contextvars import ContextVar
+from typing import Optional, Any, Awaitable, Callable, Dict, NamedTuple
 import redis.asyncio as redis
-import aiofiles
 from pathlib import Path
 
+from services.cache_codec import CacheCodec
+from services.circuit_breaker import CircuitBreaker
+from services.file_cache_store import FileCacheStore
+from services.log_cache_store import LogCacheStore
+from services.sqlite_cache_store import SQLiteCacheStore
+from services.memory_cache import TinyLFUCache
+from services.singleflight_service import SingleFlightService
+
 logger = logging.getLogger(__name__)
 
+# Returned by _acquire_lease when Redis is unavailable and only local locking applies
+LOCAL_LEASE = "local"
+
+# Set while a stale value is being recomputed, so nested lookups skip stale values
+_refreshing: ContextVar[bool] = ContextVar("cache_refreshing", default=False)
+
+# Delete the lease only if we still own it
+RELEASE_LEASE_SCRIPT = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+end
+return 0
+"""
+
+# Marker key identifying JSON entries written before the binary codec
+ENTRY_MARKER = "__cache_entry__"
+
+
+class CacheEntry(NamedTuple):
+    """Cached value with its soft-expiry metadata"""
+    value: Any
+    stale_at: float  # Unix time after which the value is served stale
+    delta: float  # Seconds the value took to compute (for early refresh)
+    expires_at: float = math.inf  # Unix time after which the value is gone
+    
+    def is_stale(self, now: float) -> bool:
+        return now >= self.stale_at
+    
+    def should_refresh_early(self, now: float, beta: float) -> bool:
+        """XFetch: refresh before stale_at with probability rising as it approaches"""
+        if beta <= 0 or self.delta <= 0:
+            return False
+        return now - self.delta * beta * math.log(1.0 - random.random()) >= self.stale_at
+
 
 class CacheService:
     """Service for caching API responses"""
     
     def __init__(self):
         self.redis_client = None
-        self.redis_enabled = False
+        self.redis_pool = None
         self.redis_connection_tested = False
         self.cache_dir = Path(os.getenv("CACHE_DIR", "./cache"))
-        self.cache_dir.mkdir(exist_ok=True)
+        self.backend = os.getenv("CACHE_BACKEND", "file").lower()
+        self.store = self._create_store(
+            self.backend,
+            max_bytes=int(os.getenv("CACHE_DIR_MAX_BYTES", str(1024 * 1024 * 1024)))
+        )
+        self.sweep_interval = float(os.getenv("CACHE_SWEEP_INTERVAL", "300"))
+        self._sweeper_task: Optional[asyncio.Task] = None
+        
+        # Stampede protection: local singleflight plus cross-instance Redis leases
+        self.singleflight = SingleFlightService()
+        self.lease_ttl_ms = int(os.getenv("CACHE_LEASE_TTL_MS", "30000"))
+        self.lease_poll_max_ms = int(os.getenv("CACHE_LEASE_POLL_MAX_MS", "1000"))
+        self.lease_stats = {"acquired": 0, "lost": 0, "waited_hits": 0, "wait_timeouts": 0, "local_only": 0}
+        
+        # Soft/hard TTL: entries are fresh for ttl seconds, then served stale
+        # (while one background refresh runs) until ttl * CACHE_STALE_TTL_FACTOR
+        self.stale_ttl_factor = max(1.0, float(os.getenv("CACHE_STALE_TTL_FACTOR", "2.0")))
+        # XFetch probabilistic early refresh; 0 disables
+        self.xfetch_beta = float(os.getenv("CACHE_XFETCH_BETA", "1.0"))
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        self.refresh_stats = {
+            "stale_hits": 0, "early_refreshes": 0, "nested_refreshes": 0, "refreshes": 0, "refresh_errors": 0
+        }
+        
+        # In-process L1 tier holding decoded fresh entries, bounded by bytes
+        l1_max_bytes = int(os.getenv("CACHE_L1_MAX_BYTES", str(64 * 1024 * 1024)))
+        self.l1 = TinyLFUCache(l1_max_bytes) if l1_max_bytes > 0 else None
+        # Upper bound on L1 lifetime so values rewritten by other instances show up
+        self.l1_max_ttl = float(os.getenv("CACHE_L1_MAX_TTL", "60"))
+        self.tier_stats = {
+            "redis": {"hits": 0, "misses": 0, "errors": 0},
+            "file": {"hits": 0, "misses": 0, "errors": 0},
+        }
+        
+        # Stored entry format (serializer, compression); reads any version
+        self.codec = CacheCodec()
+        
+        # Redis health: failures open the breaker (file tier serves meanwhile)
+        # and backoff probes close it again once Redis answers
+        self.redis_breaker = CircuitBreaker(
+            "Redis",
+            failure_threshold=int(os.getenv("REDIS_BREAKER_FAILURES", "3")),
+            base_backoff=int(os.getenv("REDIS_BREAKER_BACKOFF_MS", "500")) / 1000,
+            max_backoff=int(os.getenv("REDIS_BREAKER_MAX_BACKOFF_MS", "30000")) / 1000
+        )
         
         # Initialize Redis only if explicitly configured
         redis_url = os.getenv("REDIS_URL")
         if redis_url:
             try:
-                self.redis_client = redis.from_url(redis_url, decode_responses=True)
+                socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+                self.redis_pool = redis.BlockingConnectionPool.from_url(
+                    redis_url,
+                    decode_responses=False,
+                    max_connections=int(os.getenv("REDIS_MAX_CONNECTIONS", "64")),
+                    timeout=socket_timeout,
+                    socket_timeout=socket_timeout,
+                    socket_connect_timeout=socket_timeout
+                )
+                self.redis_client = redis.Redis(connection_pool=self.redis_pool)
                 # Note: Connection is tested lazily on first use
                 logger.info("Redis cache configured (will test connection on first use)")
             except Exception as e:
@@ -36,92 +136,227 @@ class CacheService:
         else:
             logger.info("Redis not configured, using file cache only")
     
+    def _create_store(self, backend: str, max_bytes: int):
+        """
+        Build the local disk tier
+        
+        Args:
+            backend: "file" (one file per key), "log" (append-only segments)
+                or "sqlite" (WAL database shared by workers on the host)
+            max_bytes: Byte budget for the tier
+            
+        Returns:
+            Store with async get/set/delete/sweep/close
+        """
+        if backend == "log":
+            try:
+                return LogCacheStore(self.cache_dir / "log", max_bytes=max_bytes)
+            except RuntimeError as e:
+                # Another worker owns the log; it is single-process
+                logger.warning(f"{str(e)}, using file")
+                self.backend = "file"
+                return FileCacheStore(self.cache_dir, max_bytes=max_bytes)
+        if backend == "sqlite":
+            path = Path(os.getenv("CACHE_SQLITE_PATH", str(self.cache_dir / "cache.sqlite3")))
+            return SQLiteCacheStore(path, max_bytes=max_bytes)
+        if backend != "file":
+            logger.warning(f"Unknown CACHE_BACKEND '{backend}', using file")
+            self.backend = "file"
+        return FileCacheStore(self.cache_dir, max_bytes=max_bytes)
+    
+    @property
+    def redis_enabled(self) -> bool:
+        """Redis is configured and its circuit is closed"""
+        return self.redis_client is not None and self.redis_breaker.is_closed
+    
     async def _test_redis_connection(self):
-        """Test Redis connection and enable/disable accordingly"""
+        """Ping Redis on first use; an unreachable server opens the circuit"""
         if self.redis_connection_tested:
             return
         
         self.redis_connection_tested = True
         
         if not self.redis_client:
-            self.redis_enabled = False
             return
         
         try:
             # Test connection by pinging Redis
             await self.redis_client.ping()
-            self.redis_enabled = True
             logger.info("Redis cache enabled and connected")
         except Exception as e:
-            self.redis_enabled = False
-            logger.info(f"Redis not available, using file cache only: {str(e)}")
+            self.redis_breaker.trip()
+            logger.info(f"Redis not available, using file cache until it recovers: {str(e)}")
+    
+    async def _redis_allowed(self) -> bool:
+        """Whether to try Redis for this call (closed circuit or a recovery probe)"""
+        await self._test_redis_connection()
+        return self.redis_client is not None and self.redis_breaker.allow_request()
     
-    async def get(self, key: str) -> Optional[Any]:
+    async def _redis(self, method: str, *args, **kwargs) -> Any:
+        """Run one Redis command, reporting the outcome to the circuit breaker"""
+        try:
+            result = await getattr(self.redis_client, method)(*args, **kwargs)
+        except Exception:
+            self.redis_breaker.record_failure()
+            raise
+        except BaseException:
+            # Cancelled (client disconnect, timeout): no verdict on Redis,
+            # but a probe slot must not stay taken
+            self.redis_breaker.record_abandoned()
+            raise
+        self.redis_breaker.record_success()
+        return result
+    
+    async def get(
+        self,
+        key: str,
+        on_stale: Optional[Callable[[], Awaitable[Any]]] = None
+    ) -> Optional[Any]:
         """
         Get value from cache
         
+        Values past their soft TTL are still returned until the hard TTL.
+        If on_stale is given it is scheduled in the background when the
+        value is stale (or due for probabilistic early refresh).
+        
         Args:
             key: Cache key
+            on_stale: Optional refresh callback for stale values
             
         Returns:
             Cached value or None
         """
-        # Test Redis connection on first use
-        await self._test_redis_connection()
+        entry = await self._get_entry(key)
+        if entry is None:
+            return None
+        
+        if on_stale is not None:
+            now = time.time()
+            if entry.is_stale(now):
+                self.refresh_stats["stale_hits"] += 1
+                self._schedule_refresh(key, on_stale)
+            elif entry.should_refresh_early(now, self.xfetch_beta):
+                self.refresh_stats["early_refreshes"] += 1
+                self._schedule_refresh(key, on_stale)
+        
+        return entry.value
+    
+    async def _get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Read the stored entry for key from L1, Redis or the file cache"""
+        # L1 only holds fresh entries, already decoded
+        if self.l1 is not None:
+            entry = self.l1.get(key, time.time())
+            if entry is not None:
+                return entry
         
         # Try Redis first
-        if self.redis_enabled and self.redis_client:
+        if await self._redis_allowed():
             try:
-                value = await self.redis_client.get(key)
+                value = await self._redis("get", key)
                 if value:
-                    return json.loads(value)
+                    self.tier_stats["redis"]["hits"] += 1
+                    entry = self._decode_entry(value)
+                    self._l1_put(key, entry, len(value))
+                    return entry
+                self.tier_stats["redis"]["misses"] += 1
             except Exception as e:
+                self.tier_stats["redis"]["errors"] += 1
                 logger.warning(f"Redis get error: {str(e)}")
-                # Disable Redis on persistent errors
-                self.redis_enabled = False
         
         # Fallback to file cache
-        cache_file = self.cache_dir / f"{key}.json"
-        if cache_file.exists():
-            try:
-                async with aiofiles.open(cache_file, 'r') as f:
-                    content = await f.read()
-                    return json.loads(content)
-            except Exception as e:
-                logger.warning(f"File cache read error: {str(e)}")
+        try:
+            content = await self.store.get(key)
+            if content:
+                entry = self._decode_entry(content)
+                self.tier_stats["file"]["hits"] += 1
+                self._l1_put(key, entry, len(content))
+                return entry
+            self.tier_stats["file"]["misses"] += 1
+        except Exception as e:
+            self.tier_stats["file"]["errors"] += 1
+            logger.warning(f"File cache read error: {str(e)}")
         
         return None
     
-    async def set(self, key: str, value: Any, ttl: int = 3600) -> bool:
+    def _l1_put(self, key: str, entry: CacheEntry, size: int):
+        """Keep a decoded entry in L1 until it turns stale (bounded by l1_max_ttl)"""
+        if self.l1 is None:
+            return
+        now = time.time()
+        expires_at = min(entry.stale_at, entry.expires_at, now + self.l1_max_ttl)
+        if expires_at > now:
+            self.l1.put(key, entry, size, expires_at)
+    
+    def _encode_entry(self, entry: CacheEntry) -> bytes:
+        """Serialize value together with its freshness metadata"""
+        return self.codec.encode(entry.value, entry.stale_at, entry.expires_at, entry.delta)
+    
+    def _decode_entry(self, raw: bytes) -> CacheEntry:
+        """Deserialize a stored entry; also reads JSON written by older releases"""
+        if isinstance(raw, str):
+            raw = raw.encode()
+        decoded = self.codec.decode(raw)
+        if decoded is not None:
+            value, stale_at, expires_at, delta = decoded
+            return CacheEntry(value, stale_at, delta, expires_at)
+        
+        data = json.loads(raw)
+        if isinstance(data, dict) and data.get(ENTRY_MARKER) == 1:
+            return CacheEntry(
+                data.get("value"),
+                data.get("stale_at", math.inf),
+                data.get("delta", 0.0),
+                data.get("expires_at", math.inf),
+            )
+        return CacheEntry(data, math.inf, 0.0)
+    
+    def _schedule_refresh(self, key: str, refresh: Callable[[], Awaitable[Any]]):
+        """Run a background refresh for key unless one is already running"""
+        if key in self._refresh_tasks:
+            return
+        task = asyncio.ensure_future(self._run_refresh(refresh))
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda _: self._refresh_tasks.pop(key, None))
+    
+    async def _run_refresh(self, refresh: Callable[[], Awaitable[Any]]):
+        try:
+            await refresh()
+            self.refresh_stats["refreshes"] += 1
+        except Exception as e:
+            self.refresh_stats["refresh_errors"] += 1
+            logger.warning(f"Background cache refresh failed: {str(e)}")
+    
+    async def set(self, key: str, value: Any, ttl: int = 3600, delta: float = 0.0) -> bool:
         """
         Set value in cache
         
         Args:
             key: Cache key
             value: Value to cache
-            ttl: Time to live in seconds
+            ttl: Time to live in seconds before the value is considered stale
+            delta: Seconds it took to compute value (drives early refresh)
             
         Returns:
             True if successful
         """
-        # Test Redis connection on first use
-        await self._test_redis_connection()
-        
-        json_value = json.dumps(value)
+        now = time.time()
+        hard_ttl = max(1, int(ttl * self.stale_ttl_factor))
+        entry = CacheEntry(value, now + ttl, delta, now + hard_ttl)
+        encoded = self._encode_entry(entry)
+        self._l1_put(key, entry, len(encoded))
         
         # Try Redis first
-        if self.redis_enabled and self.redis_client:
+        if await self._redis_allowed():
             try:
-                await self.redis_client.setex(key, ttl, json_value)
+                await self._redis("setex", key, hard_ttl, encoded)
                 return True
             except Exception as e:
+                self.tier_stats["redis"]["errors"] += 1
                 logger.warning(f"Redis set error: {str(e)}")
         
-        # Fallback to file cache (no TTL for files)
-        cache_file = self.cache_dir / f"{key}.json"
+        # Fallback to file cache (expires with the hard TTL)
         try:
-            async with aiofiles.open(cache_file, 'w') as f:
-                await f.write(json_value)
+            await self.store.set(key, encoded, expires_at=entry.expires_at)
             return True
         except Exception as e:
             logger.error(f"File cache write error: {str(e)}")
@@ -139,27 +374,243 @@ class CacheService:
         """
         success = True
         
+        if self.l1 is not None:
+            self.l1.delete(key)
+        
         # Delete from Redis
-        if self.redis_enabled and self.redis_client:
+        if await self._redis_allowed():
             try:
-                await self.redis_client.delete(key)
+                await self._redis("delete", key)
             except Exception as e:
                 logger.warning(f"Redis delete error: {str(e)}")
                 success = False
         
         # Delete from file cache
-        cache_file = self.cache_dir / f"{key}.json"
-        if cache_file.exists():
+        try:
+            await self.store.delete(key)
+        except Exception as e:
+            logger.warning(f"File cache delete error: {str(e)}")
+            success = False
+        
+        return success
+    
+    async def get_or_compute(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int = 3600
+    ) -> Any:
+        """
+        Get value from cache, computing and storing it once on a miss
+        
+        Concurrent misses in this process share one computation. Across
+        instances, the first to take a short Redis lease (SET NX PX)
+        computes while the others poll for its value; without Redis only
+        the local lock applies. Stale values are returned immediately
+        while a single background refresh recomputes them, except while
+        another key is being refreshed: then a stale value is recomputed
+        before returning, so the outer value is not rebuilt from it.
+        
+        Args:
+            key: Cache key
+            compute: Zero-argument coroutine function producing the value
+            ttl: Time to live in seconds
+            
+        Returns:
+            Cached or freshly computed value
+        """
+        async def refresh():
+            return await self.singleflight.do(
+                f"refresh:{key}", lambda: self._compute_with_lease(key, compute, ttl, refresh=True)
+            )
+        
+        if _refreshing.get():
+            # Inside another value's refresh: a stale value here would be
+            # stored again under the outer key with a fresh TTL, so it is
+            # recomputed now instead of in the background
+            entry = await self._get_entry(key)
+            if entry is not None and not entry.is_stale(time.time()):
+                return entry.value
+            if entry is not None:
+                self.refresh_stats["nested_refreshes"] += 1
+                value = await refresh()
+                # None: another instance holds the lease and is refreshing it
+                return value if value is not None else entry.value
+        
+        value = await self.get(key, on_stale=refresh)
+        if value is not None:
+            logger.info(f"Cache hit: {key[:20]}...")
+            return value
+        
+        return await self.singleflight.do(
+            key, lambda: self._compute_with_lease(key, compute, ttl)
+        )
+    
+    async def _compute_with_lease(
+        self,
+        key: str,
+        compute: Callable[[], Awaitable[Any]],
+        ttl: int,
+        refresh: bool = False
+    ) -> Any:
+        """
+        Compute value under the cross-instance lease, or wait for the lease holder
+        
+        In refresh mode a stale value already exists, so losing the lease
+        means another instance is refreshing and nothing is done.
+        """
+        lease_token = await self._acquire_lease(key)
+        
+        if lease_token is None and refresh:
+            return None
+        elif lease_token is None:
+            # Another instance is computing; wait for its value
+            value = await self._wait_for_value(key)
+            if value is not None:
+                return value
+            # Holder failed or is too slow; compute ourselves
+            lease_token = await self._acquire_lease(key)
+        elif not refresh:
+            # Value may have landed between our miss and the lease
+            value = await self.get(key)
+            if value is not None:
+                await self._release_lease(key, lease_token)
+                return value
+        
+        refreshing = _refreshing.set(True) if refresh else None
+        try:
+            started = time.monotonic()
+            value = await compute()
+            await self.set(key, value, ttl=ttl, delta=time.monotonic() - started)
+            return value
+        finally:
+            if refreshing is not None:
+                _refreshing.reset(refreshing)
+            await self._release_lease(key, lease_token)
+    
+    async def _acquire_lease(self, key: str) -> Optional[str]:
+        """
+        Try to take the compute lease for key
+        
+        Returns:
+            Lease token if acquired, LOCAL_LEASE if Redis is unavailable,
+            None if another instance holds the lease
+        """
+        if not await self._redis_allowed():
+            self.lease_stats["local_only"] += 1
+            return LOCAL_LEASE
+        
+        token = uuid.uuid4().hex
+        try:
+            acquired = await self._redis(
+                "set", f"lease:{key}", token, nx=True, px=self.lease_ttl_ms
+            )
+        except Exception as e:
+            logger.warning(f"Redis lease error, using local lock only: {str(e)}")
+            self.lease_stats["local_only"] += 1
+            return LOCAL_LEASE
+        
+        if acquired:
+            self.lease_stats["acquired"] += 1
+            return token
+        self.lease_stats["lost"] += 1
+        return None
+    
+    async def _release_lease(self, key: str, token: Optional[str]):
+        """Release the lease if we still own it"""
+        if not token or token == LOCAL_LEASE or not self.redis_client:
+            return
+        try:
+            await self._redis("eval", RELEASE_LEASE_SCRIPT, 1, f"lease:{key}", token)
+        except Exception as e:
+            # Lease expires on its own after lease_ttl_ms
+            logger.warning(f"Redis lease release error: {str(e)}")
+    
+    async def _wait_for_value(self, key: str) -> Optional[Any]:
+        """
+        Poll for the value written by the lease holder
+        
+        Polling backs off up to lease_poll_max_ms and stops when the value
+        appears, the lease disappears, or the lease TTL has elapsed.
+        """
+        deadline = time.monotonic() + self.lease_ttl_ms / 1000
+        delay = 0.05
+        while time.monotonic() < deadline:
+            await asyncio.sleep(delay)
+            value = await self.get(key)
+            if value is not None:
+                self.lease_stats["waited_hits"] += 1
+                return value
             try:
-                cache_file.unlink()
+                if not self.redis_breaker.is_closed or not await self._redis("exists", f"lease:{key}"):
+                    # Holder finished without a value (error) or died
+                    value = await self.get(key)
+                    if value is not None:
+                        self.lease_stats["waited_hits"] += 1
+                    return value
             except Exception as e:
-                logger.warning(f"File cache delete error: {str(e)}")
-                success = False
+                logger.warning(f"Redis lease check error: {str(e)}")
+                return None
+            delay = min(delay * 2, self.lease_poll_max_ms / 1000)
         
-        return success
+        self.lease_stats["wait_timeouts"] += 1
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        """Cache counters"""
+        return {
+            "redis_enabled": self.redis_enabled,
+            "redis_circuit": self.redis_breaker.stats(),
+            "codec": {"serializer": self.codec.serializer, "compression": self.codec.compression},
+            "singleflight": self.singleflight.stats(),
+            "leases": dict(self.lease_stats),
+            "refresh": dict(self.refresh_stats),
+            "tiers": {
+                "l1": self.l1.stats() if self.l1 is not None else None,
+                "redis": dict(self.tier_stats["redis"]),
+                "file": {**self.tier_stats["file"], "backend": self.backend, **self.store.stats()},
+            },
+        }
+    
+    def start_sweeper(self):
+        """Start the background task that migrates, then expires and evicts file cache entries"""
+        if self._sweeper_task is None:
+            self._sweeper_task = asyncio.ensure_future(self._sweep_loop())
+            if self.sweep_interval > 0:
+                logger.info(f"File cache sweeper started (every {self.sweep_interval:.0f}s)")
+    
+    async def stop_sweeper(self):
+        """Stop the background sweeper task"""
+        if self._sweeper_task is not None:
+            self._sweeper_task.cancel()
+            try:
+                await self._sweeper_task
+            except asyncio.CancelledError:
+                pass
+            self._sweeper_task = None
+    
+    async def _sweep_loop(self):
+        if isinstance(self.store, FileCacheStore):
+            # Files from earlier releases carry their expiry inside the entry
+            try:
+                await self.store.migrate_legacy(lambda raw: self._decode_entry(raw).expires_at)
+            except Exception as e:
+                logger.warning(f"File cache migration error: {str(e)}")
+        if self.sweep_interval <= 0:
+            return
+        while True:
+            try:
+                await self.store.sweep()
+            except Exception as e:
+                logger.warning(f"File cache sweep error: {str(e)}")
+            await asyncio.sleep(self.sweep_interval)
     
     async def close(self):
-        """Close Redis connection"""
+        """Stop background work and close Redis connection"""
+        await self.stop_sweeper()
+        await self.store.close()
         if self.redis_client:
             await self.redis_client.close()
+        if self.redis_pool is not None:
+            await self.redis_pool.disconnect()
 
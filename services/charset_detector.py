@@ -0,0 +1,123 @@
+"""
+Charset Detector - Cheap charset resolution for fetched pages
+"""
+
+import re
+import codecs
+import logging
+from typing import Optional, Tuple
+
+try:
+    import charset_normalizer
+except ImportError:  # pragma: no cover - optional, last-resort detection only
+    charset_normalizer = None
+
+logger = logging.getLogger(__name__)
+
+# Bytes at the start of a page scanned for a BOM, <meta charset> and detection
+SNIFF_BYTES = 4096
+
+BOMS = (
+    (codecs.BOM_UTF8, "utf-8-sig"),
+    (codecs.BOM_UTF16_LE, "utf-16"),
+    (codecs.BOM_UTF16_BE, "utf-16"),
+)
+
+# Labels browsers decode as a superset encoding (WHATWG Encoding Standard)
+LABEL_ALIASES = {
+    "big5": "big5hkscs",
+    "x-x-big5": "big5hkscs",
+    "gb2312": "gb18030",
+    "gbk": "gb18030",
+    "x-gbk": "gb18030",
+    "iso-8859-1": "cp1252",
+    "latin1": "cp1252",
+    "ascii": "cp1252",
+    "us-ascii": "cp1252",
+    "shift_jis": "cp932",
+    "sjis": "cp932",
+    "euc-kr": "cp949",
+}
+
+# <meta charset="x"> and <meta http-equiv="Content-Type" content="text/html; charset=x">
+META_CHARSET = re.compile(rb"""<meta[^>]*?charset\s*=\s*["']?\s*([a-z0-9_.:\-]+)""", re.IGNORECASE)
+CONTENT_TYPE_CHARSET = re.compile(r"""charset\s*=\s*["']?\s*([a-z0-9_.:\-]+)""", re.IGNORECASE)
+
+
+def normalize_charset(label: Optional[str]) -> Optional[str]:
+    """
+    Map a charset label to a Python codec name
+
+    Args:
+        label: Label from a header or meta tag
+
+    Returns:
+        Codec name, or None if the label is unknown
+    """
+    if not label:
+        return None
+    label = label.strip().strip("\"'").lower()
+    label = LABEL_ALIASES.get(label, label)
+    try:
+        codecs.lookup(label)
+    except LookupError:
+        return None
+    return label
+
+
+def charset_from_content_type(content_type: Optional[str]) -> Optional[str]:
+    """Codec for the charset parameter of a Content-Type header, if any"""
+    match = CONTENT_TYPE_CHARSET.search(content_type or "")
+    return normalize_charset(match.group(1)) if match else None
+
+
+def _valid_utf8(head: bytes) -> bool:
+    try:
+        head.decode("utf-8")
+    except UnicodeDecodeError as e:
+        # A multi-byte character cut off by the sniff window is fine
+        return e.reason == "unexpected end of data" and e.start >= len(head) - 3
+    return True
+
+
+def detect_charset(content_type: Optional[str], head: bytes) -> Tuple[str, str]:
+    """
+    Resolve a page's charset, cheapest source first
+
+    Order: Content-Type charset, BOM, <meta charset> in the first
+    SNIFF_BYTES, then (only if those give nothing) UTF-8 validation of
+    that window and finally charset_normalizer detection on it.
+
+    Args:
+        content_type: Content-Type header value
+        head: First bytes of the body (at least SNIFF_BYTES if available)
+
+    Returns:
+        (codec name, source) where source is header, bom, meta, utf-8,
+        detected or default
+    """
+    encoding = charset_from_content_type(content_type)
+    if encoding:
+        return encoding, "header"
+
+    for bom, encoding in BOMS:
+        if head.startswith(bom):
+            return encoding, "bom"
+
+    head = head[:SNIFF_BYTES]
+    match = META_CHARSET.search(head)
+    if match:
+        encoding = normalize_charset(match.group(1).decode("ascii"))
+        if encoding:
+            # A page that can declare its charset in ASCII is not UTF-16
+            return ("utf-8" if encoding.startswith("utf-16") else encoding), "meta"
+
+    if _valid_utf8(head):
+        return "utf-8", "utf-8"
+
+    if charset_normalizer is not None:
+        best = charset_normalizer.from_bytes(head).best()
+        encoding = normalize_charset(best.encoding) if best else None
+        if encoding:
+            return encoding, "detected"
+    return "utf-8", "default"
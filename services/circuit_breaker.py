@@ -0,0 +1,146 @@
+"""
+Circuit Breaker - Health state machine for a remote dependency
+"""
+
+import time
+import random
+import logging
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+class CircuitBreaker:
+    """
+    Closed / open / half-open breaker with exponential backoff probes
+
+    Closed: calls go through; failure_threshold consecutive failures open it.
+    Open: calls are refused until the backoff (with jitter) elapses.
+    Half-open: exactly one call is let through as a probe. Success closes
+    the breaker; failure reopens it with the backoff doubled (up to max).
+    A probe that is abandoned (cancelled) or never reports back within
+    probe_timeout frees the slot for the next call.
+    Time spent outside the closed state is tracked as degraded time.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 3, base_backoff: float = 0.5,
+                 max_backoff: float = 30.0, probe_timeout: Optional[float] = None):
+        self.name = name
+        self.failure_threshold = max(1, failure_threshold)
+        self.base_backoff = base_backoff
+        self.max_backoff = max(base_backoff, max_backoff)
+        self.probe_timeout = probe_timeout if probe_timeout is not None else self.max_backoff
+
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.backoff = base_backoff
+        self.next_probe_at = 0.0
+        self.probe_in_flight = False
+        self.probe_deadline = 0.0
+        self.degraded_since = None
+
+        self.opened = 0
+        self.probes = 0
+        self.failed_probes = 0
+        self.abandoned_probes = 0
+        self.rejected = 0
+        self.degraded_seconds = 0.0
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state == CLOSED
+
+    def allow_request(self) -> bool:
+        """
+        Whether a call may be attempted now
+
+        Returns:
+            True when closed, or for the single half-open probe once the
+            backoff has elapsed; False otherwise
+        """
+        if self.state == CLOSED:
+            return True
+
+        now = time.monotonic()
+        if self.state == OPEN and now >= self.next_probe_at:
+            self.state = HALF_OPEN
+            self.probe_in_flight = False
+
+        if self.state == HALF_OPEN and self.probe_in_flight and now >= self.probe_deadline:
+            # The probe never reported back; let another call try
+            logger.warning(f"{self.name} probe timed out without an outcome")
+            self.abandoned_probes += 1
+            self.probe_in_flight = False
+
+        if self.state == HALF_OPEN and not self.probe_in_flight:
+            self.probe_in_flight = True
+            self.probe_deadline = now + self.probe_timeout
+            self.probes += 1
+            return True
+
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        """Report a successful call"""
+        self.consecutive_failures = 0
+        if self.state == CLOSED:
+            return
+        degraded = time.monotonic() - self.degraded_since
+        self.degraded_seconds += degraded
+        logger.info(f"{self.name} recovered after {degraded:.1f}s degraded")
+        self.state = CLOSED
+        self.backoff = self.base_backoff
+        self.probe_in_flight = False
+        self.degraded_since = None
+
+    def record_abandoned(self):
+        """Report a call that ended without an outcome (cancelled); a held probe slot is freed"""
+        if self.state == HALF_OPEN and self.probe_in_flight:
+            self.abandoned_probes += 1
+            self.probe_in_flight = False
+
+    def record_failure(self):
+        """Report a failed call"""
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN:
+            self.failed_probes += 1
+            self.backoff = min(self.backoff * 2, self.max_backoff)
+            self._open()
+        elif self.state == CLOSED and self.consecutive_failures >= self.failure_threshold:
+            self.trip()
+
+    def trip(self):
+        """Open the breaker immediately (e.g. the initial connection check failed)"""
+        if self.state == CLOSED:
+            self.opened += 1
+            self.degraded_since = time.monotonic()
+            logger.warning(f"{self.name} circuit opened; probing again with backoff from {self.backoff:.1f}s")
+        self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.probe_in_flight = False
+        # Jitter keeps instances from probing a recovering server in lockstep
+        self.next_probe_at = time.monotonic() + self.backoff * random.uniform(0.5, 1.0)
+
+    def stats(self) -> Dict[str, Any]:
+        """State and degraded-time counters"""
+        degraded = self.degraded_seconds
+        if self.degraded_since is not None:
+            degraded += time.monotonic() - self.degraded_since
+        return {
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "opened": self.opened,
+            "probes": self.probes,
+            "failed_probes": self.failed_probes,
+            "abandoned_probes": self.abandoned_probes,
+            "rejected": self.rejected,
+            "backoff_s": self.backoff,
+            "degraded_seconds": round(degraded, 3),
+        }
@@ -2,12 +2,13 @@
 Content Service - Handles content fetching and storage
 """
 
-import os
+import math
 import logging
-from typing import Optional, Dict, Any
-import httpx
-from bs4 import BeautifulSoup
-from urllib.parse import urlparse
+from typing import Any, Dict, Optional
+
+from services.cache_codec import CacheCodec
+from services.content_store import content_hash, create_content_store
+from services.document_service import DocumentService
 
 logger = logging.getLogger(__name__)
 
@@ -15,17 +16,19 @@ logger = logging.getLogger(__name__)
 class ContentService:
     """Service for fetching and managing content"""
     
-    def __init__(self):
-        self.client = httpx.AsyncClient(
-            timeout=30.0,
-            follow_redirects=True,
-            headers={
-                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
-            }
-        )
+    def __init__(self, document_service: Optional[DocumentService] = None, store=None):
+        # Fetching/parsing is shared with SearchService via DocumentService
+        self.document_service = document_service or DocumentService()
         
-        # In-memory content storage (can be replaced with DB)
-        self.content_store: Dict[str, str] = {}
+        # Bounded store of compressed bodies keyed by content hash, plus a
+        # content_id -> (content hash, URL) index (memory, sqlite or redis;
+        # see CONTENT_STORE_BACKEND)
+        self.content_store = store or create_content_store()
+        self.codec = CacheCodec()
+        self.stats_counters = {
+            "hits": 0, "misses": 0, "refetches": 0, "refetch_failures": 0,
+            "saves": 0, "deduplicated": 0, "errors": 0,
+        }
     
     async def fetch_content(self, url: str) -> str:
         """
@@ -35,50 +38,10 @@ class ContentService:
             url: URL to fetch
             
         Returns:
-            Content text
+            Main content text (empty if the page could not be fetched)
         """
-        try:
-            response = await self.client.get(url)
-            response.raise_for_status()
-            
-            html = response.text
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Remove scripts, styles, etc.
-            for script in soup(["script", "style", "meta", "link", "nav", "footer", "header"]):
-                script.decompose()
-            
-            # Extract main content
-            # Try common content selectors
-            content_selectors = [
-                "article",
-                "main",
-                ".content",
-                "#content",
-                ".post-content",
-                ".entry-content"
-            ]
-            
-            content_text = ""
-            for selector in content_selectors:
-                elements = soup.select(selector)
-                if elements:
-                    content_text = ' '.join([elem.get_text() for elem in elements])
-                    break
-            
-            # Fallback to body text
-            if not content_text:
-                content_text = soup.get_text()
-            
-            # Normalize whitespace
-            content_text = ' '.join(content_text.split())
-            
-            # Limit length
-            return content_text[:20000]
-            
-        except Exception as e:
-            logger.error(f"Error fetching content from {url}: {str(e)}")
-            return ""
+        document = await self.document_service.get_document(url)
+        return document["main_text"]
     
     async def get_content(self, content_id: str) -> str:
         """
@@ -88,28 +51,73 @@ class ContentService:
             content_id: Content identifier
             
         Returns:
-            Content text
+            Content text; re-fetched from the indexed source URL if the body
+            was evicted ("" if it cannot be recovered)
         """
-        # Check in-memory store
-        if content_id in self.content_store:
-            return self.content_store[content_id]
+        try:
+            ref = await self.content_store.get_ref(content_id)
+        except Exception as e:
+            self.stats_counters["errors"] += 1
+            logger.warning(f"Content index read error for {content_id}: {str(e)}")
+            ref = None
+        if ref is None:
+            self.stats_counters["misses"] += 1
+            logger.warning(f"Content ID {content_id} not found")
+            return ""
+        
+        digest, url = ref
+        try:
+            data = await self.content_store.get(digest)
+            if data is not None:
+                decoded = self.codec.decode(data)
+                if decoded is not None:
+                    self.stats_counters["hits"] += 1
+                    return decoded[0]
+        except Exception as e:
+            self.stats_counters["errors"] += 1
+            logger.warning(f"Content store read error for {content_id}: {str(e)}")
+        self.stats_counters["misses"] += 1
         
-        # In production, this would query a database
-        # For now, return empty string
-        logger.warning(f"Content ID {content_id} not found")
-        return ""
+        if not url:
+            logger.warning(f"Content ID {content_id} evicted and has no source URL")
+            return ""
+        
+        self.stats_counters["refetches"] += 1
+        content = await self.fetch_content(url)
+        if not content:
+            self.stats_counters["refetch_failures"] += 1
+            logger.warning(f"Content ID {content_id} evicted and could not be re-fetched from {url}")
+            return ""
+        await self.save_content(content_id, content, url)
+        return content
     
-    async def save_content(self, content_id: str, content: str, url: Optional[str] = None):
+    async def save_content(self, content_id: str, content: str, url: Optional[str] = None) -> str:
         """
         Save content with ID
         
+        The body is stored once per content hash (normalized text), so
+        content_ids for the same article share one stored copy.
+        
         Args:
             content_id: Content identifier
             content: Content text
             url: Optional source URL
+            
+        Returns:
+            Content hash the content_id now points at
         """
-        self.content_store[content_id] = content
-        # In production, save to database
+        digest = content_hash(content)
+        self.stats_counters["saves"] += 1
+        try:
+            if await self.content_store.touch(digest):
+                self.stats_counters["deduplicated"] += 1
+            else:
+                await self.content_store.set(digest, self.codec.encode(content, 0, math.inf, 0))
+            await self.content_store.set_ref(content_id, digest, url)
+        except Exception as e:
+            self.stats_counters["errors"] += 1
+            logger.warning(f"Content store write error for {content_id}: {str(e)}")
+        return digest
     
     async def reserve_content_id_from_url(self, url: str) -> str:
         """
@@ -124,6 +132,14 @@ class ContentService:
         import hashlib
         return hashlib.sha256(url.encode()).hexdigest()
     
+    def stats(self) -> Dict[str, Any]:
+        """Content store counters"""
+        return {
+            "backend": self.content_store.name,
+            **self.stats_counters,
+            **self.content_store.stats(),
+        }
+    
     async def __aenter__(self):
         return self
     
@@ -131,6 +147,7 @@ class ContentService:
         await self.close()
     
     async def close(self):
-        """Close HTTP client"""
-        await self.client.aclose()
+        """Close the content store and the document service's HTTP client"""
+        await self.content_store.close()
+        await self.document_service.close()
 
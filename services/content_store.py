@@ -0,0 +1,406 @@
+"""
+Content Store - Bounded, shareable, content-addressed storage for article bodies
+"""
+
+import os
+import re
+import json
+import time
+import hashlib
+import sqlite3
+import asyncio
+import logging
+import threading
+import unicodedata
+from collections import OrderedDict
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import redis.asyncio as redis
+
+from services.executor_service import get_executor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS content_blobs (
+    content_hash TEXT PRIMARY KEY,
+    body BLOB NOT NULL,
+    size INTEGER NOT NULL,
+    accessed_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS content_blobs_accessed_at ON content_blobs (accessed_at);
+CREATE TABLE IF NOT EXISTS content_refs (
+    content_id TEXT PRIMARY KEY,
+    content_hash TEXT NOT NULL,
+    url TEXT,
+    updated_at REAL NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS content_refs_updated_at ON content_refs (updated_at);
+"""
+
+# Seconds a recorded SQLite read stays current; rereads within it skip the write
+ACCESS_RESOLUTION = 60.0
+
+# Zero-width characters and BOMs that pasted text picks up
+INVISIBLE_RE = re.compile("[\u200b-\u200d\u2060\ufeff]")
+WHITESPACE_RE = re.compile(r"\s+")
+
+# (content_hash, source URL) a content_id points at
+ContentRef = Tuple[str, Optional[str]]
+
+
+def normalize_content(text: str) -> str:
+    """
+    Normalize article text for content addressing
+
+    NFKC-folds compatibility forms (full-width letters/digits, ligatures),
+    drops zero-width characters and collapses whitespace, so the same
+    article extracted from different URLs or pasted with different
+    spacing normalizes to the same string.
+    """
+    text = unicodedata.normalize("NFKC", text)
+    text = INVISIBLE_RE.sub("", text)
+    return WHITESPACE_RE.sub(" ", text).strip()
+
+
+def content_hash(text: str) -> str:
+    """SHA-256 of the normalized text; the key bodies are stored under"""
+    return hashlib.sha256(normalize_content(text).encode("utf-8")).hexdigest()
+
+
+class MemoryContentStore:
+    """
+    Per-process LRU of encoded bodies keyed by content hash, bounded by bytes
+
+    The content_id -> (content hash, URL) index is kept separately and
+    bounded by entry count, so it outlives evicted bodies. Many content_ids
+    can point at one body.
+    """
+
+    name = "memory"
+
+    def __init__(self, max_bytes: int, index_max_entries: int):
+        self.max_bytes = max_bytes
+        self.index_max_entries = index_max_entries
+        self.bodies: "OrderedDict[str, bytes]" = OrderedDict()
+        self.index: "OrderedDict[str, ContentRef]" = OrderedDict()
+        self.total_bytes = 0
+        self.evicted = 0
+
+    async def get(self, content_hash: str) -> Optional[bytes]:
+        data = self.bodies.get(content_hash)
+        if data is not None:
+            self.bodies.move_to_end(content_hash)
+        return data
+
+    async def touch(self, content_hash: str) -> bool:
+        """Mark a body as used; False if it is not stored"""
+        if content_hash not in self.bodies:
+            return False
+        self.bodies.move_to_end(content_hash)
+        return True
+
+    async def set(self, content_hash: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        old = self.bodies.pop(content_hash, None)
+        if old is not None:
+            self.total_bytes -= len(old)
+        self.bodies[content_hash] = data
+        self.total_bytes += len(data)
+        while self.total_bytes > self.max_bytes:
+            _, victim = self.bodies.popitem(last=False)
+            self.total_bytes -= len(victim)
+            self.evicted += 1
+
+    async def get_ref(self, content_id: str) -> Optional[ContentRef]:
+        return self.index.get(content_id)
+
+    async def set_ref(self, content_id: str, content_hash: str, url: Optional[str] = None):
+        if not url:
+            # Keep the URL of an earlier save so the body stays recoverable
+            url = (self.index.get(content_id) or ("", None))[1]
+        self.index[content_id] = (content_hash, url)
+        self.index.move_to_end(content_id)
+        while len(self.index) > self.index_max_entries:
+            self.index.popitem(last=False)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self.bodies),
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+            "indexed": len(self.index),
+        }
+
+    async def close(self):
+        pass
+
+
+class SQLiteContentStore:
+    """
+    Bodies and content_id index in one WAL-mode SQLite database
+
+    Shared by the workers on one host. Reads refresh accessed_at (at most
+    once per ACCESS_RESOLUTION, so hot bodies do not turn every read into
+    a write), and writes evict the least recently read bodies down to 90%
+    of max_bytes; the index is trimmed to index_max_entries by last update.
+    """
+
+    name = "sqlite"
+
+    def __init__(self, path: Path, max_bytes: int, index_max_entries: int):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.index_max_entries = index_max_entries
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self.evicted = 0
+        self.total_bytes = 0
+        self.entries = 0
+
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the calling thread (sqlite3 connections are not shared)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor("file_io"), fn, *args)
+
+    async def get(self, content_hash: str) -> Optional[bytes]:
+        return await self._run(self._get_sync, content_hash)
+
+    def _get_sync(self, content_hash: str) -> Optional[bytes]:
+        conn = self._connect()
+        row = conn.execute(
+            "SELECT body, accessed_at FROM content_blobs WHERE content_hash = ?", (content_hash,)
+        ).fetchone()
+        if row is None:
+            return None
+        now = time.time()
+        if row[1] < now - ACCESS_RESOLUTION:
+            conn.execute("UPDATE content_blobs SET accessed_at = ? WHERE content_hash = ?", (now, content_hash))
+        return row[0]
+
+    async def touch(self, content_hash: str) -> bool:
+        """Mark a body as used; False if it is not stored"""
+        return await self._run(self._touch_sync, content_hash)
+
+    def _touch_sync(self, content_hash: str) -> bool:
+        cursor = self._connect().execute(
+            "UPDATE content_blobs SET accessed_at = ? WHERE content_hash = ?", (time.time(), content_hash)
+        )
+        return cursor.rowcount > 0
+
+    async def get_ref(self, content_id: str) -> Optional[ContentRef]:
+        return await self._run(self._get_ref_sync, content_id)
+
+    def _get_ref_sync(self, content_id: str) -> Optional[ContentRef]:
+        row = self._connect().execute(
+            "SELECT content_hash, url FROM content_refs WHERE content_id = ?", (content_id,)
+        ).fetchone()
+        return (row[0], row[1]) if row else None
+
+    async def set_ref(self, content_id: str, content_hash: str, url: Optional[str] = None):
+        await self._run(self._set_ref_sync, content_id, content_hash, url)
+
+    def _set_ref_sync(self, content_id: str, content_hash: str, url: Optional[str]):
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Keep the URL of an earlier save so the body stays recoverable
+            conn.execute(
+                "INSERT INTO content_refs (content_id, content_hash, url, updated_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT (content_id) DO UPDATE SET content_hash = excluded.content_hash, "
+                "url = COALESCE(excluded.url, url), updated_at = excluded.updated_at",
+                (content_id, content_hash, url or None, time.time())
+            )
+            conn.execute(
+                "DELETE FROM content_refs WHERE content_id IN (SELECT content_id FROM content_refs "
+                "ORDER BY updated_at DESC LIMIT -1 OFFSET ?)",
+                (self.index_max_entries,)
+            )
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+    async def set(self, content_hash: str, data: bytes):
+        await self._run(self._set_sync, content_hash, data)
+
+    def _set_sync(self, content_hash: str, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            conn.execute(
+                "INSERT OR REPLACE INTO content_blobs (content_hash, body, size, accessed_at) VALUES (?, ?, ?, ?)",
+                (content_hash, data, len(data), time.time())
+            )
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM content_blobs"
+            ).fetchone()
+            if total_bytes > self.max_bytes:
+                target = int(self.max_bytes * 0.9)
+                victims = []
+                for victim, size in conn.execute("SELECT content_hash, size FROM content_blobs ORDER BY accessed_at"):
+                    if total_bytes <= target:
+                        break
+                    victims.append((victim,))
+                    total_bytes -= size
+                conn.executemany("DELETE FROM content_blobs WHERE content_hash = ?", victims)
+                entries -= len(victims)
+                self.evicted += len(victims)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.entries = entries
+        self.total_bytes = total_bytes
+
+    def stats(self) -> Dict[str, Any]:
+        """Store counters (sizes as of the last write)"""
+        return {
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "evicted": self.evicted,
+        }
+
+    async def close(self):
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"SQLite content store close error: {str(e)}")
+            self._connections.clear()
+        self._local = threading.local()
+
+
+class RedisContentStore:
+    """
+    Bodies and content_id index in Redis, shared by every instance
+
+    Bodies expire after body_ttl and index entries after index_ttl (longer),
+    and Redis' maxmemory policy bounds the total. Errors are logged and
+    treated as misses.
+    """
+
+    name = "redis"
+
+    def __init__(self, url: str, body_ttl: int, index_ttl: int, prefix: str = "content"):
+        socket_timeout = float(os.getenv("REDIS_SOCKET_TIMEOUT", "1.0"))
+        self.client = redis.Redis.from_url(
+            url,
+            decode_responses=False,
+            socket_timeout=socket_timeout,
+            socket_connect_timeout=socket_timeout
+        )
+        self.body_ttl = body_ttl
+        self.index_ttl = index_ttl
+        self.prefix = prefix
+        self.errors = 0
+
+    async def get(self, content_hash: str) -> Optional[bytes]:
+        try:
+            return await self.client.get(f"{self.prefix}:blob:{content_hash}")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis content store read error: {str(e)}")
+            return None
+
+    async def touch(self, content_hash: str) -> bool:
+        """Extend a body's TTL; False if it is not stored"""
+        try:
+            return bool(await self.client.expire(f"{self.prefix}:blob:{content_hash}", self.body_ttl))
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis content store write error: {str(e)}")
+            return False
+
+    async def set(self, content_hash: str, data: bytes):
+        try:
+            await self.client.set(f"{self.prefix}:blob:{content_hash}", data, ex=self.body_ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis content store write error: {str(e)}")
+
+    async def get_ref(self, content_id: str) -> Optional[ContentRef]:
+        try:
+            ref = await self.client.get(f"{self.prefix}:ref:{content_id}")
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis content store read error: {str(e)}")
+            return None
+        if not ref:
+            return None
+        data = json.loads(ref)
+        return data["hash"], data.get("url")
+
+    async def set_ref(self, content_id: str, content_hash: str, url: Optional[str] = None):
+        key = f"{self.prefix}:ref:{content_id}"
+        try:
+            if not url:
+                # Keep the URL of an earlier save so the body stays recoverable
+                previous = await self.get_ref(content_id)
+                url = previous[1] if previous else None
+            ref = json.dumps({"hash": content_hash, "url": url}).encode()
+            await self.client.set(key, ref, ex=self.index_ttl)
+        except Exception as e:
+            self.errors += 1
+            logger.warning(f"Redis content store write error: {str(e)}")
+
+    def stats(self) -> Dict[str, Any]:
+        return {"errors": self.errors}
+
+    async def close(self):
+        await self.client.aclose()
+
+
+def create_content_store(backend: Optional[str] = None):
+    """
+    Build the content store selected by CONTENT_STORE_BACKEND
+
+    Args:
+        backend: "memory" (per process), "sqlite" (shared by workers on a
+            host) or "redis" (shared by every instance; needs REDIS_URL)
+
+    Returns:
+        Store with async get/touch/set (bodies by content hash),
+        get_ref/set_ref (content_id index), close and stats()
+    """
+    backend = (backend or os.getenv("CONTENT_STORE_BACKEND") or "memory").lower()
+    max_bytes = int(os.getenv("CONTENT_STORE_MAX_BYTES", str(64 * 1024 * 1024)))
+    index_max_entries = int(os.getenv("CONTENT_INDEX_MAX_ENTRIES", "100000"))
+    if backend == "sqlite":
+        cache_dir = Path(os.getenv("CACHE_DIR", "./cache"))
+        path = Path(os.getenv("CONTENT_STORE_PATH", str(cache_dir / "content.sqlite3")))
+        return SQLiteContentStore(path, max_bytes, index_max_entries)
+    if backend == "redis":
+        redis_url = os.getenv("REDIS_URL")
+        if redis_url:
+            return RedisContentStore(
+                redis_url,
+                body_ttl=int(os.getenv("CONTENT_STORE_TTL", str(7 * 24 * 3600))),
+                index_ttl=int(os.getenv("CONTENT_INDEX_TTL", str(30 * 24 * 3600)))
+            )
+        logger.warning("CONTENT_STORE_BACKEND=redis needs REDIS_URL, using memory")
+    elif backend != "memory":
+        logger.warning(f"Unknown CONTENT_STORE_BACKEND '{backend}', using memory")
+    return MemoryContentStore(max_bytes, index_max_entries)
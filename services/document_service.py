@@ -0,0 +1,644 @@
+"""
+Document Service - Fetches each URL once and parses it into a shared document
+"""
+
+import os
+import re
+import time
+import asyncio
+import codecs
+import logging
+from concurrent.futures.process import BrokenProcessPool
+from collections import OrderedDict
+from email.utils import parsedate_to_datetime
+from typing import Optional, Dict, Any, Tuple
+from urllib.parse import urlparse
+import httpx
+
+from services.charset_detector import SNIFF_BYTES, charset_from_content_type, detect_charset
+from services.executor_service import get_process_executor
+from services.extraction_rules import get_extraction_rules
+from services.html_extractor import StreamExtractor, extract_bytes, get_extractor, warm_worker
+from services.page_variants import SCAN_BYTES, PageVariants, document_similarity, feed_item_html, same_site
+from services.singleflight_service import SingleFlightService
+from services.url_normalizer import canonicalize_url, normalize_domain
+
+logger = logging.getLogger(__name__)
+
+HEAD_END = re.compile(rb"</head\s*>", re.IGNORECASE)
+
+
+def freshness_lifetime(headers: httpx.Headers, default: float, max_ttl: float) -> Optional[float]:
+    """
+    Seconds a response may be reused without revalidation
+
+    Args:
+        headers: Response headers
+        default: Lifetime when the origin gives no freshness information
+        max_ttl: Upper bound on any lifetime
+
+    Returns:
+        Lifetime in seconds (0 means revalidate every time), or None if
+        the response must not be stored (no-store)
+    """
+    directives = {}
+    for part in headers.get("cache-control", "").lower().split(","):
+        name, _, value = part.strip().partition("=")
+        if name:
+            directives[name] = value.strip('"')
+
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0.0
+    for name in ("s-maxage", "max-age"):
+        if directives.get(name, "").isdigit():
+            return min(float(directives[name]), max_ttl)
+
+    expires = headers.get("expires")
+    if expires:
+        try:
+            date = headers.get("date")
+            now = parsedate_to_datetime(date).timestamp() if date else time.time()
+            return min(max(0.0, parsedate_to_datetime(expires).timestamp() - now), max_ttl)
+        except (TypeError, ValueError):
+            # Invalid Expires (e.g. "0") means already expired
+            return 0.0
+    return min(default, max_ttl)
+
+
+class _CachedPage:
+    """Parsed document with the validators needed to revalidate it"""
+
+    __slots__ = ("document", "etag", "last_modified", "lifetime", "fresh_until", "body_bytes")
+
+    def __init__(self, document: Dict[str, Any], etag: Optional[str], last_modified: Optional[str],
+                 lifetime: float, body_bytes: int):
+        self.document = document
+        self.etag = etag
+        self.last_modified = last_modified
+        self.lifetime = lifetime
+        self.fresh_until = time.time() + lifetime
+        self.body_bytes = body_bytes
+
+
+def empty_document(url: str) -> Dict[str, Any]:
+    """Document returned when a URL cannot be fetched or parsed"""
+    return {
+        "url": url,
+        "title": "",
+        "summary": "",
+        "main_text": "",
+        "text": "",
+        "images": []
+    }
+
+
+class DocumentService:
+    """
+    Service for fetching and parsing article pages
+
+    ContentService (main text for generation) and SearchService (title,
+    summary, images for metadata) both read the same parsed document, so a
+    URL used by several endpoints is downloaded and parsed once, and
+    concurrent requests for the same URL share one download.
+
+    Parsed documents are kept with the page's ETag/Last-Modified. They are
+    reused while fresh per the origin's Cache-Control/Expires (or
+    DOCUMENT_CACHE_TTL when it gives none), then revalidated with a
+    conditional GET; a 304 reuses the parsed document without downloading
+    or parsing the body.
+
+    Bodies are streamed into the extractor and capped at DOCUMENT_MAX_BYTES,
+    so memory per request stays bounded whatever the origin sends. Whole-
+    page (DOM) parses of larger bodies run in a process pool so they do not
+    block the event loop.
+
+    Pages may be served from a lighter variant (mobile host, AMP page or
+    feed item) that PageVariants found to give the same document with
+    fewer bytes for the domain. Variant copies are cached without
+    validators, so they are refetched rather than revalidated. Extraction
+    time and text yield are recorded per domain.
+    """
+
+    def __init__(self, client: Optional[httpx.AsyncClient] = None):
+        self.client = client or httpx.AsyncClient(
+            timeout=30.0,
+            follow_redirects=True,
+            headers={
+                "User-Agent": "Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36"
+            }
+        )
+        self.cache_ttl = float(os.getenv("DOCUMENT_CACHE_TTL", "300"))
+        self.cache_max_ttl = float(os.getenv("DOCUMENT_CACHE_MAX_TTL", "3600"))
+        self.cache_max_entries = int(os.getenv("DOCUMENT_CACHE_MAX_ENTRIES", "256"))
+        self.max_bytes = int(os.getenv("DOCUMENT_MAX_BYTES", "5242880"))
+        # Smaller bodies are parsed on the event loop: cheaper than the IPC round trip
+        self.parse_inline_bytes = int(os.getenv("DOCUMENT_PARSE_INLINE_BYTES", "16384"))
+        # Compiled once here, at startup, rather than on the first page of each domain
+        self.rules = get_extraction_rules()
+        self.variants = PageVariants()
+        # Variant trials and verifications running in the background
+        self._background = set()
+        # canonical URL -> parsed page and validators (LRU order)
+        self._cache: "OrderedDict[str, _CachedPage]" = OrderedDict()
+        self.singleflight = SingleFlightService()
+        self.stats_counters = {
+            "hits": 0, "misses": 0, "fetches": 0, "errors": 0, "stale_on_error": 0,
+            "parses": 0, "offloaded_parses": 0, "oversized": 0, "truncated": 0, "early_stops": 0,
+            "bytes_read": 0, "rewritten": 0,
+        }
+        # origin host -> conditional request counters
+        self.revalidation_stats: Dict[str, Dict[str, int]] = {}
+        # origin host -> charset detection counters
+        self.charset_stats: Dict[str, Dict[str, Any]] = {}
+        # normalized domain -> extraction time and text yield
+        self.extraction_stats: Dict[str, Dict[str, Any]] = {}
+
+    async def get_document(self, url: str) -> Dict[str, Any]:
+        """
+        Get the parsed document for URL
+
+        Args:
+            url: URL to fetch
+
+        Returns:
+            Dict with url, title, summary, main_text, text (body) and images;
+            empty fields if the page could not be fetched
+        """
+        key = canonicalize_url(url)
+        page = self._cache.get(key)
+        if page is not None and page.fresh_until > time.time():
+            self._cache.move_to_end(key)
+            self.stats_counters["hits"] += 1
+            return page.document
+
+        self.stats_counters["misses"] += 1
+        return await self.singleflight.do(key, lambda: self._fetch_and_parse(key, url))
+
+    async def _fetch_and_parse(self, key: str, url: str) -> Dict[str, Any]:
+        """
+        Fetch URL (conditionally if a stale copy is cached) and parse it
+
+        Args:
+            key: Canonical URL (cache key)
+            url: URL to fetch
+
+        Returns:
+            Parsed document dict
+        """
+        page = self._cache.get(key)
+        headers = {}
+        if page is not None:
+            if page.etag:
+                headers["If-None-Match"] = page.etag
+            if page.last_modified:
+                headers["If-Modified-Since"] = page.last_modified
+        host = urlparse(url).netloc.lower()
+        domain = normalize_domain(urlparse(url).hostname or "")
+        rule = self.rules.rule_for(url)
+        if not headers and self.variants.enabled:
+            document = await self._fetch_variant(key, url, domain, rule)
+            if document is not None:
+                return document
+
+        try:
+            self.stats_counters["fetches"] += 1
+            started = time.perf_counter()
+            async with self.client.stream("GET", url, headers=headers) as response:
+                if response.status_code == 304 and page is not None:
+                    # Unchanged: skip the body download and the re-parse
+                    self._record_revalidation(host, page.body_bytes)
+                    lifetime = freshness_lifetime(response.headers, page.lifetime, self.cache_max_ttl)
+                    if lifetime is not None and "cache-control" in response.headers:
+                        page.lifetime = lifetime
+                    page.fresh_until = time.time() + page.lifetime
+                    self._cache.move_to_end(key)
+                    return page.document
+                response.raise_for_status()
+                if headers:
+                    self._record_revalidation(host, None)
+                document, body_bytes, head = await self._read_document(response, url)
+            seconds = time.perf_counter() - started
+        except Exception as e:
+            self.stats_counters["errors"] += 1
+            logger.error(f"Error fetching URL {url}: {str(e)}")
+            if page is not None:
+                # Serve the last good copy rather than nothing
+                self.stats_counters["stale_on_error"] += 1
+                return page.document
+            return empty_document(url)
+
+        self._store(key, response, document, body_bytes)
+        if self.variants.enabled:
+            self._learn(url, domain, rule, document, body_bytes, seconds, head)
+        return document
+
+    async def _fetch_variant(self, key: str, url: str, domain: str, rule) -> Optional[Dict[str, Any]]:
+        """
+        Serve a page from the domain's preferred variant, if it has one
+
+        Returns:
+            Document, or None to fetch the page itself
+        """
+        mobile_url, configured = self.variants.mobile_url(url, domain, rule)
+        variant = self.variants.preferred(domain, configured_mobile=configured)
+        if variant is None or (variant == "mobile" and mobile_url is None):
+            return None
+
+        started = time.perf_counter()
+        response = None
+        try:
+            if variant == "mobile":
+                if configured:
+                    self.stats_counters["rewritten"] += 1
+                response, document, body_bytes = await self._download_variant(mobile_url)
+            elif variant == "amp":
+                # The AMP URL is only known from the page's head
+                head = await self._probe_head(url)
+                amp_url = self.variants.discover(domain, url, head)
+                if amp_url is None:
+                    self.variants.record_fallback(domain, variant, failed=False)
+                    return None
+                response, document, body_bytes = await self._download_variant(amp_url)
+                body_bytes += len(head)
+            else:
+                document, body_bytes = await self._feed_document(domain, key, url)
+                if document is None:
+                    self.variants.record_fallback(domain, variant, failed=False)
+                    return None
+        except Exception as e:
+            logger.warning(f"Error fetching {variant} variant of {url}: {str(e)}")
+            self.variants.record_fallback(domain, variant)
+            return None
+        if not document["main_text"]:
+            self.variants.record_fallback(domain, variant)
+            return None
+
+        if self.variants.record_served(domain, variant, body_bytes, time.perf_counter() - started):
+            self._spawn(self._verify(url, domain, variant, document))
+        self._store(key, response, document, body_bytes, revalidate=False)
+        return document
+
+    def _learn(self, url: str, domain: str, rule, document: Dict[str, Any], body_bytes: int,
+               seconds: float, head: bytes):
+        """Record a full page fetch and start a variant trial if one is due"""
+        self.variants.record_original(domain, body_bytes, seconds)
+        amp_url = self.variants.discover(domain, url, head)
+        if not document["main_text"]:
+            return
+        mobile_url, _ = self.variants.mobile_url(url, domain, rule)
+        trial = self.variants.next_trial(domain, {"mobile": mobile_url, "amp": amp_url})
+        if trial is not None:
+            self._spawn(self._trial(url, domain, trial[0], trial[1], document))
+
+    async def _trial(self, url: str, domain: str, variant: str, variant_url: Optional[str],
+                     document: Dict[str, Any]):
+        """Fetch a variant in the background and compare its document with the page's"""
+        started = time.perf_counter()
+        similarity, body_bytes = None, 0
+        try:
+            if variant == "rss":
+                variant_document, body_bytes = await self._feed_document(domain, canonicalize_url(url), url)
+            else:
+                _, variant_document, body_bytes = await self._download_variant(variant_url)
+            if variant_document is not None:
+                similarity = document_similarity(document, variant_document)
+        except Exception as e:
+            # A variant that cannot be fetched is not worth retrying on every page
+            logger.warning(f"Error fetching {variant} variant of {url}: {str(e)}")
+            similarity = 0.0
+        self.variants.record_trial(domain, variant, similarity, body_bytes, time.perf_counter() - started)
+
+    async def _verify(self, url: str, domain: str, variant: str, variant_document: Dict[str, Any]):
+        """Fetch the full page behind a variant-served one and drop the variant if they differ"""
+        started = time.perf_counter()
+        try:
+            _, document, body_bytes, _ = await self._download(url)
+        except Exception as e:
+            logger.warning(f"Error verifying {variant} variant against {url}: {str(e)}")
+            return
+        self.variants.record_original(domain, body_bytes, time.perf_counter() - started)
+        if document_similarity(document, variant_document) < self.variants.min_similarity:
+            logger.info(f"{variant} variant of {domain} no longer matches {url}")
+            self.variants.reject(domain, variant)
+
+    async def _download(self, url: str) -> Tuple[httpx.Response, Dict[str, Any], int, bytes]:
+        """Unconditional GET and parse (response, document, body bytes, head bytes)"""
+        self.stats_counters["fetches"] += 1
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            document, body_bytes, head = await self._read_document(response, url)
+        return response, document, body_bytes, head
+
+    async def _download_variant(self, url: str) -> Tuple[httpx.Response, Dict[str, Any], int]:
+        """_download for a variant URL; a redirect off the URL's own domain is an error"""
+        response, document, body_bytes, _ = await self._download(url)
+        domain = normalize_domain(urlparse(url).hostname or "")
+        if not same_site(str(response.url), domain):
+            raise ValueError(f"redirected to {response.url}")
+        return response, document, body_bytes
+
+    async def _probe_head(self, url: str) -> bytes:
+        """First bytes of a page, up to its </head> (at most SCAN_BYTES)"""
+        self.stats_counters["fetches"] += 1
+        head = bytearray()
+        async with self.client.stream("GET", url) as response:
+            response.raise_for_status()
+            async for chunk in response.aiter_bytes():
+                head += chunk
+                if len(head) >= SCAN_BYTES or HEAD_END.search(head):
+                    break
+        self.stats_counters["bytes_read"] += len(head)
+        return bytes(head)
+
+    async def _feed_document(self, domain: str, key: str, url: str) -> Tuple[Optional[Dict[str, Any]], int]:
+        """Document for a page from its item in the domain's feed (None if not in the feed)"""
+        profile = self.variants.profile(domain)
+        if profile is None or not profile.feed_url:
+            return None, 0
+        if not self.variants.feed_fresh(profile):
+            await self.singleflight.do(f"feed:{profile.feed_url}", lambda: self._fetch_feed(profile))
+        item = profile.feed_items.get(key)
+        if item is None:
+            return None, 0
+        return self.parse_html(feed_item_html(*item), url), profile.feed_item_bytes
+
+    async def _fetch_feed(self, profile):
+        """Download and parse a domain's feed (kept for DOCUMENT_CACHE_TTL)"""
+        data = b""
+        try:
+            self.stats_counters["fetches"] += 1
+            async with self.client.stream("GET", profile.feed_url) as response:
+                response.raise_for_status()
+                data = b"".join([chunk async for chunk in self._capped_chunks(response, profile.feed_url)])
+            self.stats_counters["bytes_read"] += len(data)
+        except Exception as e:
+            logger.warning(f"Error fetching feed {profile.feed_url}: {str(e)}")
+        self.variants.store_feed(profile, data, self.cache_ttl)
+
+    def _spawn(self, coro):
+        task = asyncio.ensure_future(coro)
+        self._background.add(task)
+        task.add_done_callback(self._background.discard)
+
+    async def _read_document(self, response: httpx.Response, url: str) -> Tuple[Dict[str, Any], int, bytes]:
+        """
+        Stream a response body into the extractor
+
+        The streaming backend is fed chunk by chunk on the event loop,
+        yielding between parser-sized pieces, and the download stops as
+        soon as it has everything it needs. Other backends parse the whole
+        page in one call, so their bodies are read as bytes and, above
+        DOCUMENT_PARSE_INLINE_BYTES, parsed in the "parse" process pool.
+        Reading stops at DOCUMENT_MAX_BYTES either way, and a larger
+        Content-Length is rejected before anything is read. The charset is
+        resolved from the header, a BOM or a <meta charset> near the top of
+        the page before falling back to detection (see detect_charset).
+
+        Args:
+            response: Open streaming response
+            url: Page URL
+
+        Returns:
+            Parsed document, the number of body bytes read and the first
+            SCAN_BYTES of the body (for variant discovery)
+        """
+        length = response.headers.get("content-length", "")
+        if length.isdigit() and int(length) > self.max_bytes:
+            self.stats_counters["oversized"] += 1
+            raise ValueError(f"Content-Length {length} exceeds DOCUMENT_MAX_BYTES ({self.max_bytes})")
+
+        host = urlparse(url).netloc.lower()
+        content_type = response.headers.get("content-type")
+        extractor = get_extractor()
+        chunks = self._capped_chunks(response, url)
+        self.stats_counters["parses"] += 1
+
+        if not isinstance(extractor, StreamExtractor):
+            body = b"".join([chunk async for chunk in chunks])
+            self.stats_counters["bytes_read"] += len(body)
+            encoding = self._detect_charset(host, content_type, body[:SNIFF_BYTES])
+            started = time.perf_counter()
+            document = await self._parse_body(body, encoding, url, extractor.name)
+            self._record_extraction(url, document, len(body), time.perf_counter() - started)
+            return document, len(body), body[:SCAN_BYTES]
+
+        # Hold back the first bytes until the charset is known
+        head = bytearray()
+        if charset_from_content_type(content_type) is None:
+            async for chunk in chunks:
+                head += chunk
+                if len(head) >= SNIFF_BYTES:
+                    break
+        encoding = self._detect_charset(host, content_type, bytes(head))
+        decoder = codecs.getincrementaldecoder(encoding)(errors="replace")
+        extraction = extractor.start(url)
+        received = len(head)
+        scan = head[:SCAN_BYTES]
+
+        done = await self._feed(extraction, decoder.decode(bytes(head)))
+        if not done:
+            async for chunk in chunks:
+                received += len(chunk)
+                if len(scan) < SCAN_BYTES:
+                    scan += chunk[:SCAN_BYTES - len(scan)]
+                if await self._feed(extraction, decoder.decode(chunk)):
+                    done = True
+                    break
+        if done:
+            self.stats_counters["early_stops"] += 1
+        else:
+            await self._feed(extraction, decoder.decode(b"", final=True))
+        await chunks.aclose()
+        self.stats_counters["bytes_read"] += received
+        document = extraction.close()
+        self._record_extraction(url, document, received, extraction.parse_seconds)
+        return document, received, bytes(scan)
+
+    async def _capped_chunks(self, response: httpx.Response, url: str):
+        """Body chunks, cut off at DOCUMENT_MAX_BYTES"""
+        received = 0
+        async for chunk in response.aiter_bytes():
+            chunk = chunk[:self.max_bytes - received]
+            received += len(chunk)
+            yield chunk
+            if received >= self.max_bytes:
+                self.stats_counters["truncated"] += 1
+                logger.warning(f"Stopped reading {url} at DOCUMENT_MAX_BYTES ({self.max_bytes})")
+                return
+
+    def _detect_charset(self, host: str, content_type: Optional[str], head: bytes) -> str:
+        """Resolve the body charset, recording how it was found and how long it took per host"""
+        started = time.perf_counter()
+        encoding, source = detect_charset(content_type, head)
+        elapsed = time.perf_counter() - started
+
+        stats = self.charset_stats.get(host)
+        if stats is None:
+            if len(self.charset_stats) >= 1000:
+                return encoding
+            stats = self.charset_stats[host] = {
+                "pages": 0, "detect_seconds": 0.0, "max_detect_seconds": 0.0, "sources": {}
+            }
+        stats["pages"] += 1
+        stats["detect_seconds"] += elapsed
+        stats["max_detect_seconds"] = max(stats["max_detect_seconds"], elapsed)
+        stats["sources"][source] = stats["sources"].get(source, 0) + 1
+        return encoding
+
+    def _record_extraction(self, url: str, document: Dict[str, Any], body_bytes: int, seconds: float):
+        """
+        Record one extraction for the page's domain
+
+        seconds is parse time only for the stream backend; for whole-page
+        parses it is the wall time of the parse call, so it includes any
+        wait for a free parse worker.
+        """
+        domain = normalize_domain(urlparse(url).hostname or "")
+        stats = self.extraction_stats.get(domain)
+        if stats is None:
+            if len(self.extraction_stats) >= 1000:
+                return
+            rule = self.rules.rule_for(url)
+            stats = self.extraction_stats[domain] = {
+                "pages": 0, "extract_seconds": 0.0, "max_extract_seconds": 0.0,
+                "body_bytes": 0, "text_chars": 0, "empty": 0,
+                "rule": rule.domain if rule is not None else None,
+            }
+        stats["pages"] += 1
+        stats["extract_seconds"] += seconds
+        stats["max_extract_seconds"] = max(stats["max_extract_seconds"], seconds)
+        stats["body_bytes"] += body_bytes
+        stats["text_chars"] += len(document["main_text"])
+        if not document["main_text"]:
+            stats["empty"] += 1
+
+    @staticmethod
+    async def _feed(extraction, text: str) -> bool:
+        """Feed decoded text in parser-sized pieces; True once extraction is done"""
+        data = text.encode("utf-8")
+        step = StreamExtractor.chunk_size
+        for offset in range(0, len(data), step):
+            if extraction.feed(data[offset:offset + step]):
+                return True
+            if offset + step < len(data):
+                # Let other requests run between pieces of a large chunk
+                await asyncio.sleep(0)
+        return False
+
+    async def _parse_body(self, data: bytes, encoding: str, url: str, backend: str) -> Dict[str, Any]:
+        """Parse a whole body, in a worker process unless it is small"""
+        if len(data) >= self.parse_inline_bytes:
+            try:
+                executor = get_process_executor("parse", initializer=warm_worker)
+                document = await asyncio.get_running_loop().run_in_executor(
+                    executor, extract_bytes, data, encoding, url, backend
+                )
+                self.stats_counters["offloaded_parses"] += 1
+                return document
+            except BrokenProcessPool as e:
+                logger.warning(f"Parse worker died, parsing {url} inline: {str(e)}")
+        return self.parse_html(data.decode(encoding, errors="replace"), url, backend)
+
+    def _store(self, key: str, response: Optional[httpx.Response], document: Dict[str, Any], body_bytes: int,
+               revalidate: bool = True):
+        """
+        Keep a parsed page if it can be reused or revalidated later
+
+        Args:
+            response: Response the document came from (None for feed items)
+            revalidate: Keep the response's validators; False for variant
+                copies, whose validators do not apply to the page URL
+        """
+        headers = response.headers if response is not None else httpx.Headers()
+        lifetime = freshness_lifetime(headers, self.cache_ttl, self.cache_max_ttl)
+        etag = headers.get("etag") if revalidate else None
+        last_modified = headers.get("last-modified") if revalidate else None
+        if lifetime is None or (lifetime <= 0 and not etag and not last_modified):
+            self._cache.pop(key, None)
+            return
+        if not (document["title"] or document["text"]):
+            return
+        self._cache[key] = _CachedPage(document, etag, last_modified, lifetime, body_bytes)
+        self._cache.move_to_end(key)
+        while len(self._cache) > self.cache_max_entries:
+            self._cache.popitem(last=False)
+
+    def _record_revalidation(self, host: str, saved_bytes: Optional[int]):
+        """Count a conditional request; saved_bytes is None when the page changed"""
+        stats = self.revalidation_stats.get(host)
+        if stats is None:
+            if len(self.revalidation_stats) >= 1000:
+                return
+            stats = self.revalidation_stats[host] = {"revalidations": 0, "not_modified": 0, "bytes_saved": 0}
+        stats["revalidations"] += 1
+        if saved_bytes is not None:
+            stats["not_modified"] += 1
+            stats["bytes_saved"] += saved_bytes
+
+    @staticmethod
+    def parse_html(html: str, url: str, backend: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Extract title, summary, images, body text and main text from HTML
+
+        Args:
+            html: Page HTML
+            url: Page URL, for resolving relative image URLs
+            backend: Extraction backend (defaults to HTML_PARSER_BACKEND)
+
+        Returns:
+            Parsed document dict
+        """
+        return get_extractor(backend).extract(html, url)
+
+    def stats(self) -> Dict[str, Any]:
+        """Document cache counters"""
+        return {
+            **self.stats_counters,
+            "entries": len(self._cache),
+            "in_flight": self.singleflight.stats()["in_flight"],
+            "parser": get_extractor().name,
+            "revalidation": {
+                host: {**stats, "not_modified_rate": round(stats["not_modified"] / stats["revalidations"], 3)}
+                for host, stats in self.revalidation_stats.items()
+            },
+            "charset": {
+                host: {
+                    "pages": stats["pages"],
+                    "avg_detect_ms": round(stats["detect_seconds"] / stats["pages"] * 1000, 3),
+                    "max_detect_ms": round(stats["max_detect_seconds"] * 1000, 3),
+                    "sources": stats["sources"],
+                }
+                for host, stats in self.charset_stats.items()
+            },
+            "extraction": {
+                domain: {
+                    "pages": stats["pages"],
+                    "avg_extract_ms": round(stats["extract_seconds"] / stats["pages"] * 1000, 3),
+                    "max_extract_ms": round(stats["max_extract_seconds"] * 1000, 3),
+                    "avg_text_chars": round(stats["text_chars"] / stats["pages"]),
+                    # Main-text characters per KiB downloaded
+                    "text_per_kib": round(stats["text_chars"] / max(stats["body_bytes"], 1) * 1024, 1),
+                    "empty": stats["empty"],
+                    "rule": stats["rule"],
+                }
+                for domain, stats in self.extraction_stats.items()
+            },
+            "variants": self.variants.stats(),
+        }
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def close(self):
+        """Stop background variant fetches and close HTTP client"""
+        for task in list(self._background):
+            task.cancel()
+        if self._background:
+            await asyncio.gather(*self._background, return_exceptions=True)
+        await self.client.aclose()
+
@@ -0,0 +1,250 @@
+"""
+Executor Service - Named, workload-isolated thread and process pools with queue metrics
+"""
+
+import os
+import time
+import logging
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from typing import Callable, Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+# Executor name -> (env var with worker count, default worker count)
+EXECUTOR_SIZES = {
+    "llm": ("LLM_EXECUTOR_WORKERS", 32),
+    "stream": ("STREAM_EXECUTOR_WORKERS", 32),
+    "file_io": ("FILE_IO_EXECUTOR_WORKERS", 8),
+}
+
+# Process pool name -> (env var with worker count, default worker count)
+PROCESS_EXECUTOR_SIZES = {
+    "parse": ("PARSE_EXECUTOR_WORKERS", 2),
+}
+
+_executors: Dict[str, Any] = {}
+_executors_lock = threading.Lock()
+
+
+class InstrumentedExecutor(ThreadPoolExecutor):
+    """ThreadPoolExecutor that tracks active, queued and completed tasks plus queue wait time"""
+
+    def __init__(self, name: str, max_workers: int):
+        super().__init__(max_workers=max_workers, thread_name_prefix=f"{name}-worker")
+        self.name = name
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.active = 0
+        self.queued = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def submit(self, fn, /, *args, **kwargs):
+        enqueued_at = time.monotonic()
+        with self._stats_lock:
+            self.queued += 1
+
+        started = False
+
+        def run():
+            nonlocal started
+            waited = time.monotonic() - enqueued_at
+            with self._stats_lock:
+                started = True
+                self.queued -= 1
+                self.active += 1
+                self.total_wait += waited
+                self.max_wait = max(self.max_wait, waited)
+            failed = False
+            try:
+                return fn(*args, **kwargs)
+            except BaseException:
+                failed = True
+                raise
+            finally:
+                with self._stats_lock:
+                    self.active -= 1
+                    self.completed += 1
+                    if failed:
+                        self.failed += 1
+
+        def on_done(future):
+            # Cancelled while still queued (caller cancelled or
+            # shutdown(cancel_futures=True)); run() never took it off
+            if future.cancelled():
+                with self._stats_lock:
+                    if not started:
+                        self.queued -= 1
+
+        try:
+            future = super().submit(run)
+        except Exception:
+            # Executor shut down; the task never got queued
+            with self._stats_lock:
+                self.queued -= 1
+            raise
+        future.add_done_callback(on_done)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of executor counters
+
+        Returns:
+            Dict with worker count, task counts and queue wait times (ms)
+        """
+        with self._stats_lock:
+            started = self.completed + self.active
+            return {
+                "max_workers": self.max_workers,
+                "active": self.active,
+                "queued": self.queued,
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_queue_wait_ms": (self.total_wait / started * 1000) if started else 0.0,
+                "max_queue_wait_ms": self.max_wait * 1000,
+            }
+
+
+class InstrumentedProcessExecutor(ProcessPoolExecutor):
+    """
+    ProcessPoolExecutor with spawned workers that tracks in-flight tasks and round-trip time
+
+    Workers are spawned rather than forked (the parent runs an event loop
+    and thread pools) and warmed by initializer before their first task.
+    Tasks run in other processes, so active/queued are derived from the
+    number in flight, and times cover submit to result (queue + IPC + work).
+    """
+
+    def __init__(self, name: str, max_workers: int, initializer: Optional[Callable] = None):
+        super().__init__(
+            max_workers=max_workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=initializer,
+        )
+        self.name = name
+        self.max_workers = max_workers
+        self._stats_lock = threading.Lock()
+        self.in_flight = 0
+        self.completed = 0
+        self.failed = 0
+        self.total_time = 0.0
+        self.max_time = 0.0
+
+    @property
+    def broken(self) -> bool:
+        """Whether a worker died and the pool no longer accepts tasks"""
+        return bool(getattr(self, "_broken", False))
+
+    def submit(self, fn, /, *args, **kwargs):
+        submitted_at = time.monotonic()
+        with self._stats_lock:
+            self.in_flight += 1
+        try:
+            future = super().submit(fn, *args, **kwargs)
+        except Exception:
+            with self._stats_lock:
+                self.in_flight -= 1
+            raise
+
+        def done(future):
+            elapsed = time.monotonic() - submitted_at
+            with self._stats_lock:
+                self.in_flight -= 1
+                self.completed += 1
+                if future.cancelled() or future.exception() is not None:
+                    self.failed += 1
+                self.total_time += elapsed
+                self.max_time = max(self.max_time, elapsed)
+
+        future.add_done_callback(done)
+        return future
+
+    def stats(self) -> Dict[str, Any]:
+        """
+        Snapshot of executor counters
+
+        Returns:
+            Dict with worker count, task counts and round-trip times (ms)
+        """
+        with self._stats_lock:
+            return {
+                "max_workers": self.max_workers,
+                "active": min(self.in_flight, self.max_workers),
+                "queued": max(0, self.in_flight - self.max_workers),
+                "completed": self.completed,
+                "failed": self.failed,
+                "avg_task_ms": (self.total_time / self.completed * 1000) if self.completed else 0.0,
+                "max_task_ms": self.max_time * 1000,
+            }
+
+
+def get_executor(name: str) -> InstrumentedExecutor:
+    """
+    Get (or lazily create) the named executor
+
+    Args:
+        name: Executor name, one of EXECUTOR_SIZES
+
+    Returns:
+        Shared executor for that workload
+    """
+    executor = _executors.get(name)
+    if executor is not None:
+        return executor
+
+    with _executors_lock:
+        if name not in _executors:
+            env_var, default = EXECUTOR_SIZES[name]
+            max_workers = max(1, int(os.getenv(env_var, str(default))))
+            _executors[name] = InstrumentedExecutor(name, max_workers)
+            logger.info(f"Created '{name}' executor with {max_workers} workers")
+        return _executors[name]
+
+
+def get_process_executor(name: str, initializer: Optional[Callable] = None) -> InstrumentedProcessExecutor:
+    """
+    Get (or lazily create) the named process pool
+
+    A pool whose worker died is replaced on the next call.
+
+    Args:
+        name: Pool name, one of PROCESS_EXECUTOR_SIZES
+        initializer: Run once in each worker (e.g. to warm imports); only
+            used when the pool is created
+
+    Returns:
+        Shared process pool for that workload
+    """
+    executor = _executors.get(name)
+    if executor is not None and not executor.broken:
+        return executor
+
+    with _executors_lock:
+        executor = _executors.get(name)
+        if executor is None or executor.broken:
+            if executor is not None:
+                logger.warning(f"'{name}' process pool is broken; starting a new one")
+                executor.shutdown(wait=False)
+            env_var, default = PROCESS_EXECUTOR_SIZES[name]
+            max_workers = max(1, int(os.getenv(env_var, str(default))))
+            executor = _executors[name] = InstrumentedProcessExecutor(name, max_workers, initializer)
+            logger.info(f"Created '{name}' process pool with {max_workers} workers")
+        return executor
+
+
+def executor_stats() -> Dict[str, Dict[str, Any]]:
+    """Stats for every executor created so far"""
+    return {name: executor.stats() for name, executor in _executors.items()}
+
+
+def shutdown_executors(wait: bool = False):
+    """Shut down all named executors and process pools"""
+    with _executors_lock:
+        for executor in _executors.values():
+            executor.shutdown(wait=wait)
+        _executors.clear()
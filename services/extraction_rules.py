@@ -0,0 +1,313 @@
+"""
+Extraction Rules - Per-domain extraction rules and the fallback content scorer
+"""
+
+import os
+import re
+import json
+import logging
+from typing import Any, Dict, List, Optional, Tuple
+from urllib.parse import urlparse
+
+from services.url_normalizer import normalize_domain
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+# Image "type" values a rule's image preference may order
+IMAGE_TYPES = ("json_ld", "og:image", "twitter:image", "img_tag")
+
+# tag, .class, #id or [attr] / [attr=value], compounded without combinators
+SELECTOR_PART = re.compile(
+    r"""(?P<tag>[a-zA-Z][\w-]*)|\.(?P<cls>[\w-]+)|#(?P<id>[\w-]+)"""
+    r"""|\[(?P<attr>[\w-]+)(?:=(?P<q>["']?)(?P<value>[^"'\]]*)(?P=q))?\]"""
+)
+
+# Readability-style scoring (see ContentScorer)
+PARAGRAPH_TAGS = frozenset(("p", "pre", "td"))
+MIN_PARAGRAPH_CHARS = 25
+TAG_WEIGHTS = {
+    "div": 5, "article": 5,
+    "pre": 3, "td": 3, "blockquote": 3,
+    "address": -3, "ol": -3, "ul": -3, "dl": -3, "dd": -3, "dt": -3, "li": -3, "form": -3,
+    "h1": -5, "h2": -5, "h3": -5, "h4": -5, "h5": -5, "h6": -5, "th": -5,
+}
+POSITIVE_NAMES = re.compile(r"article|body|content|entry|hentry|main|page|post|text|blog|story", re.IGNORECASE)
+NEGATIVE_NAMES = re.compile(
+    r"comment|com-|contact|foot|masthead|media|meta|outbrain|promo|related|scroll|share|shoutbox|"
+    r"sidebar|sponsor|shopping|tags|tool|widget",
+    re.IGNORECASE
+)
+COMMAS = (",", "，", "、")
+# Raw characters of page text kept for scoring
+MAX_SCORED_TEXT = 500000
+
+
+class CompiledSelector:
+    """
+    A simple CSS selector compiled for every extraction backend
+
+    Supports a tag, classes, an id and [attr] / [attr=value] tests in one
+    compound selector (e.g. "div.article-body", "#story", "[itemprop=articleBody]").
+    Combinators are not supported, since the stream backend matches each
+    start tag on its own.
+    """
+
+    __slots__ = ("css", "tag", "classes", "element_id", "attributes", "xpath")
+
+    def __init__(self, selector: str):
+        self.css = selector.strip()
+        self.tag: Optional[str] = None
+        self.classes: List[str] = []
+        self.element_id: Optional[str] = None
+        self.attributes: List[Tuple[str, Optional[str]]] = []
+
+        position = 0
+        for match in SELECTOR_PART.finditer(self.css):
+            if match.start() != position or (match.group("tag") and position):
+                break
+            position = match.end()
+            if match.group("tag"):
+                self.tag = match.group("tag").lower()
+            elif match.group("cls"):
+                self.classes.append(match.group("cls"))
+            elif match.group("id"):
+                self.element_id = match.group("id")
+            else:
+                self.attributes.append((match.group("attr").lower(), match.group("value")))
+        if not self.css or position != len(self.css):
+            raise ValueError(f"Unsupported selector {selector!r}")
+
+        self.xpath = etree.XPath(self._xpath()) if etree is not None else None
+
+    def _xpath(self) -> str:
+        tests = [f"[contains(concat(' ', normalize-space(@class), ' '), ' {name} ')]" for name in self.classes]
+        if self.element_id:
+            tests.append(f"[@id='{self.element_id}']")
+        for attribute, value in self.attributes:
+            tests.append(f"[@{attribute}]" if value is None else f"[@{attribute}='{value}']")
+        return f"//{self.tag or '*'}{''.join(tests)}"
+
+    def matches(self, tag: str, attrib) -> bool:
+        """Whether a start tag (name and attribute mapping) matches"""
+        if self.tag and tag != self.tag:
+            return False
+        if self.element_id and attrib.get("id") != self.element_id:
+            return False
+        if self.classes:
+            classes = (attrib.get("class") or "").split()
+            if any(name not in classes for name in self.classes):
+                return False
+        for attribute, value in self.attributes:
+            actual = attrib.get(attribute)
+            if actual is None or (value is not None and actual != value):
+                return False
+        return True
+
+
+def _as_list(value: Any) -> List[Any]:
+    if value is None:
+        return []
+    return value if isinstance(value, list) else [value]
+
+
+class ExtractionRule:
+    """
+    How to extract pages of one site
+
+    Attributes:
+        domain: Normalized domain the rule applies to (and its subdomains)
+        content: Main-content selectors, tried in order before the generic ones
+        remove: Boilerplate selectors removed from the main text
+        images: Image types in order of preference (others keep their order after them)
+        rewrites: (pattern, replacement) regexes turning a page URL into a
+            lighter variant (mobile/AMP) to fetch instead; the first match wins
+    """
+
+    __slots__ = ("domain", "content", "remove", "images", "rewrites")
+
+    def __init__(self, domain: str, content: Any = None, remove: Any = None, images: Any = None,
+                 rewrites: Any = None):
+        self.domain = domain
+        self.content = [CompiledSelector(selector) for selector in _as_list(content)]
+        self.remove = [CompiledSelector(selector) for selector in _as_list(remove)]
+        self.images = _as_list(images)
+        for image_type in self.images:
+            if image_type not in IMAGE_TYPES:
+                raise ValueError(f"Unknown image type {image_type!r}")
+        self.rewrites = [(re.compile(pattern), replacement) for pattern, replacement in _as_list(rewrites)]
+
+    def rewrite(self, url: str) -> str:
+        """URL of the variant to fetch for url (url itself if no rewrite matches)"""
+        for pattern, replacement in self.rewrites:
+            if pattern.search(url):
+                return pattern.sub(replacement, url, count=1)
+        return url
+
+    def order_images(self, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Images sorted by the rule's type preference (stable)"""
+        if not self.images:
+            return images
+        rank = {image_type: i for i, image_type in enumerate(self.images)}
+        return sorted(images, key=lambda image: rank.get(image["type"], len(rank)))
+
+
+class ExtractionRules:
+    """
+    Registry of per-domain extraction rules
+
+    Rules are keyed by normalize_domain(), like SearchService domains, so
+    www./m. hosts share the rule of their site, and a rule for cnyes.com
+    also covers news.cnyes.com. Selectors and patterns are compiled when
+    the registry is built; an invalid rule is logged and skipped.
+    """
+
+    def __init__(self, rules: Optional[Dict[str, Dict[str, Any]]] = None):
+        self.rules: Dict[str, ExtractionRule] = {}
+        for domain, spec in (rules or {}).items():
+            domain = normalize_domain(domain)
+            try:
+                self.rules[domain] = ExtractionRule(domain, **spec)
+            except (TypeError, ValueError, re.error) as e:
+                logger.warning(f"Skipping extraction rule for {domain}: {str(e)}")
+
+    @classmethod
+    def from_file(cls, path: str) -> "ExtractionRules":
+        """
+        Load rules from a JSON file
+
+        Args:
+            path: JSON object mapping domain -> {"content", "remove", "images", "rewrites"}
+
+        Returns:
+            Registry (empty if the file cannot be read)
+        """
+        try:
+            with open(path, encoding="utf-8") as f:
+                return cls(json.load(f))
+        except (OSError, ValueError) as e:
+            logger.warning(f"Could not load extraction rules from {path}: {str(e)}")
+            return cls()
+
+    def rule_for(self, url: str) -> Optional[ExtractionRule]:
+        """
+        Rule for a page URL
+
+        Args:
+            url: Page URL
+
+        Returns:
+            Rule of the page's domain or its closest parent domain, or None
+        """
+        if not self.rules:
+            return None
+        domain = normalize_domain(urlparse(url).hostname or "")
+        while domain:
+            rule = self.rules.get(domain)
+            if rule is not None:
+                return rule
+            _, _, domain = domain.partition(".")
+            if "." not in domain:
+                return None
+        return None
+
+    def __len__(self) -> int:
+        return len(self.rules)
+
+
+_registry: Optional[ExtractionRules] = None
+
+
+def get_extraction_rules() -> ExtractionRules:
+    """The process-wide rule registry, loaded from EXTRACTION_RULES_FILE on first use"""
+    global _registry
+    if _registry is None:
+        path = os.getenv("EXTRACTION_RULES_FILE")
+        _registry = ExtractionRules.from_file(path) if path else ExtractionRules()
+        if _registry.rules:
+            logger.info(f"Loaded extraction rules for {len(_registry)} domains")
+    return _registry
+
+
+def _class_weight(attrib) -> int:
+    weight = 0
+    for name in (attrib.get("class"), attrib.get("id")):
+        if name:
+            if NEGATIVE_NAMES.search(name):
+                weight -= 25
+            if POSITIVE_NAMES.search(name):
+                weight += 25
+    return weight
+
+
+class ContentScorer:
+    """
+    Readability-style main content scorer, fed start/end/data events
+
+    Each paragraph (p, pre, td) of at least MIN_PARAGRAPH_CHARS characters
+    scores 1 + its commas + 1 per 100 characters (max 3); its parent gets
+    the score and its grandparent half of it. A scored element's total,
+    plus a tag weight and a class/id weight, is scaled by (1 - link
+    density), and the text of the best element is the main text. Events
+    come live from the stream backend or from walking a DOM, so every
+    backend picks the same element. Only raw lengths of joined text are
+    used, so how text is split into data events does not matter.
+    """
+
+    __slots__ = ("pieces", "length", "link_chars", "link_depth", "stack", "best", "best_score")
+
+    def __init__(self):
+        self.pieces: List[str] = []
+        self.length = 0
+        self.link_chars = 0
+        self.link_depth = 0
+        # Per open element: [tag, weight, score, first piece, text offset, link chars]
+        self.stack: List[list] = []
+        self.best: Optional[Tuple[int, int]] = None
+        self.best_score = 0.0
+
+    def start(self, tag, attrib):
+        if tag == "a":
+            self.link_depth += 1
+        weight = TAG_WEIGHTS.get(tag, 0) + _class_weight(attrib)
+        self.stack.append([tag, weight, 0.0, len(self.pieces), self.length, self.link_chars])
+
+    def data(self, data: str):
+        if self.length >= MAX_SCORED_TEXT:
+            return
+        self.pieces.append(data)
+        self.length += len(data)
+        if self.link_depth:
+            self.link_chars += len(data)
+
+    def end(self, tag):
+        if not self.stack:
+            return
+        tag, weight, score, first_piece, offset, link_chars = self.stack.pop()
+        if tag == "a":
+            self.link_depth -= 1
+        if tag in PARAGRAPH_TAGS and self.stack:
+            text = ' '.join("".join(self.pieces[first_piece:]).split())
+            if len(text) >= MIN_PARAGRAPH_CHARS:
+                points = 1 + sum(text.count(comma) for comma in COMMAS) + min(len(text) // 100, 3)
+                self.stack[-1][2] += points
+                if len(self.stack) > 1:
+                    self.stack[-2][2] += points / 2
+        if score > 0:
+            length = self.length - offset
+            density = (self.link_chars - link_chars) / length if length else 0.0
+            total = (score + weight) * (1 - density)
+            if total > self.best_score:
+                self.best_score = total
+                self.best = (offset, self.length)
+
+    def text(self) -> str:
+        """Raw text of the best element ("" if no element scored)"""
+        if self.best is None:
+            return ""
+        start, end = self.best
+        return "".join(self.pieces)[start:end]
@@ -0,0 +1,260 @@
+"""
+File Cache Store - One file per key under CACHE_DIR with TTL and a byte budget
+"""
+
+import os
+import math
+import time
+import fcntl
+import threading
+import asyncio
+import logging
+from pathlib import Path
+from typing import Callable, Optional, Dict, Any
+
+from services.executor_service import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Present once the directory's mtimes are expiry times; directories
+# without it were written by releases that stored the expiry in the file
+LAYOUT_MARKER = ".expiry-in-mtime"
+
+# Held by the one process migrating a directory to LAYOUT_MARKER
+MIGRATION_LOCK = ".migrate.lock"
+
+
+class FileCacheStore:
+    """
+    Stores each cache entry as <key>.json
+
+    File timestamps carry the bookkeeping so expiry and eviction never need
+    to open a file: mtime is the entry's expiry time and atime is its last
+    access time (set explicitly, since volumes are often mounted noatime).
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(exist_ok=True)
+        self.max_bytes = max_bytes
+        self.expired = 0
+        self.evicted = 0
+        self.evicted_bytes = 0
+        self.total_bytes = 0
+        self.entries = 0
+        self._migrated = False
+
+    @property
+    def migrated(self) -> bool:
+        """Whether the directory's mtimes are expiry times (checked until true)"""
+        if not self._migrated:
+            self._migrated = (self.cache_dir / LAYOUT_MARKER).exists()
+        return self._migrated
+
+    async def migrate_legacy(self, expiry_of: Callable[[bytes], float]) -> int:
+        """
+        Move the expiry of entries written by earlier releases into their mtime
+
+        Those releases left mtime at the write time, so without this every
+        existing entry would read as expired and the whole tier would be
+        flushed on deploy. Entries without an expiry (plain JSON from before
+        keys were canonicalized) can no longer be looked up and are dropped.
+        Runs once per directory, in one process (MIGRATION_LOCK), on the
+        file I/O executor; until LAYOUT_MARKER exists reads and sweeps leave
+        past-mtime files alone.
+
+        Args:
+            expiry_of: Returns the hard expiry embedded in an entry
+                (math.inf for none); raising drops the entry
+
+        Returns:
+            Number of entries kept
+        """
+        if self.migrated:
+            return 0
+        return await self._run(self._migrate_sync, expiry_of)
+
+    def _migrate_sync(self, expiry_of: Callable[[bytes], float]) -> int:
+        fd = os.open(self.cache_dir / MIGRATION_LOCK, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                # Another worker is migrating
+                return 0
+            if self.migrated:
+                return 0
+
+            now = time.time()
+            kept = 0
+            dropped = 0
+            for path in self.cache_dir.glob("*.json"):
+                try:
+                    expires_at = expiry_of(path.read_bytes())
+                except FileNotFoundError:
+                    continue
+                except Exception as e:
+                    logger.warning(f"Dropping unreadable legacy cache file {path.name}: {str(e)}")
+                    expires_at = now
+                if expires_at <= now or expires_at == math.inf:
+                    self._remove(path)
+                    dropped += 1
+                    continue
+                os.utime(path, (now, expires_at))
+                kept += 1
+
+            (self.cache_dir / LAYOUT_MARKER).touch()
+            self._migrated = True
+            if kept or dropped:
+                logger.info(f"File cache migrated: {kept} legacy entries kept, {dropped} expired or unkeyed")
+            return kept
+        finally:
+            os.close(fd)
+
+    def _path(self, key: str) -> Path:
+        return self.cache_dir / f"{key}.json"
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor("file_io"), fn, *args)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Read entry bytes for key
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Stored bytes, or None if missing or expired
+        """
+        return await self._run(self._get_sync, key)
+
+    def _get_sync(self, key: str) -> Optional[bytes]:
+        path = self._path(key)
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return None
+
+        now = time.time()
+        if st.st_mtime <= now:
+            if not self.migrated:
+                # Possibly a legacy entry the migration has yet to reach
+                return None
+            self._remove(path)
+            self.expired += 1
+            return None
+
+        data = path.read_bytes()
+        # Record access for LRU eviction, keeping the expiry in mtime
+        os.utime(path, (now, st.st_mtime))
+        return data
+
+    async def set(self, key: str, data: bytes, expires_at: float):
+        """
+        Atomically write entry bytes for key
+
+        Args:
+            key: Cache key
+            data: Serialized entry
+            expires_at: Unix time after which the entry is ignored and swept
+        """
+        await self._run(self._set_sync, key, data, expires_at)
+
+    def _set_sync(self, key: str, data: bytes, expires_at: float):
+        path = self._path(key)
+        tmp_path = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp_path.write_bytes(data)
+        os.utime(tmp_path, (time.time(), expires_at))
+        # Readers never see a partially written file
+        os.replace(tmp_path, path)
+
+    async def delete(self, key: str) -> bool:
+        """Delete entry for key; True if a file was removed"""
+        return await self._run(self._remove, self._path(key))
+
+    @staticmethod
+    def _remove(path: Path) -> bool:
+        try:
+            path.unlink()
+            return True
+        except FileNotFoundError:
+            return False
+
+    async def sweep(self) -> Dict[str, int]:
+        """
+        Delete expired entries and evict least recently used ones over budget
+
+        Returns:
+            Counts of expired and evicted entries for this sweep
+        """
+        return await self._run(self._sweep_sync)
+
+    def _sweep_sync(self) -> Dict[str, int]:
+        if not self.migrated:
+            return {"expired": 0, "evicted": 0}
+        now = time.time()
+        expired = 0
+        live = []
+        total_bytes = 0
+
+        with os.scandir(self.cache_dir) as it:
+            for dir_entry in it:
+                if dir_entry.name.endswith(".tmp"):
+                    # Leftover from a writer that crashed mid-write
+                    try:
+                        if dir_entry.stat().st_ctime < now - 3600:
+                            self._remove(Path(dir_entry.path))
+                    except FileNotFoundError:
+                        pass
+                    continue
+                if not dir_entry.name.endswith(".json") or not dir_entry.is_file():
+                    continue
+                try:
+                    st = dir_entry.stat()
+                except FileNotFoundError:
+                    continue
+                if st.st_mtime <= now:
+                    if self._remove(Path(dir_entry.path)):
+                        expired += 1
+                    continue
+                live.append((st.st_atime, st.st_size, dir_entry.path))
+                total_bytes += st.st_size
+
+        evicted = 0
+        evicted_bytes = 0
+        if self.max_bytes > 0 and total_bytes > self.max_bytes:
+            # Evict down to 90% of the budget so sweeps don't thrash at the limit
+            target = int(self.max_bytes * 0.9)
+            live.sort()
+            for _, size, path in live:
+                if total_bytes <= target:
+                    break
+                if self._remove(Path(path)):
+                    evicted += 1
+                    evicted_bytes += size
+                    total_bytes -= size
+
+        self.expired += expired
+        self.evicted += evicted
+        self.evicted_bytes += evicted_bytes
+        self.total_bytes = total_bytes
+        self.entries = len(live) - evicted
+        if expired or evicted:
+            logger.info(f"File cache sweep: {expired} expired, {evicted} evicted ({evicted_bytes} bytes)")
+        return {"expired": expired, "evicted": evicted}
+
+    def stats(self) -> Dict[str, Any]:
+        """Store counters (sizes as of the last sweep)"""
+        return {
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "evicted_bytes": self.evicted_bytes,
+        }
+
+    async def close(self):
+        pass
@@ -5,6 +5,8 @@ Gemini Service - Handles Google Gemini API integration
 import os
 import asyncio
 import logging
+import threading
+from contextlib import aclosing
 from typing import List, Dict, Any, Optional, AsyncGenerator
 from tenacity import retry, stop_after_attempt, wait_exponential
 
@@ -12,8 +14,13 @@ import google.generativeai as genai
 from google.generativeai.types import HarmCategory, HarmBlockThreshold
 from google.api_core import exceptions as google_exceptions
 
+from services.executor_service import get_executor
+
 logger = logging.getLogger(__name__)
 
+# Supported values for GEMINI_BACKEND
+SUPPORTED_BACKENDS = ("async", "executor")
+
 
 class GeminiService:
     """Service for interacting with Google Gemini API"""
@@ -35,6 +42,108 @@ class GeminiService:
             HarmCategory.HARM_CATEGORY_DANGEROUS_CONTENT: HarmBlockThreshold.BLOCK_MEDIUM_AND_ABOVE,
         }
         
+        # Call backend: "async" uses the SDK's native asyncio client,
+        # "executor" runs the blocking client in a thread pool (fallback)
+        self.backend = os.getenv("GEMINI_BACKEND", "async").strip().lower()
+        if self.backend not in SUPPORTED_BACKENDS:
+            logger.warning(f"Unknown GEMINI_BACKEND '{self.backend}', falling back to 'async'")
+            self.backend = "async"
+        
+        # Cap on concurrent in-flight Gemini calls for this service instance
+        self.max_concurrency = max(1, int(os.getenv("GEMINI_MAX_CONCURRENCY", "256")))
+        self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        logger.info(f"Gemini backend: {self.backend} (max concurrency: {self.max_concurrency})")
+    
+    async def _generate_content(self, prompt: str, **kwargs) -> Any:
+        """
+        Run a single generate_content call on the configured backend
+        
+        Args:
+            prompt: Prompt text
+            **kwargs: Extra arguments for generate_content (safety_settings, generation_config)
+            
+        Returns:
+            Gemini response object
+        """
+        async with self._semaphore:
+            if self.backend == "executor":
+                # Run synchronous Gemini API call in the LLM thread pool
+                loop = asyncio.get_running_loop()
+                return await loop.run_in_executor(
+                    get_executor("llm"),
+                    lambda: self.model.generate_content(prompt, **kwargs)
+                )
+            return await self.model.generate_content_async(prompt, **kwargs)
+    
+    async def _stream_content(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        """
+        Stream text chunks of a generate_content call on the configured backend
+        
+        Generation errors are logged and end the stream, matching the
+        behaviour callers already rely on.
+        
+        Args:
+            prompt: Prompt text
+            **kwargs: Extra arguments for generate_content
+            
+        Yields:
+            String chunks of the response
+        """
+        # Hold the slot only while the stream is consumed: the finally also
+        # runs when the consumer closes the generator (client disconnect)
+        # or is cancelled, so the slot is not held until garbage collection
+        await self._semaphore.acquire()
+        try:
+            if self.backend == "executor":
+                async with aclosing(self._stream_in_executor(prompt, **kwargs)) as stream:
+                    async for text in stream:
+                        yield text
+                return
+            
+            try:
+                response = await self.model.generate_content_async(prompt, stream=True, **kwargs)
+                async for chunk in response:
+                    if chunk.text:
+                        yield chunk.text
+            except Exception as e:
+                logger.error(f"Stream generation error: {str(e)}")
+        finally:
+            self._semaphore.release()
+    
+    async def _stream_in_executor(self, prompt: str, **kwargs) -> AsyncGenerator[str, None]:
+        """Stream chunks from the blocking client running in a background thread"""
+        # Create a queue to pass chunks from sync to async
+        chunk_queue = asyncio.Queue()
+        loop = asyncio.get_running_loop()
+        # Set when the consumer goes away so the producer stops pulling chunks
+        stopped = threading.Event()
+        
+        def generate_stream():
+            try:
+                response = self.model.generate_content(prompt, stream=True, **kwargs)
+                for chunk in response:
+                    if stopped.is_set():
+                        break
+                    if chunk.text:
+                        loop.call_soon_threadsafe(chunk_queue.put_nowait, chunk.text)
+            except Exception as e:
+                logger.error(f"Stream generation error: {str(e)}")
+            finally:
+                loop.call_soon_threadsafe(chunk_queue.put_nowait, None)  # Signal end
+        
+        # Start generation in the streaming producer pool
+        loop.run_in_executor(get_executor("stream"), generate_stream)
+        
+        # Yield chunks as they arrive
+        try:
+            while True:
+                chunk = await chunk_queue.get()
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            stopped.set()
+        
     @retry(
         stop=stop_after_attempt(3),
         wait=wait_exponential(multiplier=1, min=2, max=10)
@@ -96,14 +205,9 @@ Requirements:
 Return JSON format: {{"questions": [{{"id": "q1", "text": "Question text", "type": "fact|analysis|exploratory", "confidence": 0.0-1.0}}]}}"""
         
         try:
-            # Run synchronous Gemini API call in thread pool
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    prompt,
-                    safety_settings=self.safety_settings
-                )
+            response = await self._generate_content(
+                prompt,
+                safety_settings=self.safety_settings
             )
             
             # Parse response
@@ -203,18 +307,13 @@ Requirements:
 Answer:"""
         
         try:
-            # Run synchronous Gemini API call in thread pool
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    base_prompt,
-                    safety_settings=self.safety_settings,
-                    generation_config={
-                        "max_output_tokens": max_tokens,
-                        "temperature": 0.7,
-                    }
-                )
+            response = await self._generate_content(
+                base_prompt,
+                safety_settings=self.safety_settings,
+                generation_config={
+                    "max_output_tokens": max_tokens,
+                    "temperature": 0.7,
+                }
             )
             
             answer = response.text
@@ -271,35 +370,12 @@ Question: {question}
 Answer:"""
         
         try:
-            # For streaming, we need to process chunks as they come
-            # Create a queue to pass chunks from sync to async
-            chunk_queue = asyncio.Queue()
-            
-            def generate_stream():
-                try:
-                    response = self.model.generate_content(
-                        base_prompt,
-                        safety_settings=self.safety_settings,
-                        stream=True
-                    )
-                    for chunk in response:
-                        if chunk.text:
-                            chunk_queue.put_nowait(chunk.text)
-                    chunk_queue.put_nowait(None)  # Signal end
-                except Exception as e:
-                    chunk_queue.put_nowait(StopIteration)
-                    logger.error(f"Stream generation error: {str(e)}")
-            
-            # Start generation in background thread
-            loop = asyncio.get_event_loop()
-            loop.run_in_executor(None, generate_stream)
-            
-            # Yield chunks as they arrive
-            while True:
-                chunk = await chunk_queue.get()
-                if chunk is None or chunk is StopIteration:
-                    break
-                yield chunk
+            async with aclosing(self._stream_content(
+                base_prompt,
+                safety_settings=self.safety_settings
+            )) as stream:
+                async for chunk in stream:
+                    yield chunk
                     
         except Exception as e:
             logger.error(f"Error streaming answer: {str(e)}", exc_info=True)
@@ -362,14 +438,9 @@ Content:
 Tags:"""
         
         try:
-            # Run synchronous Gemini API call in thread pool
-            loop = asyncio.get_event_loop()
-            response = await loop.run_in_executor(
-                None,
-                lambda: self.model.generate_content(
-                    prompt,
-                    safety_settings=self.safety_settings
-                )
+            response = await self._generate_content(
+                prompt,
+                safety_settings=self.safety_settings
             )
             
             tags_text = response.text.strip()
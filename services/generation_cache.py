@@ -0,0 +1,79 @@
+"""
+Generation Cache - Gemini results keyed by the content hash of their source article
+"""
+
+import os
+import logging
+from collections import Counter
+from typing import Any, Awaitable, Callable, Dict, Optional
+
+from services.cache_key_service import CacheKeyService
+from services.content_store import content_hash
+
+logger = logging.getLogger(__name__)
+
+
+class GenerationCache:
+    """
+    Caches generated questions, tags and answers per article content
+
+    Keys are built from the hash of the normalized article text plus the
+    generation parameters, so the same article reached through different
+    URLs, content_ids or re-pasted contexts reuses one generation. Values
+    go through CacheService.get_or_compute, which coalesces concurrent
+    misses across instances. When a cached response is refreshed, a stale
+    generation is regenerated rather than copied into the new response.
+    """
+
+    def __init__(self, cache_service, cache_key_service: Optional[CacheKeyService] = None):
+        self.cache_service = cache_service
+        self.cache_key_service = cache_key_service or CacheKeyService()
+        self.ttl = int(os.getenv("GENERATION_CACHE_TTL", "3600"))
+        self.lookups: Counter = Counter()
+        self.generated: Counter = Counter()
+
+    def key(self, kind: str, content: str, params: Dict[str, Any]) -> str:
+        """Cache key for a generation of kind over content with params"""
+        return self.cache_key_service.build(f"{kind}_generation", {"content_hash": content_hash(content), **params})
+
+    async def get_or_generate(
+        self,
+        kind: str,
+        content: str,
+        params: Dict[str, Any],
+        generate: Callable[[], Awaitable[Any]],
+        ttl: Optional[int] = None
+    ) -> Any:
+        """
+        Return the cached generation for this content, generating it on a miss
+
+        Args:
+            kind: Generation kind ("questions", "tags", "answer")
+            content: Source article text
+            params: Every other input that changes the result (lang, query, prompt, ...)
+            generate: Zero-argument coroutine function producing the result
+            ttl: Soft TTL in seconds, usually the endpoint's response TTL
+                (defaults to GENERATION_CACHE_TTL)
+
+        Returns:
+            Cached or freshly generated result
+        """
+        if not content:
+            # Nothing to address by; empty content is not worth sharing
+            return await generate()
+
+        async def compute():
+            self.generated[kind] += 1
+            return await generate()
+
+        self.lookups[kind] += 1
+        return await self.cache_service.get_or_compute(
+            self.key(kind, content, params), compute, ttl=ttl if ttl is not None else self.ttl
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Lookups and generations per kind (the difference was served from cache)"""
+        return {
+            kind: {"lookups": self.lookups[kind], "generated": self.generated[kind]}
+            for kind in sorted(self.lookups)
+        }
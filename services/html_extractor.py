@@ -0,0 +1,813 @@
+"""
+HTML Extractor - Pluggable backends that turn page HTML into a document
+"""
+
+import os
+import re
+import time
+import html as html_lib
+import json
+import logging
+from abc import ABC, abstractmethod
+from typing import Any, Dict, Iterable, List, Optional
+from urllib.parse import urlparse
+from bs4 import BeautifulSoup, CData, NavigableString, Tag
+
+from services.extraction_rules import ContentScorer, ExtractionRule, get_extraction_rules
+
+try:
+    import lxml.html
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    lxml = None
+
+logger = logging.getLogger(__name__)
+
+# Selectors tried in order for the article's main content
+CONTENT_SELECTORS = [
+    "article",
+    "main",
+    ".content",
+    "#content",
+    ".post-content",
+    ".entry-content"
+]
+
+MAX_MAIN_TEXT = 20000
+MAX_BODY_TEXT = 5000
+MAX_IMAGES = 5
+
+# schema.org types whose JSON-LD carries the article itself
+ARTICLE_TYPES = {
+    "Article", "NewsArticle", "ReportageNews", "AnalysisNewsArticle", "OpinionNewsArticle",
+    "BackgroundNewsArticle", "BlogPosting", "TechArticle", "Report",
+}
+
+LD_JSON_SCRIPT = re.compile(
+    r"""<script[^>]*type\s*=\s*["']?application/ld\+json[^>]*>(.*?)</script\s*>""",
+    re.IGNORECASE | re.DOTALL
+)
+MARKUP_TAG = re.compile(r"<[^>]+>")
+
+# Removed before reading body text, then before reading main text
+NON_TEXT_TAGS = ("script", "style", "meta", "link", "noscript")
+CHROME_TAGS = ("nav", "footer", "header")
+
+
+def _absolute_url(img_url: str, page_url: str) -> Optional[str]:
+    """Resolve protocol-relative and root-relative image URLs"""
+    if img_url.startswith("//"):
+        return "https:" + img_url
+    parsed = urlparse(page_url)
+    if img_url.startswith("/"):
+        return f"{parsed.scheme}://{parsed.netloc}{img_url}"
+    if img_url.startswith("http"):
+        return img_url
+    return None
+
+
+def _meta_images(og_image: str, twitter_image: str, url: str) -> List[Dict[str, Any]]:
+    images = []
+    for img_url, image_type in ((og_image, "og:image"), (twitter_image, "twitter:image")):
+        if not img_url:
+            continue
+        if not img_url.startswith(("http", "/")):
+            parsed = urlparse(url)
+            img_url = f"{parsed.scheme}://{parsed.netloc}/{img_url}"
+        img_url = _absolute_url(img_url, url)
+        if img_url and all(image["url"] != img_url for image in images):
+            images.append({
+                "url": img_url,
+                "width": 0,
+                "height": 0,
+                "type": image_type
+            })
+    return images
+
+
+def _img_tag_image(img: Any, url: str) -> Optional[Dict[str, Any]]:
+    """Image for an <img> (bs4 tag, lxml element or attribute dict), None to skip it"""
+    img_url = img.get("src") or img.get("data-src") or img.get("data-lazy-src")
+    if not img_url or img_url.startswith("data:"):
+        return None
+    img_url = _absolute_url(img_url, url)
+    # Skip unresolvable URLs and icons/logos
+    if not img_url or "icon" in img_url.lower() or "logo" in img_url.lower():
+        return None
+
+    width, height = img.get("width"), img.get("height")
+    return {
+        "url": img_url,
+        "width": int(width) if width and str(width).isdigit() else 0,
+        "height": int(height) if height and str(height).isdigit() else 0,
+        "type": "img_tag"
+    }
+
+
+def _add_images(images: List[Dict[str, Any]], candidates: Iterable[Optional[Dict[str, Any]]]) -> List[Dict[str, Any]]:
+    """Append candidate images not already in images, up to MAX_IMAGES in total"""
+    seen_images = {image["url"] for image in images}
+    for image in candidates:
+        if len(images) >= MAX_IMAGES:
+            break
+        if image and image["url"] not in seen_images:
+            seen_images.add(image["url"])
+            images.append(image)
+    return images
+
+
+def _img_tag_images(imgs: Iterable[Any], url: str, images: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    return _add_images(images, (_img_tag_image(img, url) for img in imgs))
+
+
+def _document(url: str, title: str, summary: str, text: str, main_text: str,
+              images: List[Dict[str, Any]]) -> Dict[str, Any]:
+    text = ' '.join(text.split())[:MAX_BODY_TEXT]
+    return {
+        "url": url,
+        "title": title,
+        "summary": summary or text[:200],
+        "main_text": ' '.join(main_text.split())[:MAX_MAIN_TEXT],
+        "text": text,
+        "images": images
+    }
+
+
+def _json_ld_articles(data: Any) -> Iterable[Dict[str, Any]]:
+    """Article objects in a JSON-LD value (top level, lists and @graph)"""
+    if isinstance(data, list):
+        for item in data:
+            yield from _json_ld_articles(item)
+    elif isinstance(data, dict):
+        types = data.get("@type")
+        types = types if isinstance(types, list) else [types]
+        if any(t in ARTICLE_TYPES for t in types if isinstance(t, str)):
+            yield data
+        if "@graph" in data:
+            yield from _json_ld_articles(data["@graph"])
+
+
+def _json_ld_text(value: Any) -> str:
+    """Plain text of a JSON-LD string field (some sites embed markup or entities)"""
+    if not isinstance(value, str):
+        return ""
+    return ' '.join(html_lib.unescape(MARKUP_TAG.sub(" ", value)).split())
+
+
+def _json_ld_dimension(value: Any) -> int:
+    if isinstance(value, dict):
+        value = value.get("value")
+    value = str(value or "").replace("px", "")
+    return int(value) if value.isdigit() else 0
+
+
+def _json_ld_images(value: Any, url: str) -> List[Dict[str, Any]]:
+    images = []
+    for item in value if isinstance(value, list) else [value]:
+        if isinstance(item, dict):
+            img_url, width, height = item.get("url") or item.get("contentUrl"), item.get("width"), item.get("height")
+        else:
+            img_url, width, height = item, None, None
+        img_url = _absolute_url(img_url, url) if isinstance(img_url, str) else None
+        if img_url:
+            images.append({
+                "url": img_url,
+                "width": _json_ld_dimension(width),
+                "height": _json_ld_dimension(height),
+                "type": "json_ld"
+            })
+    return images
+
+
+def structured_document(blocks: Iterable[str], url: str, min_body: int) -> Optional[Dict[str, Any]]:
+    """
+    Document from JSON-LD article data, if a block is complete
+
+    Args:
+        blocks: Contents of application/ld+json script tags
+        url: Page URL
+        min_body: Shortest articleBody (characters) accepted as the full
+            article text; 0 disables structured extraction
+
+    Returns:
+        Document dict, or None when no block has a headline and article body
+    """
+    if min_body <= 0:
+        return None
+    for block in blocks:
+        block = block.strip()
+        # Some sites still wrap scripts in HTML comments / CDATA
+        for prefix, suffix in (("<!--", "-->"), ("//<![CDATA[", "//]]>")):
+            if block.startswith(prefix) and block.endswith(suffix):
+                block = block[len(prefix):-len(suffix)].strip()
+        try:
+            data = json.loads(block, strict=False)
+        except ValueError:
+            continue
+        for article in _json_ld_articles(data):
+            headline = _json_ld_text(article.get("headline") or article.get("name"))
+            body = _json_ld_text(article.get("articleBody"))
+            if not headline or len(body) < min_body:
+                continue
+            images = _add_images([], _json_ld_images(article.get("image"), url))
+            summary = _json_ld_text(article.get("description"))
+            return _document(url, headline, summary, f"{headline} {body}", body, images)
+    return None
+
+
+class HTMLExtractor(ABC):
+    """
+    Base class for extraction backends
+
+    A page whose JSON-LD carries a complete article (headline and an
+    articleBody of at least JSON_LD_MIN_BODY_CHARS) is taken from that
+    block without any DOM work. Otherwise every backend returns the same
+    heuristic document: metadata is read before any tags are removed (meta
+    tags included), then scripts/styles are stripped for body text, then
+    page chrome (nav, header, footer) and the domain rule's boilerplate
+    are stripped for the main text. Main text comes from the domain rule's
+    content selectors, then CONTENT_SELECTORS, then the element chosen by
+    ContentScorer, then the whole page.
+    """
+
+    name = ""
+
+    def __init__(self):
+        self.json_ld_min_body = int(os.getenv("JSON_LD_MIN_BODY_CHARS", "100"))
+
+    def extract(self, html: str, url: str) -> Dict[str, Any]:
+        """
+        Extract title, summary, images, body text and main text from HTML
+
+        Args:
+            html: Page HTML
+            url: Page URL, for resolving relative image URLs
+
+        Returns:
+            Document dict with url, title, summary, main_text, text and images
+        """
+        rule = get_extraction_rules().rule_for(url)
+        document = None
+        if self.json_ld_min_body > 0:
+            document = structured_document(LD_JSON_SCRIPT.findall(html), url, self.json_ld_min_body)
+        if document is None:
+            document = self.extract_html(html, url, rule)
+        return _apply_rule(document, rule)
+
+    @abstractmethod
+    def extract_html(self, html: str, url: str, rule: Optional[ExtractionRule] = None) -> Dict[str, Any]:
+        """Heuristic extraction from the page markup (see extract)"""
+
+
+def _apply_rule(document: Dict[str, Any], rule: Optional[ExtractionRule]) -> Dict[str, Any]:
+    if rule is not None:
+        document["images"] = rule.order_images(document["images"])
+    return document
+
+
+def _soup_attrib(tag: Tag) -> Dict[str, str]:
+    # bs4 keeps class as a list; selectors and the scorer expect the attribute string
+    return {name: ' '.join(value) if isinstance(value, list) else value for name, value in tag.attrs.items()}
+
+
+def _score_soup(soup: BeautifulSoup) -> str:
+    """ContentScorer's main text for a soup, walked without recursion"""
+    scorer = ContentScorer()
+    stack = [(None, iter(soup.children))]
+    while stack:
+        name, children = stack[-1]
+        child = next(children, None)
+        if child is None:
+            stack.pop()
+            if name is not None:
+                scorer.end(name)
+        elif isinstance(child, Tag):
+            scorer.start(child.name, _soup_attrib(child))
+            stack.append((child.name, iter(child.children)))
+        elif type(child) is NavigableString or isinstance(child, CData):
+            # The strings get_text() returns (no comments, doctype, ...)
+            scorer.data(str(child))
+    return scorer.text()
+
+
+def _score_tree(root) -> str:
+    """ContentScorer's main text for an lxml tree"""
+    scorer = ContentScorer()
+    for event, element in etree.iterwalk(root, events=("start", "end")):
+        if event == "start":
+            scorer.start(element.tag, element.attrib)
+            if element.text:
+                scorer.data(element.text)
+        else:
+            scorer.end(element.tag)
+            if element.tail and element is not root:
+                scorer.data(element.tail)
+    return scorer.text()
+
+
+class SoupExtractor(HTMLExtractor):
+    """BeautifulSoup with the pure-Python html.parser (reference behaviour)"""
+
+    name = "bs4"
+
+    @staticmethod
+    def _meta_content(soup: BeautifulSoup, **kwargs) -> str:
+        tag = soup.find("meta", **kwargs)
+        if tag and tag.get("content"):
+            return tag["content"].strip()
+        return ""
+
+    def extract_html(self, html: str, url: str, rule: Optional[ExtractionRule] = None) -> Dict[str, Any]:
+        soup = BeautifulSoup(html, 'html.parser')
+
+        title = soup.title.get_text(strip=True) if soup.title else ""
+        if not title:
+            title = self._meta_content(soup, property="og:title")
+        summary = (
+            self._meta_content(soup, property="og:description")
+            or self._meta_content(soup, attrs={"name": "description"})
+        )
+        images = _meta_images(
+            self._meta_content(soup, property="og:image"),
+            self._meta_content(soup, attrs={"name": "twitter:image"}),
+            url
+        )
+
+        for tag in soup(list(NON_TEXT_TAGS)):
+            tag.decompose()
+        text = soup.get_text()
+        images = _img_tag_images(soup.find_all("img"), url, images)
+
+        for tag in soup(list(CHROME_TAGS)):
+            tag.decompose()
+        selectors = CONTENT_SELECTORS
+        if rule is not None:
+            for selector in rule.remove:
+                for tag in soup.select(selector.css):
+                    if not tag.decomposed:
+                        tag.decompose()
+            selectors = [selector.css for selector in rule.content] + CONTENT_SELECTORS
+        main_text = ""
+        for selector in selectors:
+            elements = soup.select(selector)
+            if elements:
+                main_text = ' '.join([elem.get_text() for elem in elements])
+                break
+        if not main_text:
+            main_text = _score_soup(soup) or soup.get_text()
+
+        return _document(url, title, summary, text, main_text, images)
+
+
+def _selector_xpath(selector: str) -> str:
+    """XPath for the simple tag/.class/#id selectors in CONTENT_SELECTORS"""
+    if selector.startswith("."):
+        return f"//*[contains(concat(' ', normalize-space(@class), ' '), ' {selector[1:]} ')]"
+    if selector.startswith("#"):
+        return f"//*[@id='{selector[1:]}']"
+    return f"//{selector}"
+
+
+class LxmlExtractor(HTMLExtractor):
+    """
+    lxml (libxml2) parser and XPath, several times faster than html.parser
+
+    Comments and processing instructions are dropped while parsing, and
+    tags are removed with strip_elements(with_tail=False), which keeps the
+    text that follows a removed tag just as BeautifulSoup's decompose()
+    does, so both backends see the same text.
+    """
+
+    name = "lxml"
+
+    def __init__(self):
+        super().__init__()
+        self.parser = lxml.html.HTMLParser(encoding="utf-8", remove_comments=True, remove_pis=True)
+        self.selectors = [etree.XPath(_selector_xpath(selector)) for selector in CONTENT_SELECTORS]
+
+    @staticmethod
+    def _meta_content(root, attribute: str, value: str) -> str:
+        for tag in root.iter("meta"):
+            if tag.get(attribute) == value:
+                content = tag.get("content")
+                return content.strip() if content else ""
+        return ""
+
+    @staticmethod
+    def _text(element) -> str:
+        return "".join(element.itertext())
+
+    def extract_html(self, html: str, url: str, rule: Optional[ExtractionRule] = None) -> Dict[str, Any]:
+        try:
+            # Parse UTF-8 bytes so a <meta charset> in the page cannot re-decode it
+            root = lxml.html.document_fromstring(html.encode("utf-8", "replace"), parser=self.parser)
+        except etree.ParserError:
+            # Empty or comment-only page
+            return _document(url, "", "", "", "", [])
+
+        title_tag = next(root.iter("title"), None)
+        title = "".join(s.strip() for s in title_tag.itertext()) if title_tag is not None else ""
+        if not title:
+            title = self._meta_content(root, "property", "og:title")
+        summary = (
+            self._meta_content(root, "property", "og:description")
+            or self._meta_content(root, "name", "description")
+        )
+        images = _meta_images(
+            self._meta_content(root, "property", "og:image"),
+            self._meta_content(root, "name", "twitter:image"),
+            url
+        )
+
+        etree.strip_elements(root, *NON_TEXT_TAGS, with_tail=False)
+        text = self._text(root)
+        images = _img_tag_images(root.iter("img"), url, images)
+
+        etree.strip_elements(root, *CHROME_TAGS, with_tail=False)
+        selectors = self.selectors
+        if rule is not None:
+            for selector in rule.remove:
+                for element in selector.xpath(root):
+                    if element.getparent() is not None:
+                        # Keeps the tail text, like strip_elements(with_tail=False)
+                        element.drop_tree()
+            selectors = [selector.xpath for selector in rule.content] + self.selectors
+        main_text = ""
+        for selector in selectors:
+            elements = selector(root)
+            if elements:
+                main_text = ' '.join([self._text(elem) for elem in elements])
+                break
+        if not main_text:
+            main_text = _score_tree(root) or self._text(root)
+
+        return _document(url, title, summary, text, main_text, images)
+
+
+class _TextBuffer:
+    """
+    Whitespace-normalized text built from parser data events
+
+    Produces the same string as ' '.join(''.join(pieces).split()), without
+    keeping the raw pieces, and stops growing once limit is reached.
+    """
+
+    __slots__ = ("parts", "length", "limit", "pending_space")
+
+    def __init__(self, limit: int):
+        self.parts: List[str] = []
+        self.length = 0
+        self.limit = limit
+        self.pending_space = False
+
+    @property
+    def full(self) -> bool:
+        return self.length >= self.limit
+
+    def add(self, data: str):
+        if self.full or not data:
+            return
+        words = data.split()
+        if not words:
+            self.pending_space = True
+            return
+        if self.length and (self.pending_space or data[0].isspace()):
+            self.parts.append(" ")
+            self.length += 1
+        chunk = " ".join(words)
+        self.parts.append(chunk)
+        self.length += len(chunk)
+        self.pending_space = data[-1].isspace()
+
+    def text(self) -> str:
+        # Not cut to limit here: _document() normalizes and cuts, as for the DOM backends
+        return "".join(self.parts)
+
+
+# CONTENT_SELECTORS by kind, mapped to their priority index
+_TAG_SELECTORS = {s: (i,) for i, s in enumerate(CONTENT_SELECTORS) if s[0] not in ".#"}
+_CLASS_SELECTORS = {s[1:]: i for i, s in enumerate(CONTENT_SELECTORS) if s[0] == "."}
+_ID_SELECTORS = {s[1:]: i for i, s in enumerate(CONTENT_SELECTORS) if s[0] == "#"}
+
+
+class _StreamTarget:
+    """
+    lxml parser target that extracts a document from start/end/data events
+
+    Skipped tags (scripts, styles, ...) and page chrome are tracked by
+    depth instead of being removed from a tree. Text inside each content
+    selector goes to that selector's buffer, and the highest-priority
+    selector that matched is chosen at the end. Until some selector
+    matches, events also go to a ContentScorer for pages with no known
+    container.
+    """
+
+    def __init__(self, url: str, json_ld_min_body: int = 0, rule: Optional[ExtractionRule] = None):
+        self.url = url
+        self.rule = rule
+        self.json_ld_min_body = json_ld_min_body
+        # Text of the application/ld+json script being read, if any
+        self.json_ld_parts: Optional[List[str]] = None
+        self.structured: Optional[Dict[str, Any]] = None
+        self.skip_depth = 0
+        self.chrome_depth = 0
+        self.title_depth = 0
+        self.title_parts: Optional[List[str]] = None
+        # (attribute, value) -> content of the first such meta tag
+        self.meta: Dict[tuple, str] = {}
+        # Distinct usable <img> images in page order
+        self.img_images: List[Dict[str, Any]] = []
+        self.img_urls = set()
+        self.text = _TextBuffer(MAX_BODY_TEXT)
+        self.page_text = _TextBuffer(MAX_MAIN_TEXT)
+        # The rule's content selectors are indexed after CONTENT_SELECTORS but tried first
+        self.rule_content = rule.content if rule is not None else []
+        self.remove = rule.remove if rule is not None else []
+        count = len(CONTENT_SELECTORS) + len(self.rule_content)
+        self.priority = list(range(len(CONTENT_SELECTORS), count)) + list(range(len(CONTENT_SELECTORS)))
+        self.selected = [_TextBuffer(MAX_MAIN_TEXT) for _ in range(count)]
+        self.matched = [False] * count
+        # Per open element: indexes of the selectors it matched
+        self.open_matches: List[tuple] = []
+        self.depth = [0] * count
+        self.open_selected = 0
+        # Dropped once a selector matches: the scorer is only the fallback
+        self.scorer: Optional[ContentScorer] = ContentScorer()
+
+    def _matches(self, tag: str, attrib) -> tuple:
+        matches = _TAG_SELECTORS.get(tag, ())
+        classes = attrib.get("class")
+        if classes:
+            for name in classes.split():
+                if name in _CLASS_SELECTORS:
+                    matches += (_CLASS_SELECTORS[name],)
+        element_id = attrib.get("id")
+        if element_id in _ID_SELECTORS:
+            matches += (_ID_SELECTORS[element_id],)
+        if self.rule_content:
+            for index, selector in enumerate(self.rule_content, len(CONTENT_SELECTORS)):
+                if selector.matches(tag, attrib):
+                    matches += (index,)
+        return matches
+
+    def start(self, tag, attrib):
+        if tag == "meta":
+            self._meta(attrib)
+        elif tag == "script" and self.json_ld_min_body > 0 and self.structured is None:
+            if "ld+json" in (attrib.get("type") or "").lower():
+                self.json_ld_parts = []
+        if self.skip_depth or tag in NON_TEXT_TAGS:
+            self.skip_depth += 1
+            self.open_matches.append(())
+            return
+        if tag == "title" and self.title_parts is None:
+            self.title_parts = []
+            self.title_depth = 1
+        elif self.title_depth:
+            self.title_depth += 1
+        if tag == "img" and len(self.img_images) < MAX_IMAGES + 2:
+            # +2: meta images come first and may duplicate page images
+            image = _img_tag_image(attrib, self.url)
+            if image and image["url"] not in self.img_urls:
+                self.img_urls.add(image["url"])
+                self.img_images.append(image)
+        if self.chrome_depth or tag in CHROME_TAGS or (
+                self.remove and any(selector.matches(tag, attrib) for selector in self.remove)):
+            self.chrome_depth += 1
+            self.open_matches.append(())
+            return
+        matches = self._matches(tag, attrib)
+        for index in matches:
+            self.matched[index] = True
+            self.depth[index] += 1
+            self.open_selected += 1
+        self.open_matches.append(matches)
+        if matches:
+            self.scorer = None
+        elif self.scorer is not None:
+            self.scorer.start(tag, attrib)
+
+    def _meta(self, attrib):
+        for attribute in ("property", "name"):
+            value = attrib.get(attribute)
+            if value and (attribute, value) not in self.meta:
+                self.meta[(attribute, value)] = (attrib.get("content") or "").strip()
+
+    def end(self, tag):
+        if tag == "script" and self.json_ld_parts is not None:
+            block, self.json_ld_parts = "".join(self.json_ld_parts), None
+            self.structured = structured_document([block], self.url, self.json_ld_min_body)
+        matches = self.open_matches.pop() if self.open_matches else ()
+        if self.skip_depth:
+            self.skip_depth -= 1
+            return
+        if self.title_depth:
+            self.title_depth -= 1
+        if self.chrome_depth:
+            self.chrome_depth -= 1
+            return
+        if self.scorer is not None:
+            self.scorer.end(tag)
+        for index in matches:
+            self.depth[index] -= 1
+            self.open_selected -= 1
+            # Elements matched by one selector are joined with a space
+            self.selected[index].pending_space = True
+
+    def data(self, data):
+        if self.skip_depth:
+            if self.json_ld_parts is not None:
+                self.json_ld_parts.append(data)
+            return
+        if self.title_depth:
+            self.title_parts.append(data)
+        self.text.add(data)
+        if self.chrome_depth:
+            return
+        self.page_text.add(data)
+        if self.scorer is not None:
+            self.scorer.data(data)
+        if self.open_selected:
+            for index, depth in enumerate(self.depth):
+                if depth:
+                    self.selected[index].add(data)
+
+    @property
+    def done(self) -> bool:
+        """Whether the rest of the page cannot change the document"""
+        if self.structured is not None:
+            return True
+        meta_images = sum(1 for key in (("property", "og:image"), ("name", "twitter:image")) if self.meta.get(key))
+        if not (self.text.full and len(self.img_images) >= MAX_IMAGES + meta_images):
+            return False
+        # Main text is settled once the best container seen so far is full
+        # (a higher-priority container later in the page is not looked for)
+        for index in self.priority:
+            if self.matched[index]:
+                return self.selected[index].full
+        return self.page_text.full
+
+    def close(self):
+        return self
+
+    def document(self) -> Dict[str, Any]:
+        if self.structured is not None:
+            return self.structured
+        meta = self.meta
+        title = "".join(self.title_parts or []).strip() or meta.get(("property", "og:title"), "")
+        summary = meta.get(("property", "og:description")) or meta.get(("name", "description"), "")
+        images = _meta_images(meta.get(("property", "og:image"), ""), meta.get(("name", "twitter:image"), ""), self.url)
+        images = _add_images(images, self.img_images)
+
+        main_text = ""
+        for index in self.priority:
+            if self.matched[index]:
+                main_text = self.selected[index].text()
+                break
+        if not main_text and self.scorer is not None:
+            main_text = self.scorer.text()
+        if not main_text:
+            main_text = self.page_text.text()
+        return _document(self.url, title, summary, self.text.text(), main_text, images)
+
+
+class StreamExtraction:
+    """
+    One in-progress streaming extraction
+
+    Feed the page in chunks; feed() returns True once a complete JSON-LD
+    article has been read, or the text budgets and image limit are reached,
+    and the rest of the page can be skipped.
+    """
+
+    def __init__(self, url: str, json_ld_min_body: int = 0, rule: Optional[ExtractionRule] = None):
+        self.url = url
+        self.rule = rule
+        self.target = _StreamTarget(url, json_ld_min_body, rule)
+        self.parser = etree.HTMLParser(target=self.target, encoding="utf-8", remove_comments=True)
+        self.fed = False
+        # CPU time spent parsing, excluding waits between chunks
+        self.parse_seconds = 0.0
+
+    def feed(self, data: bytes) -> bool:
+        if data:
+            started = time.perf_counter()
+            self.fed = True
+            self.parser.feed(data)
+            self.parse_seconds += time.perf_counter() - started
+        return self.target.done
+
+    def finish(self) -> Dict[str, Any]:
+        """Close the parser and return the document before the rule's image ordering"""
+        started = time.perf_counter()
+        if self.fed:
+            try:
+                self.parser.close()
+            except etree.LxmlError as e:
+                logger.warning(f"Error parsing {self.url}: {str(e)}")
+        document = self.target.document()
+        self.parse_seconds += time.perf_counter() - started
+        return document
+
+    def close(self) -> Dict[str, Any]:
+        return _apply_rule(self.finish(), self.rule)
+
+
+class StreamExtractor(HTMLExtractor):
+    """
+    Single pass over lxml parser events, without building a DOM
+
+    Title, meta tags, image candidates, body text and per-selector main
+    text are all collected as the page is parsed, and parsing stops early
+    once the text budgets and image limit are reached. A complete JSON-LD
+    article ends parsing as soon as its script closes.
+
+    It matches the DOM backends except that a content container nested in
+    another matched by the same selector is not counted twice, and a
+    higher-priority container (or better-scoring element) after the point
+    where parsing stopped is not seen.
+    """
+
+    name = "stream"
+    chunk_size = 16384
+
+    def start(self, url: str) -> StreamExtraction:
+        """Begin an incremental extraction (see StreamExtraction)"""
+        return StreamExtraction(url, self.json_ld_min_body, get_extraction_rules().rule_for(url))
+
+    def _feed(self, extraction: StreamExtraction, html: str):
+        data = html.encode("utf-8", "replace")
+        for offset in range(0, len(data), self.chunk_size):
+            if extraction.feed(data[offset:offset + self.chunk_size]):
+                break
+
+    def extract(self, html: str, url: str) -> Dict[str, Any]:
+        extraction = self.start(url)
+        self._feed(extraction, html)
+        return extraction.close()
+
+    def extract_html(self, html: str, url: str, rule: Optional[ExtractionRule] = None) -> Dict[str, Any]:
+        # JSON-LD is extract's job; this is the heuristic pass alone
+        extraction = StreamExtraction(url, 0, rule)
+        self._feed(extraction, html)
+        return extraction.finish()
+
+
+EXTRACTORS = {SoupExtractor.name: SoupExtractor}
+if lxml is not None:
+    EXTRACTORS[LxmlExtractor.name] = LxmlExtractor
+    EXTRACTORS[StreamExtractor.name] = StreamExtractor
+
+DEFAULT_EXTRACTOR = "stream" if lxml is not None else "bs4"
+
+_instances: Dict[str, HTMLExtractor] = {}
+
+
+def get_extractor(name: Optional[str] = None) -> HTMLExtractor:
+    """
+    Get a (shared) extraction backend
+
+    Args:
+        name: Backend name (stream, lxml or bs4); defaults to HTML_PARSER_BACKEND
+
+    Returns:
+        Extractor instance; the default backend if name is unknown
+    """
+    name = (name or os.getenv("HTML_PARSER_BACKEND") or DEFAULT_EXTRACTOR).lower()
+    if name not in EXTRACTORS:
+        logger.warning(f"Unknown HTML parser backend {name!r}, using {DEFAULT_EXTRACTOR}")
+        name = DEFAULT_EXTRACTOR
+    extractor = _instances.get(name)
+    if extractor is None:
+        extractor = _instances[name] = EXTRACTORS[name]()
+    return extractor
+
+
+def warm_worker():
+    """Process pool initializer: import the parsers, compile the rules and build every extractor up front"""
+    get_extraction_rules()
+    for name in EXTRACTORS:
+        get_extractor(name)
+
+
+def extract_bytes(data: bytes, encoding: str, url: str, backend: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Decode a raw response body and extract its document
+
+    Module-level so it can run in parse worker processes, which receive
+    only the body bytes and send back the extracted fields.
+
+    Args:
+        data: Response body
+        encoding: Body charset (undecodable bytes are replaced)
+        url: Page URL
+        backend: Extraction backend (defaults to HTML_PARSER_BACKEND)
+
+    Returns:
+        Document dict
+    """
+    try:
+        html = data.decode(encoding, errors="replace")
+    except LookupError:
+        html = data.decode("utf-8", errors="replace")
+    return get_extractor(backend).extract(html, url)
@@ -0,0 +1,418 @@
+"""
+Log Cache Store - Append-only segment log with an in-memory hash index
+"""
+
+import os
+import mmap
+import fcntl
+import time
+import zlib
+import struct
+import asyncio
+import hashlib
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, Iterator, Tuple
+
+from services.executor_service import get_executor
+
+logger = logging.getLogger(__name__)
+
+# Record layout: crc32 | flags | key_len | value_len | expires_at | key | value
+# The CRC covers everything after itself, so torn or zeroed tails fail validation.
+CRC = struct.Struct("<I")
+HEADER = struct.Struct("<BHId")
+RECORD_OVERHEAD = CRC.size + HEADER.size
+
+FLAG_PUT = 0
+FLAG_TOMBSTONE = 1
+
+
+def _key_hash(key: bytes) -> int:
+    """64-bit index key; the full key is stored in the record and checked on read"""
+    return int.from_bytes(hashlib.blake2b(key, digest_size=8).digest(), "little")
+
+
+class _Segment:
+    """One segment file, preallocated and mapped once for reads"""
+
+    __slots__ = ("id", "path", "size", "dead", "fd", "map")
+
+    def __init__(self, segment_id: int, path: Path):
+        self.id = segment_id
+        self.path = path
+        self.size = 0  # Logical end of valid records
+        self.dead = 0  # Bytes of overwritten, deleted or expired records
+        self.fd = None
+        self.map = None
+
+    def open(self, length: int):
+        self.fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o644)
+        if os.fstat(self.fd).st_size < length:
+            os.ftruncate(self.fd, length)
+        self.map = mmap.mmap(self.fd, 0, access=mmap.ACCESS_READ)
+
+    def seal(self):
+        """Trim preallocated space once the segment is no longer written to"""
+        self.map.close()
+        os.ftruncate(self.fd, self.size)
+        os.close(self.fd)
+        self.fd = None
+        self.map = None
+        if self.size:
+            with open(self.path, "rb") as f:
+                self.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+    def close(self):
+        if self.map is not None:
+            self.map.close()
+            self.map = None
+        if self.fd is not None:
+            os.ftruncate(self.fd, self.size)
+            os.close(self.fd)
+            self.fd = None
+
+    def records(self) -> Iterator[Tuple[int, int, int, float, bytes]]:
+        """
+        Iterate valid records from the start of the segment
+
+        Yields:
+            (offset, record_length, flags, expires_at, key) until the first
+            record that fails validation
+        """
+        buf = self.map
+        if buf is None:
+            return
+        end = len(buf)
+        offset = 0
+        while offset + RECORD_OVERHEAD <= end:
+            (crc,) = CRC.unpack_from(buf, offset)
+            flags, key_len, value_len, expires_at = HEADER.unpack_from(buf, offset + CRC.size)
+            length = RECORD_OVERHEAD + key_len + value_len
+            if key_len == 0 or offset + length > end:
+                return
+            if zlib.crc32(buf[offset + CRC.size:offset + length]) != crc:
+                return
+            key_start = offset + RECORD_OVERHEAD
+            yield offset, length, flags, expires_at, bytes(buf[key_start:key_start + key_len])
+            offset += length
+
+
+class LogCacheStore:
+    """
+    Cache entries in append-only segment files instead of one file per key
+
+    Every set/delete appends a CRC-protected record to the active segment;
+    an in-memory index maps a 64-bit key hash to the record's location.
+    Reads slice the segment's mmap directly on the event loop. Sweeps drop
+    expired entries, evict the oldest segments over the byte budget and
+    compact sealed segments that are mostly dead. On startup the segments
+    are replayed to rebuild the index and a torn tail is truncated.
+
+    The index lives in this process only, so one directory belongs to one
+    process: an exclusive lock on it is taken before recovery and a second
+    opener gets a RuntimeError instead of truncating live segments.
+    """
+
+    def __init__(self, cache_dir: Path, max_bytes: int):
+        self.cache_dir = cache_dir
+        self.cache_dir.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self.segment_bytes = int(os.getenv("CACHE_LOG_SEGMENT_BYTES", str(64 * 1024 * 1024)))
+        self.compact_ratio = float(os.getenv("CACHE_LOG_COMPACT_RATIO", "0.5"))
+
+        self._lock = threading.RLock()
+        self._segments: Dict[int, _Segment] = {}
+        self._active: Optional[_Segment] = None
+        # key hash -> (segment id, record offset, record length, expires_at)
+        self._index: Dict[int, Tuple[int, int, int, float]] = {}
+
+        self.expired = 0
+        self.evicted = 0
+        self.compactions = 0
+        self.recovered_truncations = 0
+
+        self._lock_fd = self._lock_dir()
+        self._recover()
+
+    # Recovery -------------------------------------------------------------
+
+    def _lock_dir(self) -> int:
+        """Hold an exclusive lock on the directory until close"""
+        fd = os.open(self.cache_dir / ".lock", os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"Log cache directory {self.cache_dir} is in use by another process")
+        return fd
+
+    def _segment_path(self, segment_id: int) -> Path:
+        return self.cache_dir / f"segment-{segment_id:08d}.log"
+
+    def _recover(self):
+        now = time.time()
+        ids = sorted(
+            int(p.stem.split("-")[1]) for p in self.cache_dir.glob("segment-*.log")
+        )
+        for segment_id in ids:
+            segment = _Segment(segment_id, self._segment_path(segment_id))
+            with open(segment.path, "rb") as f:
+                if os.fstat(f.fileno()).st_size:
+                    segment.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+            for offset, length, flags, expires_at, key in segment.records():
+                segment.size = offset + length
+                self._apply(segment, _key_hash(key), offset, length, flags, expires_at, now)
+            if segment.map is not None:
+                segment.map.close()
+                segment.map = None
+            file_size = segment.path.stat().st_size
+            if file_size != segment.size:
+                # Torn write or unused preallocation: cut back to the last valid record
+                if segment_id != ids[-1]:
+                    self.recovered_truncations += 1
+                    logger.warning(f"Log cache segment {segment_id} truncated at {segment.size} bytes")
+                os.truncate(segment.path, segment.size)
+            if segment.size == 0:
+                segment.path.unlink(missing_ok=True)
+                continue
+            self._segments[segment_id] = segment
+
+        for segment in self._segments.values():
+            if segment.size:
+                with open(segment.path, "rb") as f:
+                    segment.map = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        # Always append to a fresh segment after restart
+        self._roll(next_id=(ids[-1] + 1) if ids else 1)
+        if ids:
+            logger.info(f"Log cache recovered {len(self._index)} entries from {len(ids)} segments")
+
+    def _apply(self, segment: _Segment, h: int, offset: int, length: int,
+               flags: int, expires_at: float, now: float):
+        """Replay one record into the index"""
+        previous = self._index.pop(h, None)
+        if previous is not None:
+            self._segments.get(previous[0], segment).dead += previous[2]
+        if flags == FLAG_TOMBSTONE or expires_at <= now:
+            segment.dead += length
+            return
+        self._index[h] = (segment.id, offset, length, expires_at)
+
+    # Writes ---------------------------------------------------------------
+
+    def _roll(self, next_id: Optional[int] = None):
+        """Seal the active segment and start a new one"""
+        if self._active is not None:
+            self._active.seal()
+            next_id = self._active.id + 1
+        segment = _Segment(next_id, self._segment_path(next_id))
+        segment.open(self.segment_bytes)
+        self._segments[segment.id] = segment
+        self._active = segment
+
+    def _append(self, key: bytes, value: bytes, flags: int, expires_at: float) -> Tuple[int, int, int]:
+        body = HEADER.pack(flags, len(key), len(value), expires_at) + key + value
+        record = CRC.pack(zlib.crc32(body)) + body
+        if self._active.size + len(record) > self.segment_bytes and self._active.size:
+            self._roll()
+        if len(record) > self.segment_bytes:
+            raise ValueError(f"Record of {len(record)} bytes exceeds segment size")
+        offset = self._active.size
+        os.pwrite(self._active.fd, record, offset)
+        self._active.size += len(record)
+        return self._active.id, offset, len(record)
+
+    def _mark_dead(self, location: Tuple[int, int, int, float]):
+        segment = self._segments.get(location[0])
+        if segment is not None:
+            segment.dead += location[2]
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor("file_io"), fn, *args)
+
+    async def set(self, key: str, data: bytes, expires_at: float):
+        """
+        Append entry bytes for key
+
+        Args:
+            key: Cache key
+            data: Serialized entry
+            expires_at: Unix time after which the entry is ignored and dropped
+        """
+        await self._run(self._set_sync, key.encode(), data, expires_at)
+
+    def _set_sync(self, key: bytes, data: bytes, expires_at: float):
+        with self._lock:
+            segment_id, offset, length = self._append(key, data, FLAG_PUT, expires_at)
+            previous = self._index.get(_key_hash(key))
+            if previous is not None:
+                self._mark_dead(previous)
+            self._index[_key_hash(key)] = (segment_id, offset, length, expires_at)
+
+    async def delete(self, key: str) -> bool:
+        """Delete entry for key; True if it existed"""
+        return await self._run(self._delete_sync, key.encode())
+
+    def _delete_sync(self, key: bytes) -> bool:
+        with self._lock:
+            previous = self._index.pop(_key_hash(key), None)
+            if previous is None:
+                return False
+            self._mark_dead(previous)
+            # Tombstone so recovery does not resurrect the old record
+            segment_id, _, length = self._append(key, b"", FLAG_TOMBSTONE, 0.0)
+            self._segments[segment_id].dead += length
+            return True
+
+    # Reads ----------------------------------------------------------------
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Read entry bytes for key from the mapped segment
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Stored bytes, or None if missing or expired
+        """
+        key_bytes = key.encode()
+        h = _key_hash(key_bytes)
+        with self._lock:
+            location = self._index.get(h)
+            if location is None:
+                return None
+            segment_id, offset, length, expires_at = location
+            if expires_at <= time.time():
+                del self._index[h]
+                self._mark_dead(location)
+                self.expired += 1
+                return None
+
+            buf = self._segments[segment_id].map
+            key_start = offset + RECORD_OVERHEAD
+            if buf[key_start:key_start + len(key_bytes)] != key_bytes:
+                # 64-bit hash collision with another key
+                return None
+            return buf[key_start + len(key_bytes):offset + length]
+
+    # Maintenance ----------------------------------------------------------
+
+    async def sweep(self) -> Dict[str, int]:
+        """
+        Drop expired entries, evict oldest segments over budget and compact
+
+        Returns:
+            Counts of expired entries, evicted segments and compacted segments
+        """
+        return await self._run(self._sweep_sync)
+
+    def _sweep_sync(self) -> Dict[str, int]:
+        # The lock is only held to snapshot and to apply; scans and segment
+        # reads run without it so get() on the event loop is not stalled
+        now = time.time()
+        with self._lock:
+            snapshot = list(self._index.items())
+        expired = [(h, loc) for h, loc in snapshot if loc[3] <= now]
+        expired_count = 0
+        with self._lock:
+            for h, location in expired:
+                # Skip keys rewritten since the snapshot
+                if self._index.get(h) == location:
+                    del self._index[h]
+                    self._mark_dead(location)
+                    expired_count += 1
+        self.expired += expired_count
+
+        evicted = 0
+        while self.max_bytes > 0:
+            with self._lock:
+                if self._total_bytes() <= self.max_bytes:
+                    break
+                sealed = [s for s in self._segments.values() if s is not self._active]
+                if not sealed:
+                    break
+                oldest = min(sealed, key=lambda s: s.id)
+            # Sealed segments are immutable, so their records can be read unlocked
+            owned = [(_key_hash(key), offset) for offset, _, _, _, key in oldest.records()]
+            with self._lock:
+                for h, offset in owned:
+                    location = self._index.get(h)
+                    if location is not None and location[0] == oldest.id and location[1] == offset:
+                        del self._index[h]
+                self._drop_segment(oldest)
+            evicted += 1
+        self.evicted += evicted
+
+        compacted = 0
+        with self._lock:
+            candidates = list(self._segments.values())
+        for segment in candidates:
+            if segment is self._active or segment.id not in self._segments:
+                continue
+            if segment.size and segment.dead / segment.size >= self.compact_ratio:
+                self._compact(segment)
+                compacted += 1
+        self.compactions += compacted
+
+        if expired_count or evicted or compacted:
+            logger.info(
+                f"Log cache sweep: {expired_count} expired, {evicted} segments evicted, "
+                f"{compacted} compacted"
+            )
+        return {"expired": expired_count, "evicted": evicted, "compacted": compacted}
+
+    def _compact(self, segment: _Segment):
+        """Copy live records (and still-needed tombstones) forward, then drop the segment"""
+        for offset, length, flags, expires_at, key in segment.records():
+            # Lock per record so readers on the event loop are never stalled long
+            with self._lock:
+                h = _key_hash(key)
+                location = self._index.get(h)
+                if flags == FLAG_PUT:
+                    if location is None or location[0] != segment.id or location[1] != offset:
+                        continue
+                    value = bytes(segment.map[offset + RECORD_OVERHEAD + len(key):offset + length])
+                    new_id, new_offset, new_length = self._append(key, value, FLAG_PUT, expires_at)
+                    self._index[h] = (new_id, new_offset, new_length, expires_at)
+                elif location is None and min(self._segments) < segment.id:
+                    # An older segment may still hold the deleted value
+                    new_id, _, new_length = self._append(key, b"", FLAG_TOMBSTONE, 0.0)
+                    self._segments[new_id].dead += new_length
+        with self._lock:
+            self._drop_segment(segment)
+
+    def _drop_segment(self, segment: _Segment):
+        segment.close()
+        segment.path.unlink(missing_ok=True)
+        del self._segments[segment.id]
+
+    def _total_bytes(self) -> int:
+        return sum(s.size for s in self._segments.values())
+
+    def stats(self) -> Dict[str, Any]:
+        """Store counters"""
+        with self._lock:
+            return {
+                "entries": len(self._index),
+                "segments": len(self._segments),
+                "bytes": self._total_bytes(),
+                "dead_bytes": sum(s.dead for s in self._segments.values()),
+                "max_bytes": self.max_bytes,
+                "expired": self.expired,
+                "evicted_segments": self.evicted,
+                "compactions": self.compactions,
+                "recovered_truncations": self.recovered_truncations,
+            }
+
+    async def close(self):
+        """Trim the active segment, release mappings and the directory lock"""
+        with self._lock:
+            for segment in self._segments.values():
+                segment.close()
+            if self._lock_fd is not None:
+                os.close(self._lock_fd)
+                self._lock_fd = None
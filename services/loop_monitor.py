@@ -0,0 +1,80 @@
+"""
+Loop Monitor - Measures how late the event loop runs scheduled callbacks
+"""
+
+import os
+import asyncio
+import logging
+from collections import deque
+from typing import Any, Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class EventLoopMonitor:
+    """
+    Samples event-loop lag with a periodic sleep
+
+    Each sample is how much later than requested the sleep resumed, i.e.
+    how long something (a parse, a blocking call) held the loop. Recent
+    samples are kept for percentiles; the max covers the whole run.
+    """
+
+    def __init__(self, interval: Optional[float] = None, window: int = 1200):
+        if interval is None:
+            interval = float(os.getenv("EVENT_LOOP_MONITOR_INTERVAL_MS", "100")) / 1000
+        self.interval = interval
+        self.samples: "deque[float]" = deque(maxlen=window)
+        self.count = 0
+        self.total_lag = 0.0
+        self.max_lag = 0.0
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self):
+        """Start sampling on the running loop (no-op if disabled or running)"""
+        if self.interval <= 0 or self._task is not None:
+            return
+        self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def stop(self):
+        """Stop sampling"""
+        if self._task is None:
+            return
+        self._task.cancel()
+        try:
+            await self._task
+        except asyncio.CancelledError:
+            pass
+        self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            self.record(max(0.0, loop.time() - started - self.interval))
+
+    def record(self, lag: float):
+        """Add one lag sample (seconds)"""
+        self.samples.append(lag)
+        self.count += 1
+        self.total_lag += lag
+        self.max_lag = max(self.max_lag, lag)
+
+    def stats(self) -> Dict[str, Any]:
+        """Lag counters (ms); percentiles over the recent window"""
+        ordered = sorted(self.samples)
+
+        def percentile(p: float) -> float:
+            if not ordered:
+                return 0.0
+            return ordered[min(len(ordered) - 1, int(p * len(ordered)))] * 1000
+
+        return {
+            "interval_ms": self.interval * 1000,
+            "samples": self.count,
+            "avg_lag_ms": (self.total_lag / self.count * 1000) if self.count else 0.0,
+            "p50_lag_ms": percentile(0.5),
+            "p99_lag_ms": percentile(0.99),
+            "max_lag_ms": self.max_lag * 1000,
+        }
@@ -0,0 +1,241 @@
+"""
+Memory Cache - Byte-bounded in-process cache with W-TinyLFU admission
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Hashable, Optional
+
+logger = logging.getLogger(__name__)
+
+# Per-row multipliers for deriving count-min sketch indexes from one hash
+SKETCH_SEEDS = (0x9E3779B97F4A7C15, 0xC2B2AE3D27D4EB4F, 0x165667B19E3779F9, 0x27D4EB2F165667C5)
+
+# bytes.translate table that halves every 4-bit counter (sketch aging)
+HALVE_TABLE = bytes(i >> 1 for i in range(256))
+
+
+class CountMinSketch:
+    """4-bit count-min sketch with periodic halving, used as the TinyLFU frequency filter"""
+
+    def __init__(self, width: int):
+        self.width = 1 << max(6, (max(1, width) - 1).bit_length())
+        self.mask = self.width - 1
+        self.depth = len(SKETCH_SEEDS)
+        self.table = bytearray(self.width * self.depth)
+        self.sample_size = 10 * self.width
+        self.additions = 0
+
+    def _indexes(self, key: Hashable):
+        h = hash(key)
+        for row, seed in enumerate(SKETCH_SEEDS):
+            yield row * self.width + (((h * seed) >> 17) & self.mask)
+
+    def increment(self, key: Hashable):
+        for index in self._indexes(key):
+            if self.table[index] < 15:
+                self.table[index] += 1
+        self.additions += 1
+        if self.additions >= self.sample_size:
+            # Age counts so the sketch tracks recent popularity
+            self.table = bytearray(self.table.translate(HALVE_TABLE))
+            self.additions //= 2
+
+    def frequency(self, key: Hashable) -> int:
+        return min(self.table[index] for index in self._indexes(key))
+
+
+class _Node:
+    """Cached value with its accounted size and expiry"""
+
+    __slots__ = ("value", "size", "expires_at")
+
+    def __init__(self, value: Any, size: int, expires_at: float):
+        self.value = value
+        self.size = size
+        self.expires_at = expires_at
+
+
+class TinyLFUCache:
+    """
+    Memory-bounded cache using W-TinyLFU
+
+    New entries land in a small LRU window. Entries leaving the window only
+    enter the main segmented LRU (probation + protected) if the frequency
+    sketch says they are more popular than the main victim they would
+    replace, so a burst of one-off keys cannot flush hot entries.
+    Capacity is accounted in bytes of the serialized value.
+    """
+
+    def __init__(self, max_bytes: int, window_ratio: float = 0.01, protected_ratio: float = 0.8,
+                 avg_entry_bytes: int = 2048):
+        self.max_bytes = max_bytes
+        self.window_max = max(1, int(max_bytes * window_ratio))
+        self.main_max = max_bytes - self.window_max
+        self.protected_max = int(self.main_max * protected_ratio)
+
+        self.window: "OrderedDict[Hashable, _Node]" = OrderedDict()
+        self.probation: "OrderedDict[Hashable, _Node]" = OrderedDict()
+        self.protected: "OrderedDict[Hashable, _Node]" = OrderedDict()
+        self.window_bytes = 0
+        self.probation_bytes = 0
+        self.protected_bytes = 0
+
+        self.sketch = CountMinSketch(max_bytes // avg_entry_bytes)
+
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.rejections = 0
+
+    def __len__(self) -> int:
+        return len(self.window) + len(self.probation) + len(self.protected)
+
+    @property
+    def size_bytes(self) -> int:
+        return self.window_bytes + self.probation_bytes + self.protected_bytes
+
+    def get(self, key: Hashable, now: float) -> Optional[Any]:
+        """
+        Look up key, promoting it on a hit
+
+        Args:
+            key: Cache key
+            now: Current unix time for expiry checks
+
+        Returns:
+            Cached value or None
+        """
+        self.sketch.increment(key)
+
+        node = self.window.get(key)
+        if node is not None:
+            if node.expires_at <= now:
+                return self._expire(key)
+            self.window.move_to_end(key)
+            self.hits += 1
+            return node.value
+
+        node = self.protected.get(key)
+        if node is not None:
+            if node.expires_at <= now:
+                return self._expire(key)
+            self.protected.move_to_end(key)
+            self.hits += 1
+            return node.value
+
+        node = self.probation.get(key)
+        if node is not None:
+            if node.expires_at <= now:
+                return self._expire(key)
+            # Second access: promote to protected, demoting its LRU if full
+            del self.probation[key]
+            self.probation_bytes -= node.size
+            self.protected[key] = node
+            self.protected_bytes += node.size
+            while self.protected_bytes > self.protected_max and len(self.protected) > 1:
+                demoted_key, demoted = self.protected.popitem(last=False)
+                self.protected_bytes -= demoted.size
+                self.probation[demoted_key] = demoted
+                self.probation_bytes += demoted.size
+            self.hits += 1
+            return node.value
+
+        self.misses += 1
+        return None
+
+    def put(self, key: Hashable, value: Any, size: int, expires_at: float) -> bool:
+        """
+        Insert or replace key
+
+        Args:
+            key: Cache key
+            value: Value to keep (returned as-is on hits)
+            size: Accounted size in bytes
+            expires_at: Unix time after which the entry is dropped
+
+        Returns:
+            True if the entry was stored
+        """
+        self.delete(key)
+        if size > self.main_max:
+            self.rejections += 1
+            return False
+
+        self.sketch.increment(key)
+        self.window[key] = _Node(value, size, expires_at)
+        self.window_bytes += size
+        while self.window_bytes > self.window_max and self.window:
+            candidate_key, candidate = self.window.popitem(last=False)
+            self.window_bytes -= candidate.size
+            self._admit(candidate_key, candidate)
+        return True
+
+    def _admit(self, key: Hashable, node: _Node):
+        """
+        Move a window victim into the main space if it beats the main victims
+
+        The victims it would displace (probation LRU first, then protected)
+        are chosen before anything is evicted, so a candidate that loses to
+        any of them is rejected without costing the cache an entry.
+        """
+        candidate_freq = self.sketch.frequency(key)
+        needed = self.probation_bytes + self.protected_bytes + node.size - self.main_max
+        victims = []
+        if needed > 0:
+            for segment in (self.probation, self.protected):
+                for victim_key, victim in segment.items():
+                    if needed <= 0:
+                        break
+                    if candidate_freq <= self.sketch.frequency(victim_key):
+                        self.rejections += 1
+                        return
+                    victims.append((segment, victim_key))
+                    needed -= victim.size
+
+        for segment, victim_key in victims:
+            victim = segment.pop(victim_key)
+            if segment is self.probation:
+                self.probation_bytes -= victim.size
+            else:
+                self.protected_bytes -= victim.size
+            self.evictions += 1
+
+        self.probation[key] = node
+        self.probation_bytes += node.size
+
+    def delete(self, key: Hashable) -> bool:
+        """Remove key from whichever segment holds it"""
+        node = self.window.pop(key, None)
+        if node is not None:
+            self.window_bytes -= node.size
+            return True
+        node = self.probation.pop(key, None)
+        if node is not None:
+            self.probation_bytes -= node.size
+            return True
+        node = self.protected.pop(key, None)
+        if node is not None:
+            self.protected_bytes -= node.size
+            return True
+        return False
+
+    def _expire(self, key: Hashable) -> None:
+        self.delete(key)
+        self.expirations += 1
+        self.misses += 1
+        return None
+
+    def stats(self) -> Dict[str, Any]:
+        """Hit/miss/eviction counters and occupancy"""
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "expirations": self.expirations,
+            "rejections": self.rejections,
+            "entries": len(self),
+            "bytes": self.size_bytes,
+            "max_bytes": self.max_bytes,
+        }
@@ -0,0 +1,449 @@
+"""
+Page Variants - Learns which lighter variant of a site's pages (mobile, AMP, feed) to fetch
+"""
+
+import os
+import re
+import time
+import html as html_lib
+import logging
+from typing import Any, Dict, Optional, Tuple
+from urllib.parse import urljoin, urlsplit, urlunsplit
+
+from services.url_normalizer import canonicalize_url, normalize_domain
+
+try:
+    from lxml import etree
+except ImportError:  # pragma: no cover - lxml is in requirements.txt
+    etree = None
+
+logger = logging.getLogger(__name__)
+
+VARIANTS = ("mobile", "amp", "rss")
+
+# Bytes at the start of a page searched for <link rel="amphtml"> and feed links
+SCAN_BYTES = 32768
+
+AMP_LINK = re.compile(rb"""<link\b[^>]*\brel\s*=\s*["']?amphtml\b[^>]*>""", re.IGNORECASE)
+FEED_LINK = re.compile(rb"""<link\b[^>]*\btype\s*=\s*["']?application/(?:rss|atom)\+xml\b[^>]*>""", re.IGNORECASE)
+HREF = re.compile(rb"""\bhref\s*=\s*(?:"([^"]*)"|'([^']*)'|([^\s>]+))""", re.IGNORECASE)
+
+# Characters per shingle when comparing texts
+SHINGLE_CHARS = 8
+
+
+def link_href(pattern: "re.Pattern", head: bytes, base_url: str) -> Optional[str]:
+    """Absolute href of the first <link> tag matching pattern in head, if any"""
+    tag = pattern.search(head)
+    if not tag:
+        return None
+    href = HREF.search(tag.group(0))
+    if not href:
+        return None
+    value = next(group for group in href.groups() if group is not None)
+    value = html_lib.unescape(value.decode("utf-8", "replace")).strip()
+    if not value:
+        return None
+    url = urljoin(base_url, value)
+    return url if url.startswith(("http://", "https://")) else None
+
+
+def same_site(url: str, domain: str) -> bool:
+    """Whether url is on the page's normalized domain (variants from other sites are ignored)"""
+    return normalize_domain(urlsplit(url).hostname or "") == domain
+
+
+def text_similarity(original: str, variant: str) -> float:
+    """
+    Share of the original text's shingles found in the variant's text
+
+    Whitespace is ignored, so CJK and spaced text compare the same way.
+    Text the variant adds (or a trailing part the original lacks) does not
+    count against it.
+
+    Args:
+        original: Main text of the full page
+        variant: Main text of the variant
+
+    Returns:
+        0.0 - 1.0 (0.0 if either text is empty)
+    """
+    original = "".join(original.split())
+    variant = "".join(variant.split())
+    if not original or not variant:
+        return 0.0
+    if len(original) <= SHINGLE_CHARS:
+        return 1.0 if original in variant else 0.0
+    wanted = {original[i:i + SHINGLE_CHARS] for i in range(len(original) - SHINGLE_CHARS + 1)}
+    found = {variant[i:i + SHINGLE_CHARS] for i in range(len(variant) - SHINGLE_CHARS + 1)}
+    return len(wanted & found) / len(wanted)
+
+
+def document_similarity(original: Dict[str, Any], variant: Dict[str, Any]) -> float:
+    """
+    How well a variant's document stands in for the page's
+
+    Variant copies also feed metadata responses, so besides the main text
+    the title and summary are compared (the lowest score counts), and a
+    variant without images for a page that has them scores 0.0.
+
+    Args:
+        original: Document of the full page
+        variant: Document of the variant
+
+    Returns:
+        0.0 - 1.0
+    """
+    if original.get("images") and not variant.get("images"):
+        return 0.0
+    scores = [text_similarity(original["main_text"], variant["main_text"])]
+    for field in ("title", "summary"):
+        if original.get(field):
+            scores.append(text_similarity(original[field], variant.get(field) or ""))
+    return min(scores)
+
+
+def _local_name(tag: Any) -> str:
+    return tag.rsplit("}", 1)[-1] if isinstance(tag, str) else ""
+
+
+def parse_feed(data: bytes) -> Dict[str, Tuple[str, str]]:
+    """
+    Items of an RSS or Atom feed
+
+    Args:
+        data: Feed XML
+
+    Returns:
+        Canonical item URL -> (title, body HTML); the body is the full
+        content (content:encoded / Atom content) when present, else the
+        description / summary
+    """
+    if etree is None or not data.strip():
+        return {}
+    parser = etree.XMLParser(recover=True, resolve_entities=False, no_network=True, huge_tree=False)
+    try:
+        root = etree.fromstring(data, parser=parser)
+    except etree.LxmlError:
+        return {}
+    if root is None:
+        return {}
+
+    items = {}
+    for item in root.iter():
+        if _local_name(item.tag) not in ("item", "entry"):
+            continue
+        fields: Dict[str, str] = {}
+        for child in item:
+            name = _local_name(child.tag)
+            if name == "link" and "link" not in fields:
+                href = child.get("href")
+                if child.get("rel", "alternate") == "alternate":
+                    fields["link"] = (href or child.text or "").strip()
+            elif name in ("title", "encoded", "content", "description", "summary") and name not in fields:
+                fields[name] = child.text or ""
+        body = fields.get("encoded") or fields.get("content") or fields.get("description") or fields.get("summary")
+        if fields.get("link") and body:
+            items[canonicalize_url(fields["link"])] = (fields.get("title", "").strip(), body)
+    return items
+
+
+def feed_item_html(title: str, body: str) -> str:
+    """Page HTML for a feed item, so the usual extractor builds its document"""
+    return f"<html><head><title>{html_lib.escape(title)}</title></head><body><article>{body}</article></body></html>"
+
+
+class _DomainProfile:
+    """What is known about one domain's variants"""
+
+    __slots__ = ("original", "variants", "preferred", "rejected", "configured", "trial_pending",
+                 "feed_url", "feed_items", "feed_item_bytes", "feed_expires", "served_since_check",
+                 "failures", "bytes_saved", "seconds_saved")
+
+    def __init__(self):
+        self.original = {"pages": 0, "bytes": 0, "seconds": 0.0}
+        self.variants = {
+            name: {"trials": 0, "served": 0, "bytes": 0, "seconds": 0.0, "fallbacks": 0}
+            for name in VARIANTS
+        }
+        self.preferred: Optional[str] = None
+        self.rejected = set()
+        self.configured = False
+        self.trial_pending = False
+        self.feed_url: Optional[str] = None
+        self.feed_items: Dict[str, Tuple[str, str]] = {}
+        self.feed_item_bytes = 0
+        self.feed_expires = 0.0
+        self.served_since_check = 0
+        self.failures = 0
+        self.bytes_saved = 0
+        self.seconds_saved = 0.0
+
+    def average(self, name: str) -> Tuple[float, float]:
+        """Average (bytes, seconds) of the original page or a variant"""
+        if name == "original":
+            count = self.original["pages"]
+            stats = self.original
+        else:
+            stats = self.variants[name]
+            count = stats["trials"] + stats["served"]
+        if not count:
+            return 0.0, 0.0
+        return stats["bytes"] / count, stats["seconds"] / count
+
+
+class PageVariants:
+    """
+    Per-domain choice between a page and its lighter variants
+
+    Candidates are the domain rule's mobile rewrite or an m. host for
+    domains in MOBILE_VARIANT_DOMAINS, the <link rel="amphtml"> of each
+    page, and items of the feed linked from the site's pages; only URLs on
+    the page's own domain are used. After a full page is fetched, a
+    candidate is fetched in the background and its document compared with
+    the page's (document_similarity). A variant that gave an equivalent
+    document (VARIANT_MIN_SIMILARITY) in VARIANT_TRIALS trials, with at most
+    VARIANT_MAX_SIZE_RATIO of the page's bytes, becomes the domain's
+    preferred variant (the smallest such). A rule's rewrite is preferred
+    from the start. Every VARIANT_VERIFY_EVERY pages served from a variant
+    the full page is fetched again to check it still matches; a mismatch
+    or VARIANT_MAX_FAILURES failures in a row drop the variant.
+    """
+
+    def __init__(self):
+        self.enabled = os.getenv("PAGE_VARIANTS", "1").lower() not in ("0", "false", "no", "off")
+        self.trials = int(os.getenv("VARIANT_TRIALS", "3"))
+        self.min_similarity = float(os.getenv("VARIANT_MIN_SIMILARITY", "0.8"))
+        self.max_size_ratio = float(os.getenv("VARIANT_MAX_SIZE_RATIO", "0.8"))
+        self.verify_every = int(os.getenv("VARIANT_VERIFY_EVERY", "20"))
+        self.max_failures = int(os.getenv("VARIANT_MAX_FAILURES", "3"))
+        self.mobile_domains = {
+            domain.strip().lower() for domain in os.getenv("MOBILE_VARIANT_DOMAINS", "").split(",") if domain.strip()
+        }
+        # normalized domain -> profile
+        self.domains: Dict[str, _DomainProfile] = {}
+
+    def profile(self, domain: str) -> Optional[_DomainProfile]:
+        """Profile for domain, created on first use (None once 1000 domains are tracked)"""
+        profile = self.domains.get(domain)
+        if profile is None and len(self.domains) < 1000:
+            profile = self.domains[domain] = _DomainProfile()
+        return profile
+
+    def mobile_url(self, url: str, domain: str, rule: Any = None) -> Tuple[Optional[str], bool]:
+        """
+        Mobile variant of url
+
+        Returns:
+            (URL, configured): the rule's rewrite (configured), an m. host
+            for MOBILE_VARIANT_DOMAINS, or (None, False)
+        """
+        if rule is not None:
+            rewritten = rule.rewrite(url)
+            if rewritten != url:
+                return rewritten, True
+        if domain in self.mobile_domains:
+            parts = urlsplit(url)
+            host = f"m.{domain}"
+            if (parts.hostname or "").lower() != host:
+                netloc = host if parts.port is None else f"{host}:{parts.port}"
+                return urlunsplit((parts.scheme, netloc, parts.path, parts.query, "")), False
+        return None, False
+
+    def preferred(self, domain: str, configured_mobile: bool = False) -> Optional[str]:
+        """Variant to fetch for a domain's pages, if any"""
+        profile = self.profile(domain)
+        if profile is None:
+            return None
+        if configured_mobile and not profile.configured:
+            profile.configured = True
+            self._choose(profile)
+        return profile.preferred
+
+    def record_original(self, domain: str, body_bytes: int, seconds: float):
+        """Record a full fetch of a page (the baseline savings are measured against)"""
+        profile = self.profile(domain)
+        if profile is not None:
+            profile.original["pages"] += 1
+            profile.original["bytes"] += body_bytes
+            profile.original["seconds"] += seconds
+
+    def discover(self, domain: str, url: str, head: bytes) -> Optional[str]:
+        """
+        Look for variant links at the top of a fetched page
+
+        Remembers the domain's feed URL and returns the page's AMP URL;
+        links to other domains are ignored.
+        """
+        profile = self.profile(domain)
+        if profile is None or not head:
+            return None
+        if profile.feed_url is None:
+            feed_url = link_href(FEED_LINK, head, url)
+            if feed_url and same_site(feed_url, domain):
+                profile.feed_url = feed_url
+        amp_url = link_href(AMP_LINK, head, url)
+        if not amp_url or not same_site(amp_url, domain):
+            return None
+        return amp_url if canonicalize_url(amp_url) != canonicalize_url(url) else None
+
+    def next_trial(self, domain: str, candidates: Dict[str, Optional[str]]) -> Optional[Tuple[str, Optional[str]]]:
+        """
+        Candidate to try next for a domain (one trial in flight per domain)
+
+        Args:
+            domain: Normalized domain
+            candidates: variant -> URL for this page (rss needs no URL)
+
+        Returns:
+            (variant, URL) to fetch in the background, or None
+        """
+        profile = self.profile(domain)
+        if profile is None or profile.trial_pending:
+            return None
+        for variant in VARIANTS:
+            url = candidates.get(variant)
+            if variant == "rss":
+                url = profile.feed_url
+            if not url or variant in profile.rejected or variant == profile.preferred:
+                continue
+            if profile.variants[variant]["trials"] < self.trials:
+                profile.trial_pending = True
+                return variant, candidates.get(variant)
+        return None
+
+    def record_trial(self, domain: str, variant: Optional[str], similarity: Optional[float],
+                     body_bytes: int = 0, seconds: float = 0.0):
+        """
+        Record a background trial
+
+        Args:
+            similarity: text_similarity() against the full page; None when
+                the trial got nothing to compare (error, item not in feed)
+        """
+        profile = self.domains.get(domain)
+        if profile is None:
+            return
+        profile.trial_pending = False
+        if variant is None or similarity is None:
+            return
+        if similarity < self.min_similarity:
+            logger.info(f"{variant} variant of {domain} differs from the page (similarity {similarity:.2f})")
+            profile.rejected.add(variant)
+        else:
+            stats = profile.variants[variant]
+            stats["trials"] += 1
+            stats["bytes"] += body_bytes
+            stats["seconds"] += seconds
+        self._choose(profile)
+
+    def record_served(self, domain: str, variant: str, body_bytes: int, seconds: float) -> bool:
+        """
+        Record a page served from a variant
+
+        Returns:
+            True when the full page should be fetched to verify the variant
+        """
+        profile = self.domains[domain]
+        stats = profile.variants[variant]
+        stats["served"] += 1
+        stats["bytes"] += body_bytes
+        stats["seconds"] += seconds
+        profile.failures = 0
+        if profile.original["pages"]:
+            original_bytes, original_seconds = profile.average("original")
+            profile.bytes_saved += int(original_bytes - body_bytes)
+            profile.seconds_saved += original_seconds - seconds
+        profile.served_since_check += 1
+        if self.verify_every > 0 and profile.served_since_check >= self.verify_every:
+            profile.served_since_check = 0
+            return True
+        return False
+
+    def record_fallback(self, domain: str, variant: str, failed: bool = True):
+        """
+        Record a page the variant could not serve
+
+        Args:
+            failed: False when the variant simply had no copy (item not in
+                the feed, page without an AMP link), which does not count
+                towards dropping it
+        """
+        profile = self.domains[domain]
+        profile.variants[variant]["fallbacks"] += 1
+        if failed:
+            profile.failures += 1
+            if profile.failures >= self.max_failures:
+                logger.warning(f"Dropping {variant} variant of {domain} after {profile.failures} failures")
+                self.reject(domain, variant)
+
+    def reject(self, domain: str, variant: str):
+        """Stop using a variant for a domain"""
+        profile = self.domains.get(domain)
+        if profile is not None:
+            profile.rejected.add(variant)
+            profile.failures = 0
+            self._choose(profile)
+
+    def _choose(self, profile: _DomainProfile):
+        original_bytes, _ = profile.average("original")
+        best, best_bytes = None, None
+        for variant in VARIANTS:
+            if variant in profile.rejected:
+                continue
+            stats = profile.variants[variant]
+            variant_bytes, _ = profile.average(variant)
+            configured = variant == "mobile" and profile.configured
+            if not configured:
+                if stats["trials"] < self.trials or not original_bytes:
+                    continue
+                if variant_bytes > original_bytes * self.max_size_ratio:
+                    continue
+            if best is None or variant_bytes < best_bytes:
+                best, best_bytes = variant, variant_bytes
+        if best != profile.preferred:
+            logger.info(f"Preferred page variant changed from {profile.preferred} to {best}")
+        profile.preferred = best
+
+    def feed_fresh(self, profile: _DomainProfile) -> bool:
+        return profile.feed_expires > time.time()
+
+    def store_feed(self, profile: _DomainProfile, data: bytes, ttl: float):
+        """Keep a fetched feed's items for ttl seconds"""
+        profile.feed_items = parse_feed(data)
+        # Feed bytes are shared by its items
+        profile.feed_item_bytes = len(data) // max(len(profile.feed_items), 1)
+        profile.feed_expires = time.time() + ttl
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-domain variant choice and savings"""
+        result = {}
+        for domain, profile in self.domains.items():
+            original_bytes, original_seconds = profile.average("original")
+            variants = {}
+            for variant, stats in profile.variants.items():
+                if not (stats["trials"] or stats["served"] or stats["fallbacks"]) and variant not in profile.rejected:
+                    continue
+                variant_bytes, variant_seconds = profile.average(variant)
+                variants[variant] = {
+                    "trials": stats["trials"],
+                    "served": stats["served"],
+                    "fallbacks": stats["fallbacks"],
+                    "rejected": variant in profile.rejected,
+                    "avg_kib": round(variant_bytes / 1024, 1),
+                    "avg_ms": round(variant_seconds * 1000, 1),
+                }
+            if not (variants or profile.preferred or profile.feed_url):
+                continue
+            result[domain] = {
+                "preferred": profile.preferred or "original",
+                "original": {
+                    "pages": profile.original["pages"],
+                    "avg_kib": round(original_bytes / 1024, 1),
+                    "avg_ms": round(original_seconds * 1000, 1),
+                },
+                "variants": variants,
+                "bytes_saved": profile.bytes_saved,
+                "latency_saved_ms": round(profile.seconds_saved * 1000, 1),
+            }
+        return result
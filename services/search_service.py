@@ -7,9 +7,11 @@ import logging
 from typing import Dict, Any, Optional, List
 from urllib.parse import urlparse
 import httpx
-from bs4 import BeautifulSoup
 
+from services.document_service import DocumentService
 from services.gemini_service import GeminiService
+from services.generation_cache import GenerationCache
+from services.url_normalizer import normalize_domain
 
 logger = logging.getLogger(__name__)
 
@@ -17,10 +19,18 @@ logger = logging.getLogger(__name__)
 class SearchService:
     """Service for web search and content metadata extraction"""
     
-    def __init__(self):
+    def __init__(
+        self,
+        document_service: Optional[DocumentService] = None,
+        generation_cache: Optional[GenerationCache] = None
+    ):
         self.gcs_api_key = os.getenv("GOOGLE_SEARCH_KEY")
         self.gcs_engine_id = os.getenv("GOOGLE_SEARCH_ENGINE_ID")
         self.gemini_service = GeminiService()
+        # Article pages are fetched and parsed once for all endpoints
+        self.document_service = document_service or DocumentService()
+        # Tags are shared by every URL carrying the same article text
+        self.generation_cache = generation_cache
         
         self.client = httpx.AsyncClient(
             timeout=30.0,
@@ -38,20 +48,7 @@ class SearchService:
         Returns:
             Normalized domain string
         """
-        parsed = urlparse(url)
-        domain = parsed.netloc.lower()
-        
-        # Remove www. prefix
-        if domain.startswith("www."):
-            domain = domain[4:]
-        
-        # Remove mobile subdomain (m., mobile., etc.)
-        if domain.startswith("m."):
-            domain = domain[2:]
-        elif domain.startswith("mobile."):
-            domain = domain[7:]
-        
-        return domain
+        return normalize_domain(urlparse(url).netloc)
     
     async def get_metadata(
         self,
@@ -83,10 +80,7 @@ class SearchService:
             # Generate tags using Gemini if tag_prompt provided
             tags = []
             if tag_prompt and content_data.get("text"):
-                tags = await self.gemini_service.generate_tags(
-                    content=content_data["text"],
-                    tag_prompt=tag_prompt
-                )
+                tags = await self._generate_tags(content_data["text"], tag_prompt)
             
             # Build sources list with domain filtering
             sources = []
@@ -139,9 +133,18 @@ class SearchService:
                 "search_quota": 0
             }
     
+    async def _generate_tags(self, content: str, tag_prompt: str) -> List[str]:
+        """Generate tags, through the generation cache when one is configured"""
+        async def generate() -> List[str]:
+            return await self.gemini_service.generate_tags(content=content, tag_prompt=tag_prompt)
+        
+        if self.generation_cache is None:
+            return await generate()
+        return await self.generation_cache.get_or_generate("tags", content, {"tag_prompt": tag_prompt}, generate)
+    
     async def _fetch_and_parse(self, url: str) -> Dict[str, Any]:
         """
-        Fetch and parse URL content
+        Fetch and parse URL content (shared with ContentService)
         
         Args:
             url: URL to fetch
@@ -149,123 +152,7 @@ class SearchService:
         Returns:
             Dict with title, summary, text, images
         """
-        try:
-            response = await self.client.get(url)
-            response.raise_for_status()
-            
-            html = response.text
-            soup = BeautifulSoup(html, 'html.parser')
-            
-            # Extract title
-            title = ""
-            if soup.title:
-                title = soup.title.string.strip()
-            elif soup.find("meta", property="og:title"):
-                title = soup.find("meta", property="og:title")["content"]
-            
-            # Extract description/summary
-            summary = ""
-            if soup.find("meta", property="og:description"):
-                summary = soup.find("meta", property="og:description")["content"]
-            elif soup.find("meta", attrs={"name": "description"}):
-                summary = soup.find("meta", attrs={"name": "description"})["content"]
-            
-            # Extract text content (remove scripts, styles)
-            for script in soup(["script", "style", "meta", "link"]):
-                script.decompose()
-            
-            text = soup.get_text()
-            text = ' '.join(text.split())  # Normalize whitespace
-            text = text[:5000]  # Limit length
-            
-            # Extract images
-            images = []
-            seen_images = set()  # Track seen images to avoid duplicates
-            
-            # First, try Open Graph image (usually the best quality)
-            og_image = soup.find("meta", property="og:image")
-            if og_image and og_image.get("content"):
-                img_url = og_image["content"]
-                if img_url not in seen_images:
-                    seen_images.add(img_url)
-                    # Convert relative URLs to absolute
-                    if not img_url.startswith("http"):
-                        if img_url.startswith("//"):
-                            img_url = "https:" + img_url
-                        elif img_url.startswith("/"):
-                            img_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}{img_url}"
-                        else:
-                            img_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}/{img_url}"
-                    images.append({
-                        "url": img_url,
-                        "width": 0,
-                        "height": 0,
-                        "type": "og:image"
-                    })
-            
-            # Try Twitter card image
-            twitter_image = soup.find("meta", attrs={"name": "twitter:image"})
-            if twitter_image and twitter_image.get("content"):
-                img_url = twitter_image["content"]
-                if img_url not in seen_images:
-                    seen_images.add(img_url)
-                    if not img_url.startswith("http"):
-                        if img_url.startswith("//"):
-                            img_url = "https:" + img_url
-                        elif img_url.startswith("/"):
-                            img_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}{img_url}"
-                    images.append({
-                        "url": img_url,
-                        "width": 0,
-                        "height": 0,
-                        "type": "twitter:image"
-                    })
-            
-            # Extract images from <img> tags
-            for img in soup.find_all("img", src=True):
-                if len(images) >= 5:  # Limit to 5 images total
-                    break
-                    
-                img_url = img.get("src") or img.get("data-src") or img.get("data-lazy-src")
-                if not img_url:
-                    continue
-                
-                # Convert relative URLs to absolute
-                if img_url.startswith("//"):
-                    img_url = "https:" + img_url
-                elif img_url.startswith("/"):
-                    img_url = f"{urlparse(url).scheme}://{urlparse(url).netloc}{img_url}"
-                elif not img_url.startswith("http"):
-                    continue
-                
-                # Skip data URLs and very small images
-                if img_url.startswith("data:") or "icon" in img_url.lower() or "logo" in img_url.lower():
-                    continue
-                
-                if img_url not in seen_images:
-                    seen_images.add(img_url)
-                    images.append({
-                        "url": img_url,
-                        "width": int(img.get("width", 0)) if img.get("width") and str(img.get("width")).isdigit() else 0,
-                        "height": int(img.get("height", 0)) if img.get("height") and str(img.get("height")).isdigit() else 0,
-                        "type": "img_tag"
-                    })
-            
-            return {
-                "title": title,
-                "summary": summary or text[:200],
-                "text": text,
-                "images": images
-            }
-            
-        except Exception as e:
-            logger.error(f"Error fetching URL {url}: {str(e)}")
-            return {
-                "title": "",
-                "summary": "",
-                "text": "",
-                "images": []
-            }
+        return await self.document_service.get_document(url)
     
     async def _google_search(self, query: str, num_results: int = 5) -> List[Dict[str, Any]]:
         """
@@ -0,0 +1,61 @@
+"""
+Singleflight Service - Coalesces identical in-flight calls within this process
+"""
+
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable, Dict
+
+logger = logging.getLogger(__name__)
+
+
+class SingleFlightService:
+    """Service that runs at most one call per key at a time and shares its result"""
+
+    def __init__(self):
+        self._in_flight: Dict[str, asyncio.Task] = {}
+        self.executions = 0
+        self.coalesced = 0
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run fn for key, or join the call already in flight for key
+
+        The shared call runs as its own task, so a caller that disconnects
+        (cancelled) does not cancel the work other callers are waiting on.
+        Exceptions are propagated to every waiting caller and never cached.
+
+        Args:
+            key: Coalescing key (e.g. the cache key of the request)
+            fn: Zero-argument coroutine function producing the result
+
+        Returns:
+            Result of the shared call
+        """
+        task = self._in_flight.get(key)
+        if task is not None:
+            self.coalesced += 1
+            logger.debug(f"Joining in-flight call for {key[:20]}...")
+            return await asyncio.shield(task)
+
+        self.executions += 1
+        task = asyncio.ensure_future(fn())
+        self._in_flight[key] = task
+        task.add_done_callback(lambda t: self._finish(key, t))
+        return await asyncio.shield(task)
+
+    def _finish(self, key: str, task: asyncio.Task):
+        """Forget a finished call so the next miss starts a fresh one"""
+        if self._in_flight.get(key) is task:
+            del self._in_flight[key]
+        # Mark exception as retrieved even if every caller went away
+        if not task.cancelled():
+            task.exception()
+
+    def stats(self) -> Dict[str, int]:
+        """Coalescing counters"""
+        return {
+            "in_flight": len(self._in_flight),
+            "executions": self.executions,
+            "coalesced": self.coalesced,
+        }
@@ -0,0 +1,230 @@
+"""
+SQLite Cache Store - WAL-mode SQLite table shared by workers on one host
+"""
+
+import time
+import sqlite3
+import asyncio
+import logging
+import threading
+from pathlib import Path
+from typing import Optional, Dict, Any, List, Tuple
+
+from services.executor_service import get_executor
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS cache_entries (
+    key TEXT PRIMARY KEY,
+    value BLOB NOT NULL,
+    expires_at REAL NOT NULL,
+    size INTEGER NOT NULL
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS cache_entries_expires_at ON cache_entries (expires_at);
+"""
+
+
+class SQLiteCacheStore:
+    """
+    Cache entries in one SQLite database in WAL mode
+
+    Several uvicorn workers can share the file: WAL lets readers proceed
+    while one writer commits, and each write is atomic. Lookups hit the
+    primary key; expiry and budget eviction walk the expires_at index.
+    Concurrent set/delete calls are coalesced and committed together in a
+    single transaction, so a burst of writes costs one WAL sync.
+    """
+
+    def __init__(self, path: Path, max_bytes: int):
+        self.path = path
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.max_bytes = max_bytes
+        self._local = threading.local()
+        self._connections: List[sqlite3.Connection] = []
+        self._connections_lock = threading.Lock()
+        self._pending: List[Tuple[str, Optional[bytes], float, asyncio.Future]] = []
+        self._flush_task: Optional[asyncio.Task] = None
+
+        self.expired = 0
+        self.evicted = 0
+        self.batches = 0
+        self.batched_writes = 0
+        self.total_bytes = 0
+        self.entries = 0
+
+        self._connect().executescript(SCHEMA)
+
+    def _connect(self) -> sqlite3.Connection:
+        """Connection for the calling thread (sqlite3 connections are not shared)"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=5.0, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+
+    async def _run(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(get_executor("file_io"), fn, *args)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        """
+        Read entry bytes for key
+
+        Args:
+            key: Cache key
+
+        Returns:
+            Stored bytes, or None if missing or expired
+        """
+        return await self._run(self._get_sync, key)
+
+    def _get_sync(self, key: str) -> Optional[bytes]:
+        row = self._connect().execute(
+            "SELECT value FROM cache_entries WHERE key = ? AND expires_at > ?",
+            (key, time.time())
+        ).fetchone()
+        return row[0] if row else None
+
+    async def set(self, key: str, data: bytes, expires_at: float):
+        """
+        Store entry bytes for key (committed with other concurrent writes)
+
+        Args:
+            key: Cache key
+            data: Serialized entry
+            expires_at: Unix time after which the entry is ignored and swept
+        """
+        await self._enqueue(key, data, expires_at)
+
+    async def delete(self, key: str) -> bool:
+        """Delete entry for key; True if a row was removed"""
+        return await self._enqueue(key, None, 0.0)
+
+    async def _enqueue(self, key: str, data: Optional[bytes], expires_at: float):
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((key, data, expires_at, future))
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.ensure_future(self._flush())
+        return await future
+
+    async def _flush(self):
+        """Commit queued writes in batches until the queue is empty"""
+        while self._pending:
+            batch, self._pending = self._pending, []
+            try:
+                results = await self._run(self._write_batch, [op[:3] for op in batch])
+            except Exception as e:
+                logger.warning(f"SQLite cache write failed: {str(e)}")
+                for *_, future in batch:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            for (*_, future), result in zip(batch, results):
+                if not future.done():
+                    future.set_result(result)
+
+    def _write_batch(self, ops: List[Tuple[str, Optional[bytes], float]]) -> List[Any]:
+        conn = self._connect()
+        results = []
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            for key, data, expires_at in ops:
+                if data is None:
+                    cursor = conn.execute("DELETE FROM cache_entries WHERE key = ?", (key,))
+                    results.append(cursor.rowcount > 0)
+                else:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache_entries (key, value, expires_at, size) VALUES (?, ?, ?, ?)",
+                        (key, data, expires_at, len(data))
+                    )
+                    results.append(None)
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+        self.batches += 1
+        self.batched_writes += len(ops)
+        return results
+
+    async def sweep(self) -> Dict[str, int]:
+        """
+        Delete expired rows and evict soonest-expiring ones over budget
+
+        Returns:
+            Counts of expired and evicted entries for this sweep
+        """
+        return await self._run(self._sweep_sync)
+
+    def _sweep_sync(self) -> Dict[str, int]:
+        conn = self._connect()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            expired = conn.execute(
+                "DELETE FROM cache_entries WHERE expires_at <= ?", (time.time(),)
+            ).rowcount
+            entries, total_bytes = conn.execute(
+                "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM cache_entries"
+            ).fetchone()
+
+            evicted = 0
+            if self.max_bytes > 0 and total_bytes > self.max_bytes:
+                # Evict down to 90% of the budget. Reads don't write access times
+                # (that would serialize every hit across workers), so the entries
+                # closest to expiry go first.
+                target = int(self.max_bytes * 0.9)
+                victims = []
+                for key, size in conn.execute(
+                    "SELECT key, size FROM cache_entries ORDER BY expires_at"
+                ):
+                    if total_bytes <= target:
+                        break
+                    victims.append((key,))
+                    total_bytes -= size
+                conn.executemany("DELETE FROM cache_entries WHERE key = ?", victims)
+                evicted = len(victims)
+                entries -= evicted
+            conn.execute("COMMIT")
+        except Exception:
+            conn.execute("ROLLBACK")
+            raise
+
+        # Keep the WAL from growing without bound between automatic checkpoints
+        conn.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+        self.expired += expired
+        self.evicted += evicted
+        self.total_bytes = total_bytes
+        self.entries = entries
+        if expired or evicted:
+            logger.info(f"SQLite cache sweep: {expired} expired, {evicted} evicted")
+        return {"expired": expired, "evicted": evicted}
+
+    def stats(self) -> Dict[str, Any]:
+        """Store counters (sizes as of the last sweep)"""
+        return {
+            "entries": self.entries,
+            "bytes": self.total_bytes,
+            "max_bytes": self.max_bytes,
+            "expired": self.expired,
+            "evicted": self.evicted,
+            "write_batches": self.batches,
+            "batched_writes": self.batched_writes,
+        }
+
+    async def close(self):
+        """Flush queued writes and close every thread's connection"""
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+        with self._connections_lock:
+            for conn in self._connections:
+                try:
+                    conn.close()
+                except Exception as e:
+                    logger.warning(f"SQLite cache close error: {str(e)}")
+            self._connections.clear()
+        self._local = threading.local()
@@ -0,0 +1,91 @@
+"""
+URL Normalizer - Canonical forms of article URLs and their domains
+"""
+
+from urllib.parse import urlsplit, urlunsplit, parse_qsl, urlencode
+
+# Host prefixes that serve the same site (desktop / mobile variants)
+HOST_ALIAS_PREFIXES = ("www.", "m.", "mobile.")
+
+# Query parameters that only track the visit and never change the page
+TRACKING_PARAMS = frozenset({
+    "fbclid", "gclid", "dclid", "gbraid", "wbraid", "msclkid", "yclid", "twclid", "ttclid",
+    "igshid", "mc_cid", "mc_eid", "_ga", "_gl", "spm", "ref_src", "cmpid",
+})
+TRACKING_PREFIXES = ("utm_",)
+
+DEFAULT_PORTS = {"http": 80, "https": 443}
+
+
+def normalize_domain(netloc: str) -> str:
+    """
+    Normalize a host so desktop and mobile variants compare equal
+    e.g., "m.cnyes.com" -> "cnyes.com", "www.cnyes.com" -> "cnyes.com"
+
+    Args:
+        netloc: Host (optionally with port) from a URL
+
+    Returns:
+        Lowercased host without www./mobile prefixes
+    """
+    domain = netloc.lower()
+
+    # Remove www. prefix
+    if domain.startswith("www."):
+        domain = domain[4:]
+
+    # Remove mobile subdomain (m., mobile., etc.)
+    if domain.startswith("m."):
+        domain = domain[2:]
+    elif domain.startswith("mobile."):
+        domain = domain[7:]
+
+    return domain
+
+
+def is_tracking_param(name: str) -> bool:
+    """Whether a query parameter only carries campaign/click tracking"""
+    name = name.lower()
+    return name in TRACKING_PARAMS or name.startswith(TRACKING_PREFIXES)
+
+
+def canonicalize_url(url: str) -> str:
+    """
+    Canonical form of a URL for cache keys (not for fetching)
+
+    Lowercases scheme and host, folds host aliases and default ports,
+    drops the fragment and tracking parameters, and sorts the remaining
+    query parameters.
+
+    Args:
+        url: URL (already percent-decoded by the caller if needed)
+
+    Returns:
+        Canonical URL string; input unchanged if it has no host
+    """
+    url = url.strip()
+    try:
+        parts = urlsplit(url)
+        port = parts.port
+    except ValueError:
+        return url
+    if not parts.netloc:
+        return url
+
+    scheme = parts.scheme.lower() or "https"
+    # http/https variants of an article are the same content
+    if scheme == "http":
+        scheme = "https"
+    host = normalize_domain(parts.hostname or "")
+    if port and port != DEFAULT_PORTS.get(parts.scheme.lower()):
+        host = f"{host}:{port}"
+
+    path = parts.path or "/"
+    if len(path) > 1 and path.endswith("/"):
+        path = path.rstrip("/")
+
+    query = sorted(
+        (name, value) for name, value in parse_qsl(parts.query, keep_blank_values=True)
+        if not is_tracking_param(name)
+    )
+    return urlunsplit((scheme, host, path, urlencode(query), ""))
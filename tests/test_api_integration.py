@@ -2,9 +2,10 @@
 Integration tests for API endpoints
 """
 import pytest
+from fastapi.responses import JSONResponse
 from fastapi.testclient import TestClient
 from unittest.mock import AsyncMock, patch
-from app import app
+from app import app, render_json
 
 client = TestClient(app)
 
@@ -89,6 +90,32 @@ class TestAPIIntegration:
         assert response.status_code == 200
         assert response.json() == cached_response
     
+    @patch('app.cache_service.get', new_callable=AsyncMock)
+    def test_cache_hit_serves_cached_bytes_verbatim(self, mock_cache_get, auth_headers):
+        """Test that a pre-rendered cached body is returned without re-encoding"""
+        cached_body = '{"task_id":"cached_task_id","data":{"status":"succeeded","note":"快取"}}'.encode()
+        mock_cache_get.return_value = cached_body
+        
+        response = client.post(
+            "/generateQuestions",
+            json={
+                "inputs": {
+                    "context": "Test content"
+                },
+                "user": "test_user"
+            },
+            headers=auth_headers
+        )
+        
+        assert response.status_code == 200
+        assert response.headers["content-type"] == "application/json"
+        assert response.content == cached_body
+    
+    def test_rendered_body_matches_json_response(self):
+        """Test that cached bodies are byte-identical to JSONResponse output"""
+        content = {"answer": "回答", "sources": [{"url": "https://example.com"}], "elapsed_time": 0.25}
+        assert render_json(content) == JSONResponse(content=content).body
+    
     def test_unauthorized_request(self):
         """Test that requests without auth token are rejected"""
         response = client.post(
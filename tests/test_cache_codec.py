@@ -0,0 +1,111 @@
+"""
+Test the versioned binary cache entry format
+"""
+import os
+import json
+import math
+import time
+import pytest
+
+from services.cache_codec import CacheCodec, FLAG_ZLIB, FLAG_ZSTD, HEADER, MAGIC
+from services.cache_service import CacheService, ENTRY_MARKER
+from services.file_cache_store import LAYOUT_MARKER
+
+PAYLOAD = {
+    "metadata": [{"images": json.dumps({"images": [{"url": f"https://img/{i}.jpg"} for i in range(50)]}, indent=2)}],
+    "title": "標題",
+}
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    monkeypatch.setenv("CACHE_L1_MAX_BYTES", "0")
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    return tmp_path
+
+
+class TestCacheCodec:
+    """Test encode/decode and format compatibility"""
+
+    @pytest.mark.parametrize("serializer", ["json", "orjson"])
+    def test_round_trip(self, serializer):
+        pytest.importorskip(serializer)
+        codec = CacheCodec(serializer=serializer)
+        data = codec.encode(PAYLOAD, 100.0, math.inf, 0.5)
+        assert data[:2] == MAGIC
+        assert codec.decode(data) == (PAYLOAD, 100.0, math.inf, 0.5)
+
+    def test_msgpack_round_trip(self):
+        pytest.importorskip("msgpack")
+        codec = CacheCodec(serializer="msgpack")
+        assert codec.decode(codec.encode(PAYLOAD, 1.0, 2.0, 0.0))[0] == PAYLOAD
+
+    def test_large_payloads_compressed(self):
+        codec = CacheCodec(serializer="json", compress_min_bytes=256)
+        data = codec.encode(PAYLOAD, 1.0, 2.0, 0.0)
+        flags = HEADER.unpack_from(data)[3]
+        assert flags & (FLAG_ZSTD | FLAG_ZLIB)
+        assert len(data) < len(json.dumps(PAYLOAD))
+        assert codec.decode(data)[0] == PAYLOAD
+
+    def test_small_payloads_not_compressed(self):
+        codec = CacheCodec(compress_min_bytes=1024)
+        data = codec.encode({"v": 1}, 1.0, 2.0, 0.0)
+        assert HEADER.unpack_from(data)[3] == 0
+
+    def test_reads_entries_from_other_serializer(self):
+        written = CacheCodec(serializer="json", compression="zlib", compress_min_bytes=0)
+        reader = CacheCodec(serializer="orjson", compression="none")
+        assert reader.decode(written.encode(PAYLOAD, 1.0, 2.0, 0.0))[0] == PAYLOAD
+
+    def test_bytes_stored_verbatim(self):
+        codec = CacheCodec(compress_min_bytes=64)
+        body = json.dumps(PAYLOAD).encode()
+        data = codec.encode(body, 1.0, 2.0, 0.0)
+        assert len(data) < len(body)
+        value = codec.decode(data)[0]
+        assert isinstance(value, bytes)
+        assert value == body
+
+    def test_legacy_json_not_mistaken_for_header(self):
+        assert CacheCodec().decode(json.dumps({"v": 1}).encode()) is None
+
+    def test_newer_version_rejected(self):
+        data = bytearray(CacheCodec().encode({"v": 1}, 1.0, 2.0, 0.0))
+        data[2] = 99
+        with pytest.raises(ValueError):
+            CacheCodec().decode(bytes(data))
+
+
+class TestCacheServiceFormats:
+    """Test CacheService reads old and new entry formats"""
+
+    def write_entry(self, cache_dir, key, data):
+        (cache_dir / LAYOUT_MARKER).touch()
+        path = cache_dir / f"{key}.json"
+        path.write_bytes(data)
+        os.utime(path, (time.time(), time.time() + 3600))
+
+    async def test_set_stores_binary_entry(self, cache_dir):
+        cache = CacheService()
+        await cache.set("ai_key", PAYLOAD, ttl=100)
+        assert (cache_dir / "ai_key.json").read_bytes()[:2] == MAGIC
+        assert await cache.get("ai_key") == PAYLOAD
+
+    async def test_reads_legacy_json_entries(self, cache_dir):
+        legacy = {ENTRY_MARKER: 1, "value": {"v": 1}, "stale_at": time.time() + 100,
+                  "expires_at": time.time() + 200, "delta": 0.0}
+        self.write_entry(cache_dir, "ai_marked", json.dumps(legacy).encode())
+        self.write_entry(cache_dir, "ai_plain", json.dumps({"v": 2}).encode())
+        cache = CacheService()
+        assert await cache.get("ai_marked") == {"v": 1}
+        assert await cache.get("ai_plain") == {"v": 2}
+
+    async def test_unreadable_entry_is_a_miss(self, cache_dir):
+        data = bytearray(CacheCodec().encode({"v": 1}, time.time() + 100, time.time() + 200, 0.0))
+        data[2] = 99
+        self.write_entry(cache_dir, "ai_future", bytes(data))
+        cache = CacheService()
+        assert await cache.get("ai_future") is None
+        assert cache.stats()["tiers"]["file"]["errors"] == 1
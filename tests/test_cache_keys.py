@@ -0,0 +1,128 @@
+"""
+Test cache key canonicalization and scoping
+"""
+import pytest
+from unittest.mock import AsyncMock, patch
+
+from services.cache_key_service import CacheKeyService, parse_scopes
+from services.search_service import SearchService
+from services.url_normalizer import canonicalize_url, normalize_domain
+
+
+class TestUrlNormalizer:
+    """Test URL canonicalization"""
+
+    @pytest.mark.parametrize("variant", [
+        "https://m.cnyes.com/news/id/5627491",
+        "https://www.cnyes.com/news/id/5627491",
+        "http://cnyes.com/news/id/5627491/",
+        "https://WWW.CNYES.COM:443/news/id/5627491#comments",
+        "https://www.cnyes.com/news/id/5627491?utm_source=line&utm_medium=share&fbclid=abc",
+    ])
+    def test_variants_share_canonical_url(self, variant):
+        assert canonicalize_url(variant) == "https://cnyes.com/news/id/5627491"
+
+    def test_meaningful_query_kept_and_sorted(self):
+        assert (
+            canonicalize_url("https://example.com/a?page=2&id=7&utm_campaign=x")
+            == "https://example.com/a?id=7&page=2"
+        )
+
+    def test_non_default_port_kept(self):
+        assert canonicalize_url("http://localhost:8080/a") == "https://localhost:8080/a"
+
+    def test_text_without_host_unchanged(self):
+        assert canonicalize_url("not a url") == "not a url"
+
+    def test_search_service_shares_domain_aliases(self):
+        assert normalize_domain("mobile.example.com") == "example.com"
+        assert SearchService._extract_domain(None, "https://m.cnyes.com/x") == "cnyes.com"
+
+
+class TestCacheKeyService:
+    """Test key scoping and collapse metrics"""
+
+    def test_user_excluded_by_default(self, monkeypatch):
+        monkeypatch.delenv("CACHE_KEY_SCOPES", raising=False)
+        keys = CacheKeyService()
+        a = keys.build("metadata", {"url": "https://m.cnyes.com/news/id/1"}, {"user": "alice"})
+        b = keys.build("metadata", {"url": "https://www.cnyes.com/news/id/1?utm_source=x"}, {"user": "bob"})
+        assert a == b
+        assert a.startswith("ai_metadata_")
+
+    def test_type_scopes_questions_by_default(self, monkeypatch):
+        monkeypatch.delenv("CACHE_KEY_SCOPES", raising=False)
+        keys = CacheKeyService()
+        inputs = {"url": "https://cnyes.com/news/id/1", "context": "", "lang": "zh-tw"}
+        assert (
+            keys.build("questions", inputs, {"type": "answer_page"})
+            != keys.build("questions", inputs, {"type": "widget"})
+        )
+
+    def test_configured_scope_splits_key(self, monkeypatch):
+        monkeypatch.setenv("CACHE_KEY_SCOPES", "answer=user")
+        keys = CacheKeyService()
+        inputs = {"query": "q", "url": "https://cnyes.com/news/id/1"}
+        assert keys.build("answer", inputs, {"user": "alice"}) != keys.build("answer", inputs, {"user": "bob"})
+
+    def test_parse_scopes_keeps_unlisted_defaults(self):
+        scopes = parse_scopes("answer=user, lang ; metadata=")
+        assert scopes["answer"] == ("user", "lang")
+        assert scopes["metadata"] == ()
+        assert scopes["questions"] == ("type",)
+
+    def test_collapse_metrics(self, monkeypatch):
+        monkeypatch.delenv("CACHE_KEY_SCOPES", raising=False)
+        keys = CacheKeyService()
+        for user in ("a", "b", "c"):
+            keys.build("metadata", {"url": "https://m.cnyes.com/news/id/1"}, {"user": user})
+        keys.build("metadata", {"url": "https://m.cnyes.com/news/id/1"}, {"user": "a"})
+        keys.build("metadata", {"url": "https://cnyes.com/news/id/2"}, {"user": "a"})
+
+        stats = keys.stats()
+        assert stats["requests"] == 5
+        assert stats["canonical_keys"] == 2
+        assert stats["raw_keys"] == 4
+        assert stats["collapsed_keys"] == 2
+        assert stats["top_collapsed"][0]["raw_variants"] == 3
+
+
+class TestEndpointCacheKeys:
+    """Test every input that changes a response is part of its endpoint key"""
+
+    @pytest.mark.parametrize("path, inputs, field, values", [
+        ("/generateQuestions", {"context": "Article"}, "prompt", ["Ask about revenue", "Ask about risks"]),
+        ("/generateQuestions", {"context": "Article"}, "previous_questions", [["What happened?"], ["Why?"]]),
+        ("/getMetadata", {"url": "https://example.com/news/1"}, "tag_prompt", ["People", "Companies"]),
+        ("/getAnswer", {"query": "Why?", "url": "https://example.com/news/1"}, "prompt", ["Be brief", "Be thorough"]),
+    ])
+    @patch('app.search_service.get_metadata', new_callable=AsyncMock)
+    @patch('app.gemini_service.generate_answer', new_callable=AsyncMock)
+    @patch('app.gemini_service.generate_questions', new_callable=AsyncMock)
+    @patch('app.content_service.fetch_content', new_callable=AsyncMock)
+    @patch('app.content_service.reserve_content_id_from_url', new_callable=AsyncMock)
+    @patch('app.content_service.save_content', new_callable=AsyncMock)
+    @patch('app.cache_service.get', new_callable=AsyncMock)
+    @patch('app.cache_service.set', new_callable=AsyncMock)
+    def test_prompt_fields_split_the_key(
+        self, mock_cache_set, mock_cache_get, mock_save_content, mock_reserve_id, mock_fetch,
+        mock_questions, mock_answer, mock_metadata, client, auth_headers, path, inputs, field, values
+    ):
+        mock_cache_get.return_value = None
+        mock_fetch.return_value = "Article"
+        mock_reserve_id.return_value = "content_id"
+        mock_questions.return_value = {"questions": [{"text": "Question"}]}
+        mock_answer.return_value = {"answer": "Answer"}
+        mock_metadata.return_value = {"tags": [], "images": [], "sources": []}
+
+        keys = []
+        for value in values:
+            mock_cache_set.reset_mock()
+            response = client.post(path, json={"inputs": {**inputs, field: value}}, headers=auth_headers)
+            assert response.status_code == 200
+            # The rendered response is the one write that is not a generation
+            written = [c.args[0] for c in mock_cache_set.call_args_list if "_generation_" not in c.args[0]]
+            assert len(written) == 1
+            keys.append(written[0])
+
+        assert keys[0] != keys[1]
@@ -0,0 +1,747 @@
+"""
+Test CacheService behaviour (stampede protection, tiers)
+"""
+import os
+import json
+import fcntl
+import asyncio
+import sqlite3
+import time
+import threading
+import pytest
+
+from services.cache_service import CacheService
+from services.circuit_breaker import CircuitBreaker
+from services.file_cache_store import LAYOUT_MARKER, MIGRATION_LOCK, FileCacheStore
+from services.log_cache_store import LogCacheStore, _Segment
+from services.memory_cache import TinyLFUCache
+from services.sqlite_cache_store import SQLiteCacheStore
+
+
+class FakeRedis:
+    """In-memory stand-in for the redis.asyncio client commands CacheService uses"""
+
+    def __init__(self):
+        self.data = {}
+        self.expires = {}
+
+    def _alive(self, key):
+        expires_at = self.expires.get(key)
+        if expires_at is not None and expires_at <= time.monotonic():
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return key in self.data
+
+    async def ping(self):
+        return True
+
+    async def get(self, key):
+        return self.data.get(key) if self._alive(key) else None
+
+    async def set(self, key, value, nx=False, px=None, ex=None):
+        if nx and self._alive(key):
+            return None
+        self.data[key] = value
+        if px is not None:
+            self.expires[key] = time.monotonic() + px / 1000
+        elif ex is not None:
+            self.expires[key] = time.monotonic() + ex
+        else:
+            self.expires.pop(key, None)
+        return True
+
+    async def setex(self, key, ttl, value):
+        return await self.set(key, value, ex=ttl)
+
+    async def exists(self, key):
+        return 1 if self._alive(key) else 0
+
+    async def delete(self, *keys):
+        removed = 0
+        for key in keys:
+            if self._alive(key):
+                removed += 1
+            self.data.pop(key, None)
+            self.expires.pop(key, None)
+        return removed
+
+    async def eval(self, script, numkeys, key, token):
+        # Only the lease release script is used
+        if await self.get(key) == token:
+            return await self.delete(key)
+        return 0
+
+    async def close(self):
+        pass
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    return tmp_path
+
+
+def write_cache_file(cache_dir, key, data, expires_in=3600):
+    """Write a file cache entry directly (mtime carries the expiry)"""
+    (cache_dir / LAYOUT_MARKER).touch()
+    path = cache_dir / f"{key}.json"
+    path.write_bytes(data)
+    os.utime(path, (time.time(), time.time() + expires_in))
+    return path
+
+
+def make_cache(redis_client=None):
+    cache = CacheService()
+    if redis_client is not None:
+        cache.redis_client = redis_client
+    return cache
+
+
+class TestGetOrCompute:
+    """Test get_or_compute stampede protection"""
+
+    async def test_hit_skips_compute(self, cache_dir):
+        cache = make_cache()
+        await cache.set("ai_test_key", {"cached": True})
+
+        async def compute():
+            raise AssertionError("compute should not run on a hit")
+
+        assert await cache.get_or_compute("ai_test_key", compute) == {"cached": True}
+
+    async def test_local_only_without_redis(self, cache_dir):
+        """Without Redis, concurrent misses still compute once"""
+        cache = make_cache()
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"value": 1}
+
+        results = await asyncio.gather(*[
+            cache.get_or_compute("ai_test_key", compute, ttl=60) for _ in range(5)
+        ])
+        assert calls == 1
+        assert all(r == {"value": 1} for r in results)
+        assert cache.stats()["leases"]["local_only"] == 1
+
+    async def test_lease_shared_across_instances(self, tmp_path, monkeypatch):
+        """Two instances sharing Redis compute a cold key once"""
+        monkeypatch.delenv("REDIS_URL", raising=False)
+        redis_client = FakeRedis()
+        monkeypatch.setenv("CACHE_DIR", str(tmp_path / "a"))
+        (tmp_path / "a").mkdir()
+        first = make_cache(redis_client)
+        monkeypatch.setenv("CACHE_DIR", str(tmp_path / "b"))
+        (tmp_path / "b").mkdir()
+        second = make_cache(redis_client)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.1)
+            return {"value": calls}
+
+        results = await asyncio.gather(
+            first.get_or_compute("ai_test_key", compute, ttl=60),
+            second.get_or_compute("ai_test_key", compute, ttl=60),
+        )
+        assert calls == 1
+        assert results[0] == results[1] == {"value": 1}
+        assert first.stats()["leases"]["acquired"] + second.stats()["leases"]["acquired"] == 1
+        # Lease released once the value is stored
+        assert not await redis_client.exists("lease:ai_test_key")
+
+    async def test_waiter_computes_when_holder_fails(self, cache_dir):
+        """A waiter takes over when the lease holder releases without a value"""
+        redis_client = FakeRedis()
+        cache = make_cache(redis_client)
+        await redis_client.set("lease:ai_test_key", "other-instance", nx=True, px=60000)
+
+        async def release_without_value():
+            await asyncio.sleep(0.1)
+            await redis_client.delete("lease:ai_test_key")
+
+        async def compute():
+            return {"value": "fallback"}
+
+        releaser = asyncio.ensure_future(release_without_value())
+        result = await cache.get_or_compute("ai_test_key", compute, ttl=60)
+        await releaser
+        assert result == {"value": "fallback"}
+
+
+class TestStaleWhileRevalidate:
+    """Test soft/hard TTL and background refresh"""
+
+    async def test_stale_value_served_and_refreshed_once(self, cache_dir):
+        cache = make_cache()
+        await cache.set("ai_test_key", {"version": 1}, ttl=0)
+        calls = 0
+
+        async def compute():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"version": 2}
+
+        results = await asyncio.gather(*[
+            cache.get_or_compute("ai_test_key", compute, ttl=60) for _ in range(5)
+        ])
+        # Stale value returned immediately to every caller
+        assert all(r == {"version": 1} for r in results)
+
+        await asyncio.sleep(0.1)
+        assert calls == 1
+        assert await cache.get("ai_test_key") == {"version": 2}
+        assert cache.stats()["refresh"]["refreshes"] == 1
+
+    async def test_fresh_value_not_refreshed(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_XFETCH_BETA", "0")
+        cache = make_cache()
+        await cache.set("ai_test_key", {"version": 1}, ttl=60, delta=5.0)
+
+        async def compute():
+            raise AssertionError("fresh value should not be recomputed")
+
+        assert await cache.get_or_compute("ai_test_key", compute, ttl=60) == {"version": 1}
+        await asyncio.sleep(0.01)
+        assert cache.stats()["refresh"]["refreshes"] == 0
+
+    async def test_xfetch_refreshes_expensive_entry_early(self, cache_dir, monkeypatch):
+        """An entry whose compute time dwarfs its remaining TTL refreshes early"""
+        monkeypatch.setenv("CACHE_XFETCH_BETA", "1.0")
+        cache = make_cache()
+        await cache.set("ai_test_key", {"version": 1}, ttl=1, delta=1e6)
+
+        async def compute():
+            return {"version": 2}
+
+        assert await cache.get_or_compute("ai_test_key", compute, ttl=60) == {"version": 1}
+        await asyncio.sleep(0.01)
+        assert cache.stats()["refresh"]["early_refreshes"] == 1
+        assert await cache.get("ai_test_key") == {"version": 2}
+
+    async def test_legacy_plain_entries_still_readable(self, cache_dir):
+        write_cache_file(cache_dir, "ai_legacy_key", b'{"legacy": true}')
+        cache = make_cache()
+        assert await cache.get("ai_legacy_key") == {"legacy": True}
+
+
+class TestTinyLFUCache:
+    """Test the W-TinyLFU L1 tier"""
+
+    def test_byte_budget_respected(self):
+        cache = TinyLFUCache(max_bytes=10_000)
+        for i in range(100):
+            cache.put(f"key{i}", i, size=500, expires_at=float("inf"))
+        assert cache.size_bytes <= 10_000
+
+    def test_hot_keys_survive_one_off_scan(self):
+        cache = TinyLFUCache(max_bytes=10_000)
+        hot = [f"hot{i}" for i in range(10)]
+        for key in hot:
+            cache.put(key, key, size=500, expires_at=float("inf"))
+        for _ in range(5):
+            for key in hot:
+                cache.get(key, now=0)
+
+        # A scan of one-off keys must not flush the hot set
+        for i in range(500):
+            cache.put(f"scan{i}", i, size=500, expires_at=float("inf"))
+
+        survivors = sum(1 for key in hot if cache.get(key, now=0) is not None)
+        assert survivors >= 8
+        assert cache.stats()["rejections"] > 0
+
+    def test_large_candidate_that_loses_evicts_nothing(self):
+        cache = TinyLFUCache(max_bytes=10_000)
+        inf = float("inf")
+        # Main space (9900 bytes) full: two cold probation entries, seven hot protected ones
+        for key in ("cold1", "cold2"):
+            cache.put(key, key, size=1100, expires_at=inf)
+        hot = [f"hot{i}" for i in range(7)]
+        for key in hot:
+            cache.put(key, key, size=1100, expires_at=inf)
+            for _ in range(5):
+                cache.get(key, now=0)
+        assert list(cache.probation) == ["cold1", "cold2"]
+
+        # Seen twice: beats the cold entries, but making room for it
+        # would also take a hot one
+        cache.put("big", "big", size=3000, expires_at=inf)
+        cache.put("big", "big", size=3000, expires_at=inf)
+        assert cache.sketch.frequency("big") > cache.sketch.frequency("cold1")
+
+        assert "big" not in cache.probation
+        assert list(cache.probation) == ["cold1", "cold2"]
+        assert cache.stats()["evictions"] == 0
+        assert cache.size_bytes == 9900
+
+    def test_entry_ttl(self):
+        cache = TinyLFUCache(max_bytes=10_000)
+        cache.put("key", "value", size=10, expires_at=100.0)
+        assert cache.get("key", now=99.0) == "value"
+        assert cache.get("key", now=100.0) is None
+        assert cache.stats()["expirations"] == 1
+
+    def test_oversized_entry_rejected(self):
+        cache = TinyLFUCache(max_bytes=1_000)
+        assert not cache.put("big", "x", size=5_000, expires_at=float("inf"))
+
+
+class TestL1Tier:
+    """Test L1 integration in CacheService"""
+
+    async def test_l1_hit_returns_decoded_object_without_file_read(self, cache_dir):
+        cache = make_cache()
+        value = {"answer": "cached"}
+        await cache.set("ai_test_key", value, ttl=60)
+        # Remove the file tier copy: hit must come from L1
+        (cache_dir / "ai_test_key.json").unlink()
+
+        assert await cache.get("ai_test_key") is value
+        tiers = cache.stats()["tiers"]
+        assert tiers["l1"]["hits"] == 1
+        assert tiers["file"]["hits"] == 0
+
+    async def test_lower_tier_hit_populates_l1(self, cache_dir):
+        write_cache_file(cache_dir, "ai_legacy_key", b'{"legacy": true}')
+        cache = make_cache()
+        await cache.get("ai_legacy_key")
+        await cache.get("ai_legacy_key")
+        tiers = cache.stats()["tiers"]
+        assert tiers["file"]["hits"] == 1
+        assert tiers["l1"]["hits"] == 1
+
+    async def test_l1_respects_soft_ttl(self, cache_dir):
+        cache = make_cache()
+        await cache.set("ai_test_key", {"v": 1}, ttl=0)
+        await cache.get("ai_test_key")
+        assert cache.stats()["tiers"]["l1"]["hits"] == 0
+
+    async def test_delete_clears_l1(self, cache_dir):
+        cache = make_cache()
+        await cache.set("ai_test_key", {"v": 1}, ttl=60)
+        await cache.delete("ai_test_key")
+        assert await cache.get("ai_test_key") is None
+
+    async def test_l1_disabled(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_L1_MAX_BYTES", "0")
+        cache = make_cache()
+        assert cache.l1 is None
+        await cache.set("ai_test_key", {"v": 1}, ttl=60)
+        assert await cache.get("ai_test_key") == {"v": 1}
+
+
+class TestFileTier:
+    """Test file tier TTL and sweeper"""
+
+    async def test_expired_file_entry_ignored_and_removed(self, cache_dir):
+        path = write_cache_file(cache_dir, "ai_old_key", b'{"v": 1}', expires_in=-1)
+        cache = make_cache()
+        assert await cache.get("ai_old_key") is None
+        assert not path.exists()
+
+    async def test_set_writes_hard_expiry_to_mtime(self, cache_dir):
+        cache = make_cache()
+        await cache.set("ai_test_key", {"v": 1}, ttl=100)
+        mtime = (cache_dir / "ai_test_key.json").stat().st_mtime
+        expected = time.time() + 100 * cache.stale_ttl_factor
+        assert abs(mtime - expected) < 5
+
+    async def test_sweep_removes_expired_and_enforces_budget(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_DIR_MAX_BYTES", "1000")
+        cache = make_cache()
+        write_cache_file(cache_dir, "ai_expired", b"x" * 100, expires_in=-1)
+        for i in range(5):
+            path = write_cache_file(cache_dir, f"ai_live_{i}", b"x" * 300)
+            # Older access time for lower i => evicted first
+            os.utime(path, (time.time() - 100 + i, path.stat().st_mtime))
+
+        result = await cache.store.sweep()
+
+        # 1500 live bytes evicted LRU-first down to 90% of the budget
+        assert result == {"expired": 1, "evicted": 2}
+        remaining = sorted(p.name for p in cache_dir.glob("*.json"))
+        assert remaining == ["ai_live_2.json", "ai_live_3.json", "ai_live_4.json"]
+        assert cache.store.stats()["bytes"] <= 1000
+
+    async def test_entries_from_earlier_releases_keep_their_expiry(self, cache_dir):
+        # Written before expiries moved to mtime: mtime is the write time
+        (cache_dir / "ai_plain.json").write_bytes(b'{"legacy": true}')
+        live = {"__cache_entry__": 1, "value": {"v": 1}, "stale_at": time.time() + 50,
+                "expires_at": time.time() + 100, "delta": 0.0}
+        (cache_dir / "ai_live.json").write_text(json.dumps(live))
+        (cache_dir / "ai_expired.json").write_text(json.dumps({**live, "expires_at": time.time() - 1}))
+
+        cache = make_cache()
+        # Nothing is touched until the sweeper task migrates the directory
+        assert await cache.get("ai_live") is None
+        assert await cache.store.sweep() == {"expired": 0, "evicted": 0}
+        assert len(list(cache_dir.glob("*.json"))) == 3
+
+        cache.start_sweeper()
+        await asyncio.sleep(0.05)
+        await cache.stop_sweeper()
+
+        assert await cache.get("ai_live") == {"v": 1}
+        assert abs((cache_dir / "ai_live.json").stat().st_mtime - live["expires_at"]) < 1
+        # Plain entries have no expiry and no longer match any key
+        assert not (cache_dir / "ai_plain.json").exists()
+        assert not (cache_dir / "ai_expired.json").exists()
+        assert (cache_dir / LAYOUT_MARKER).exists()
+
+    async def test_migration_runs_in_one_process(self, cache_dir):
+        live = {"__cache_entry__": 1, "value": {"v": 1}, "expires_at": time.time() + 100}
+        (cache_dir / "ai_live.json").write_text(json.dumps(live))
+        cache = make_cache()
+
+        # flock locks are per open file, so this stands in for another worker
+        fd = os.open(cache_dir / MIGRATION_LOCK, os.O_RDWR | os.O_CREAT)
+        fcntl.flock(fd, fcntl.LOCK_EX)
+        try:
+            assert await cache.store.migrate_legacy(lambda raw: cache._decode_entry(raw).expires_at) == 0
+            assert not cache.store.migrated
+        finally:
+            os.close(fd)
+
+        assert await cache.store.migrate_legacy(lambda raw: cache._decode_entry(raw).expires_at) == 1
+        assert cache.store.migrated
+
+    async def test_sweeper_task_lifecycle(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_SWEEP_INTERVAL", "0.01")
+        cache = make_cache()
+        write_cache_file(cache_dir, "ai_expired", b"x", expires_in=-1)
+        cache.start_sweeper()
+        await asyncio.sleep(0.05)
+        await cache.stop_sweeper()
+        assert not (cache_dir / "ai_expired.json").exists()
+
+
+class TestLogTier:
+    """Test the log-structured disk tier"""
+
+    @pytest.fixture
+    def log_backend(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_BACKEND", "log")
+        return cache_dir / "log"
+
+    async def test_round_trip_through_cache_service(self, log_backend, monkeypatch):
+        monkeypatch.setenv("CACHE_L1_MAX_BYTES", "0")
+        cache = make_cache()
+        assert isinstance(cache.store, LogCacheStore)
+        await cache.set("ai_test_key", {"v": 1}, ttl=100)
+        assert await cache.get("ai_test_key") == {"v": 1}
+        await cache.delete("ai_test_key")
+        assert await cache.get("ai_test_key") is None
+        await cache.close()
+
+    async def test_overwrite_expiry_and_recovery(self, log_backend):
+        store = LogCacheStore(log_backend, max_bytes=0)
+        await store.set("a", b"first", expires_at=time.time() + 100)
+        await store.set("a", b"second", expires_at=time.time() + 100)
+        await store.set("b", b"gone", expires_at=time.time() + 100)
+        await store.delete("b")
+        await store.set("c", b"old", expires_at=time.time() - 1)
+        assert await store.get("a") == b"second"
+        assert await store.get("c") is None
+        await store.close()
+
+        reopened = LogCacheStore(log_backend, max_bytes=0)
+        assert await reopened.get("a") == b"second"
+        assert await reopened.get("b") is None
+        assert reopened.stats()["entries"] == 1
+        await reopened.close()
+
+    async def test_recovery_truncates_torn_tail(self, log_backend):
+        store = LogCacheStore(log_backend, max_bytes=0)
+        await store.set("a", b"kept", expires_at=time.time() + 100)
+        await store.set("b", b"torn" * 10, expires_at=time.time() + 100)
+        await store.close()
+
+        segment = sorted(log_backend.glob("segment-*.log"))[-1]
+        size = segment.stat().st_size
+        os.truncate(segment, size - 5)
+
+        reopened = LogCacheStore(log_backend, max_bytes=0)
+        assert await reopened.get("a") == b"kept"
+        assert await reopened.get("b") is None
+        await reopened.set("c", b"new", expires_at=time.time() + 100)
+        assert await reopened.get("c") == b"new"
+        await reopened.close()
+
+    async def test_compaction_keeps_live_entries(self, log_backend, monkeypatch):
+        monkeypatch.setenv("CACHE_LOG_SEGMENT_BYTES", "256")
+        store = LogCacheStore(log_backend, max_bytes=0)
+        for i in range(10):
+            await store.set("hot", f"v{i}".encode() * 10, expires_at=time.time() + 100)
+        await store.set("cold", b"c" * 20, expires_at=time.time() + 100)
+        segments_before = store.stats()["segments"]
+
+        result = await store.sweep()
+
+        assert result["compacted"] > 0
+        assert store.stats()["segments"] < segments_before
+        assert await store.get("hot") == b"v9" * 10
+        assert await store.get("cold") == b"c" * 20
+        await store.close()
+
+        reopened = LogCacheStore(log_backend, max_bytes=0)
+        assert await reopened.get("hot") == b"v9" * 10
+        await reopened.close()
+
+    async def test_sweep_evicts_oldest_segments_over_budget(self, log_backend, monkeypatch):
+        monkeypatch.setenv("CACHE_LOG_SEGMENT_BYTES", "256")
+        store = LogCacheStore(log_backend, max_bytes=600)
+        for i in range(10):
+            await store.set(f"k{i}", b"x" * 100, expires_at=time.time() + 100)
+
+        result = await store.sweep()
+
+        assert result["evicted"] > 0
+        assert store.stats()["bytes"] <= 600
+        assert await store.get("k0") is None
+        assert await store.get("k9") == b"x" * 100
+        await store.close()
+
+    async def test_sweep_reads_segments_without_the_lock(self, log_backend, monkeypatch):
+        monkeypatch.setenv("CACHE_LOG_SEGMENT_BYTES", "256")
+        store = LogCacheStore(log_backend, max_bytes=600)
+        for i in range(10):
+            await store.set(f"k{i}", b"x" * 100, expires_at=time.time() + 100)
+
+        # While the sweep walks a segment, another thread (a reader) must get the lock
+        acquired = []
+        records = _Segment.records
+
+        def probing_records(segment):
+            def probe():
+                if store._lock.acquire(timeout=1):
+                    store._lock.release()
+                    acquired.append(True)
+                else:
+                    acquired.append(False)
+            reader = threading.Thread(target=probe)
+            reader.start()
+            reader.join()
+            yield from records(segment)
+
+        monkeypatch.setattr(_Segment, "records", probing_records)
+        result = await store.sweep()
+
+        assert result["evicted"] > 0
+        assert acquired and all(acquired)
+        assert await store.get("k9") == b"x" * 100
+        await store.close()
+
+    async def test_second_process_cannot_open_a_live_directory(self, log_backend):
+        store = LogCacheStore(log_backend, max_bytes=0)
+        await store.set("a", b"live", expires_at=time.time() + 100)
+
+        # flock locks are per open file, so a second open stands in for another worker
+        with pytest.raises(RuntimeError):
+            LogCacheStore(log_backend, max_bytes=0)
+        fallback = make_cache()
+        assert isinstance(fallback.store, FileCacheStore)
+        assert fallback.stats()["tiers"]["file"]["backend"] == "file"
+
+        assert await store.get("a") == b"live"
+        await store.close()
+        reopened = LogCacheStore(log_backend, max_bytes=0)
+        assert await reopened.get("a") == b"live"
+        await reopened.close()
+
+
+class TestSQLiteTier:
+    """Test the SQLite (WAL) disk tier"""
+
+    @pytest.fixture
+    def sqlite_backend(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_BACKEND", "sqlite")
+        return cache_dir / "cache.sqlite3"
+
+    async def test_round_trip_through_cache_service(self, sqlite_backend, monkeypatch):
+        monkeypatch.setenv("CACHE_L1_MAX_BYTES", "0")
+        cache = make_cache()
+        assert isinstance(cache.store, SQLiteCacheStore)
+        await cache.set("ai_test_key", {"v": 1}, ttl=100)
+        assert await cache.get("ai_test_key") == {"v": 1}
+        await cache.delete("ai_test_key")
+        assert await cache.get("ai_test_key") is None
+        await cache.close()
+
+        conn = sqlite3.connect(sqlite_backend)
+        assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "wal"
+        conn.close()
+
+    async def test_concurrent_writes_share_a_transaction(self, sqlite_backend):
+        store = SQLiteCacheStore(sqlite_backend, max_bytes=0)
+        expires_at = time.time() + 100
+        await asyncio.gather(*[store.set(f"k{i}", b"v%d" % i, expires_at) for i in range(50)])
+        assert store.stats()["batched_writes"] == 50
+        assert store.stats()["write_batches"] < 50
+        assert await store.get("k42") == b"v42"
+        await store.close()
+
+    async def test_shared_between_instances(self, sqlite_backend):
+        writer = SQLiteCacheStore(sqlite_backend, max_bytes=0)
+        reader = SQLiteCacheStore(sqlite_backend, max_bytes=0)
+        await writer.set("k", b"shared", time.time() + 100)
+        assert await reader.get("k") == b"shared"
+        await writer.close()
+        await reader.close()
+
+    async def test_sweep_expires_and_enforces_budget(self, sqlite_backend):
+        store = SQLiteCacheStore(sqlite_backend, max_bytes=1000)
+        now = time.time()
+        await store.set("expired", b"x" * 100, now - 1)
+        assert await store.get("expired") is None
+        for i in range(5):
+            await store.set(f"live_{i}", b"x" * 300, now + 100 + i)
+
+        result = await store.sweep()
+
+        # Soonest-expiring entries evicted first, down to 90% of the budget
+        assert result == {"expired": 1, "evicted": 2}
+        assert await store.get("live_1") is None
+        assert await store.get("live_2") == b"x" * 300
+        assert store.stats()["bytes"] <= 1000
+        await store.close()
+
+
+class FlakyRedis(FakeRedis):
+    """FakeRedis that raises ConnectionError while down and counts calls"""
+
+    def __init__(self):
+        super().__init__()
+        self.down = False
+        self.calls = 0
+
+    def _check(self):
+        self.calls += 1
+        if self.down:
+            raise ConnectionError("Redis unavailable")
+
+    async def ping(self):
+        self._check()
+        return True
+
+    async def get(self, key):
+        self._check()
+        return await super().get(key)
+
+    async def setex(self, key, ttl, value):
+        self._check()
+        return await super().setex(key, ttl, value)
+
+
+class TestRedisCircuitBreaker:
+    """Test Redis reconnection instead of permanent disable"""
+
+    @pytest.fixture
+    def fast_breaker(self, cache_dir, monkeypatch):
+        monkeypatch.setenv("CACHE_L1_MAX_BYTES", "0")
+        monkeypatch.setenv("REDIS_BREAKER_FAILURES", "2")
+        monkeypatch.setenv("REDIS_BREAKER_BACKOFF_MS", "20")
+        monkeypatch.setenv("REDIS_BREAKER_MAX_BACKOFF_MS", "1000")
+
+    async def test_opens_after_failures_and_recovers(self, fast_breaker):
+        redis_client = FlakyRedis()
+        cache = make_cache(redis_client)
+        await cache.set("ai_key", {"v": 1}, ttl=100)
+        assert cache.redis_enabled
+
+        redis_client.down = True
+        for _ in range(2):
+            await cache.get("ai_key")
+        assert not cache.redis_enabled
+        assert cache.stats()["redis_circuit"]["state"] == "open"
+
+        # While open, Redis is skipped entirely
+        calls = redis_client.calls
+        await cache.get("ai_key")
+        assert redis_client.calls == calls
+
+        redis_client.down = False
+        await asyncio.sleep(0.03)
+        assert await cache.get("ai_key") == {"v": 1}
+        assert cache.redis_enabled
+        stats = cache.stats()["redis_circuit"]
+        assert stats["state"] == "closed"
+        assert stats["opened"] == 1
+        assert stats["degraded_seconds"] > 0
+
+    async def test_failed_probe_backs_off_exponentially(self, fast_breaker):
+        redis_client = FlakyRedis()
+        redis_client.down = True
+        cache = make_cache(redis_client)
+        # Initial ping failure opens the circuit without waiting for more errors
+        assert await cache.get("ai_key") is None
+        assert cache.stats()["redis_circuit"]["state"] == "open"
+
+        await asyncio.sleep(0.03)
+        await cache.get("ai_key")
+        stats = cache.stats()["redis_circuit"]
+        assert stats["failed_probes"] == 1
+        assert stats["backoff_s"] == pytest.approx(0.04)
+
+    async def test_half_open_allows_single_probe(self):
+        breaker = CircuitBreaker("test", failure_threshold=1, base_backoff=0.0)
+        breaker.record_failure()
+        assert breaker.state == "open"
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        breaker.record_success()
+        assert breaker.is_closed
+        assert breaker.allow_request()
+
+    async def test_cancelled_probe_frees_the_slot(self, fast_breaker):
+        redis_client = FlakyRedis()
+        cache = make_cache(redis_client)
+        await cache.set("ai_key", {"v": 1}, ttl=100)
+        redis_client.down = True
+        for _ in range(2):
+            await cache.get("ai_key")
+        assert cache.stats()["redis_circuit"]["state"] == "open"
+        await asyncio.sleep(0.03)
+
+        # The probe hangs and its caller is cancelled (client disconnect)
+        hang = asyncio.Event()
+        original_get = redis_client.get
+
+        async def hanging_get(key):
+            await hang.wait()
+
+        redis_client.get = hanging_get
+        probe = asyncio.ensure_future(cache.get("ai_key"))
+        await asyncio.sleep(0.01)
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+
+        stats = cache.stats()["redis_circuit"]
+        assert stats["state"] == "half_open"
+        assert stats["abandoned_probes"] == 1
+        assert stats["failed_probes"] == 0
+
+        # The next call probes again and closes the breaker
+        redis_client.get = original_get
+        redis_client.down = False
+        assert await cache.get("ai_key") == {"v": 1}
+        assert cache.redis_enabled
+
+    def test_probe_without_outcome_expires(self, monkeypatch):
+        clock = [100.0]
+        monkeypatch.setattr("services.circuit_breaker.time.monotonic", lambda: clock[0])
+        breaker = CircuitBreaker("test", failure_threshold=1, base_backoff=0.0, probe_timeout=5.0)
+        breaker.record_failure()
+        assert breaker.allow_request()
+        assert not breaker.allow_request()
+        clock[0] += 5.0
+        assert breaker.allow_request()
+        assert breaker.stats()["abandoned_probes"] == 1
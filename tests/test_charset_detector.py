@@ -0,0 +1,87 @@
+"""
+Test charset resolution for fetched pages
+"""
+import codecs
+
+import httpx
+import pytest
+
+from services import charset_detector
+from services.charset_detector import SNIFF_BYTES, detect_charset, normalize_charset
+from services.document_service import DocumentService
+
+TITLE = "台積電第三季營收創新高"
+
+
+def big5_page(meta=""):
+    return f"<html><head>{meta}<title>{TITLE}</title></head><body><article>{TITLE}</article></body></html>".encode("big5")
+
+
+class TestDetectCharset:
+    """Test the header, BOM, meta and fallback order"""
+
+    @pytest.fixture(autouse=True)
+    def no_full_detection(self, monkeypatch):
+        """Fail if charset_normalizer is used before the cheap sources"""
+        def fail(*args, **kwargs):
+            raise AssertionError("full detection should not run")
+        if charset_detector.charset_normalizer is not None:
+            monkeypatch.setattr(charset_detector.charset_normalizer, "from_bytes", fail)
+
+    def test_header_charset_wins(self):
+        assert detect_charset("text/html; charset=Big5", big5_page('<meta charset="utf-8">')) == ("big5hkscs", "header")
+
+    def test_bom(self):
+        assert detect_charset("text/html", codecs.BOM_UTF8 + b"<html>") == ("utf-8-sig", "bom")
+
+    @pytest.mark.parametrize("meta", [
+        '<meta charset="big5">',
+        "<META HTTP-EQUIV='Content-Type' CONTENT='text/html; charset=big5'>",
+    ])
+    def test_meta_charset(self, meta):
+        assert detect_charset("text/html", big5_page(meta)) == ("big5hkscs", "meta")
+
+    def test_meta_outside_window_ignored(self):
+        head = b"<html><head><script>" + b" " * SNIFF_BYTES + b'</script><meta charset="big5">'
+        assert detect_charset(None, head) == ("utf-8", "utf-8")
+
+    def test_utf8_cut_at_window_edge(self):
+        head = ("中" * 2000).encode("utf-8")[:SNIFF_BYTES]
+        assert detect_charset(None, head) == ("utf-8", "utf-8")
+
+    def test_unknown_labels(self):
+        assert normalize_charset("no-such-charset") is None
+        assert detect_charset("text/html; charset=bogus", b"<html>") == ("utf-8", "utf-8")
+
+
+@pytest.mark.skipif(charset_detector.charset_normalizer is None, reason="charset_normalizer not installed")
+def test_undeclared_big5_detected():
+    body = big5_page() * 20
+    encoding, source = detect_charset("text/html", body)
+    assert source == "detected"
+    assert TITLE in body.decode(encoding)
+
+
+class TestDocumentCharset:
+    """Test charset resolution on the fetch path"""
+
+    def make_client(self, body, content_type="text/html"):
+        async def handler(request):
+            return httpx.Response(200, content=body, headers={"content-type": content_type})
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    @pytest.mark.parametrize("backend", ["bs4", "stream"])
+    async def test_meta_declared_big5_page(self, monkeypatch, backend):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", backend)
+        documents = DocumentService(client=self.make_client(big5_page('<meta charset="big5">')))
+        document = await documents.get_document("https://news.example.tw/a")
+        assert document["title"] == TITLE
+        stats = documents.stats()["charset"]["news.example.tw"]
+        assert stats["sources"] == {"meta": 1}
+        assert stats["pages"] == 1
+        await documents.close()
+
+    async def test_bom_not_left_in_text(self):
+        documents = DocumentService(client=self.make_client(codecs.BOM_UTF8 + f"<title>{TITLE}</title>".encode()))
+        assert (await documents.get_document("https://example.com/a"))["title"] == TITLE
+        await documents.close()
@@ -0,0 +1,188 @@
+"""
+Test the bounded, content-addressed content store and re-fetch of evicted content
+"""
+import time
+
+import httpx
+import pytest
+
+from services.cache_codec import CacheCodec
+from services.content_service import ContentService
+from services.content_store import (
+    ACCESS_RESOLUTION,
+    MemoryContentStore,
+    SQLiteContentStore,
+    content_hash,
+    create_content_store,
+    normalize_content,
+)
+from services.document_service import DocumentService
+
+ARTICLE = "台積電今日公布營收，較去年同期成長三成。" * 200
+
+PAGE = "<html><head><title>Article</title></head><body><article><p>{text}</p></article></body></html>"
+
+
+def make_documents(requests):
+    async def handler(request):
+        requests.append(str(request.url))
+        return httpx.Response(200, text=PAGE.format(text=request.url.path))
+    return DocumentService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+
+
+class TestContentHash:
+    """Test normalization of article text for content addressing"""
+
+    def test_whitespace_width_and_invisible_characters_ignored(self):
+        assert normalize_content("  台積電\u200b營收\n\n成長　三成 ") == "台積電營收 成長 三成"
+        assert content_hash("ＡＢＣ 123\r\n") == content_hash("ABC   123")
+
+    def test_different_text_different_hash(self):
+        assert content_hash("台積電營收成長") != content_hash("台積電營收衰退")
+
+
+class TestMemoryContentStore:
+    """Test the per-process LRU"""
+
+    async def test_evicts_least_recently_read_by_bytes(self):
+        store = MemoryContentStore(max_bytes=250, index_max_entries=10)
+        for name in ("a", "b"):
+            await store.set(name, b"x" * 100)
+            await store.set_ref(f"id-{name}", name, f"https://example.com/{name}")
+        await store.get("a")
+        await store.set("c", b"x" * 100)
+        assert await store.get("b") is None
+        assert await store.get("a") is not None
+        assert store.stats() == {**store.stats(), "entries": 2, "bytes": 200, "evicted": 1}
+        # The index outlives the body
+        assert await store.get_ref("id-b") == ("b", "https://example.com/b")
+
+    async def test_index_bounded(self):
+        store = MemoryContentStore(max_bytes=1000, index_max_entries=2)
+        for name in ("a", "b", "c"):
+            await store.set_ref(name, "hash", f"https://example.com/{name}")
+        assert await store.get_ref("a") is None
+        assert await store.get_ref("c") == ("hash", "https://example.com/c")
+
+    async def test_ref_keeps_earlier_url(self):
+        store = MemoryContentStore(max_bytes=1000, index_max_entries=10)
+        await store.set_ref("a", "old", "https://example.com/a")
+        await store.set_ref("a", "new")
+        assert await store.get_ref("a") == ("new", "https://example.com/a")
+
+
+class TestSQLiteContentStore:
+    """Test the store shared by workers on one host"""
+
+    async def test_shared_across_instances(self, tmp_path):
+        path = tmp_path / "content.sqlite3"
+        first = SQLiteContentStore(path, max_bytes=1000, index_max_entries=10)
+        await first.set("h", b"body")
+        await first.set_ref("a", "h", "https://example.com/a")
+        second = SQLiteContentStore(path, max_bytes=1000, index_max_entries=10)
+        assert await second.get("h") == b"body"
+        assert await second.touch("h")
+        assert not await second.touch("missing")
+        assert await second.get_ref("a") == ("h", "https://example.com/a")
+        await second.set_ref("a", "h2")
+        assert await first.get_ref("a") == ("h2", "https://example.com/a")
+        await first.close()
+        await second.close()
+
+    async def test_reads_record_access_at_most_once_per_resolution(self, tmp_path, monkeypatch):
+        store = SQLiteContentStore(tmp_path / "content.sqlite3", max_bytes=1000, index_max_entries=10)
+        await store.set("h", b"body")
+        conn = store._connect()
+
+        def accessed_at():
+            return conn.execute("SELECT accessed_at FROM content_blobs WHERE content_hash = 'h'").fetchone()[0]
+
+        written = accessed_at()
+        for _ in range(5):
+            assert await store.get("h") == b"body"
+        assert accessed_at() == written
+
+        now = time.time() + ACCESS_RESOLUTION + 1
+        monkeypatch.setattr(time, "time", lambda: now)
+        assert await store.get("h") == b"body"
+        assert accessed_at() == now
+        await store.close()
+
+    async def test_evicts_by_bytes(self, tmp_path):
+        store = SQLiteContentStore(tmp_path / "content.sqlite3", max_bytes=250, index_max_entries=2)
+        for name in ("a", "b", "c"):
+            await store.set(name, b"x" * 100)
+            await store.set_ref(f"id-{name}", name, f"https://example.com/{name}")
+        assert await store.get("a") is None
+        assert await store.get("c") is not None
+        assert store.stats()["bytes"] <= 225
+        assert await store.get_ref("id-a") is None
+        await store.close()
+
+
+class TestContentService:
+    """Test compressed, deduplicated storage and recovery of evicted bodies"""
+
+    async def test_bodies_stored_compressed(self):
+        store = MemoryContentStore(max_bytes=1 << 20, index_max_entries=10)
+        service = ContentService(document_service=make_documents([]), store=store)
+        digest = await service.save_content("id", ARTICLE, "https://example.com/a")
+        assert digest == content_hash(ARTICLE)
+        assert store.total_bytes < len(ARTICLE.encode()) / 4
+        assert CacheCodec().decode(store.bodies[digest])[0] == ARTICLE
+        assert await service.get_content("id") == ARTICLE
+        assert service.stats()["hits"] == 1
+        await service.close()
+
+    async def test_duplicate_articles_share_one_body(self):
+        store = MemoryContentStore(max_bytes=1 << 20, index_max_entries=10)
+        service = ContentService(document_service=make_documents([]), store=store)
+        first = await service.save_content("url-id", ARTICLE, "https://example.com/a")
+        second = await service.save_content("context-id", f"  {ARTICLE}\n", None)
+        assert first == second
+        assert len(store.bodies) == 1
+        assert await service.get_content("context-id") == ARTICLE
+        assert service.stats()["deduplicated"] == 1
+        await service.close()
+
+    async def test_evicted_body_refetched_from_source(self):
+        requests = []
+        store = MemoryContentStore(max_bytes=100, index_max_entries=10)
+        service = ContentService(document_service=make_documents(requests), store=store)
+        await service.save_content("a", "/a", "https://example.com/a")
+        await service.save_content("b", "x" * 1000, "https://example.com/b")
+        assert content_hash("/a") in store.bodies
+
+        store.bodies.clear()
+        assert await service.get_content("a") == "/a"
+        assert requests == ["https://example.com/a"]
+        # Stored again: the next read is a hit
+        assert await service.get_content("a") == "/a"
+        assert len(requests) == 1
+        stats = service.stats()
+        assert stats["backend"] == "memory"
+        assert stats == {**stats, "hits": 1, "misses": 1, "refetches": 1, "refetch_failures": 0}
+        await service.close()
+
+    async def test_unknown_content_id(self):
+        service = ContentService(document_service=make_documents([]), store=MemoryContentStore(100, 10))
+        assert await service.get_content("missing") == ""
+        assert service.stats()["refetches"] == 0
+        await service.close()
+
+
+class TestCreateContentStore:
+    """Test backend selection"""
+
+    def test_sqlite_backend(self, monkeypatch, tmp_path):
+        monkeypatch.setenv("CONTENT_STORE_BACKEND", "sqlite")
+        monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+        store = create_content_store()
+        assert store.name == "sqlite"
+        assert store.path == tmp_path / "content.sqlite3"
+
+    @pytest.mark.parametrize("backend", ["bogus", "redis"])
+    def test_falls_back_to_memory(self, monkeypatch, backend):
+        monkeypatch.setenv("CONTENT_STORE_BACKEND", backend)
+        monkeypatch.delenv("REDIS_URL", raising=False)
+        assert create_content_store().name == "memory"
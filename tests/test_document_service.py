@@ -0,0 +1,291 @@
+"""
+Test the shared fetch-and-parse document layer
+"""
+import asyncio
+import httpx
+import pytest
+
+from services.content_service import ContentService
+from services.document_service import DocumentService, freshness_lifetime
+from services.executor_service import executor_stats, shutdown_executors
+from services.search_service import SearchService
+
+ARTICLE_HTML = """
+<html>
+<head>
+    <title> Test Article </title>
+    <meta property="og:description" content="Article summary">
+    <meta property="og:image" content="/images/cover.jpg">
+    <meta name="twitter:image" content="https://cdn.example.com/card.jpg">
+    <script>var tracking = 1;</script>
+</head>
+<body>
+    <nav>Home News</nav>
+    <article>
+        <p>First paragraph.</p>
+        <img src="//cdn.example.com/photo.jpg" width="640" height="480">
+        <img data-src="/lazy.jpg">
+        <img src="/static/logo.png">
+    </article>
+    <footer>Copyright</footer>
+</body>
+</html>
+"""
+
+
+def make_client(requests, html=ARTICLE_HTML, status_code=200, delay=0.0):
+    async def handler(request):
+        requests.append(str(request.url))
+        if delay:
+            await asyncio.sleep(delay)
+        return httpx.Response(status_code, text=html)
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+class TestDocumentService:
+    """Test parsing, caching and in-flight dedupe"""
+
+    def test_parse_extracts_all_fields_from_one_dom(self):
+        document = DocumentService.parse_html(ARTICLE_HTML, "https://example.com/news/1")
+        assert document["title"] == "Test Article"
+        assert document["summary"] == "Article summary"
+        assert document["main_text"] == "First paragraph."
+        assert "Home News" in document["text"]
+        assert "tracking" not in document["text"]
+        assert [(image["type"], image["url"]) for image in document["images"]] == [
+            ("og:image", "https://example.com/images/cover.jpg"),
+            ("twitter:image", "https://cdn.example.com/card.jpg"),
+            ("img_tag", "https://cdn.example.com/photo.jpg"),
+            ("img_tag", "https://example.com/lazy.jpg"),
+        ]
+        assert document["images"][2]["width"] == 640
+
+    async def test_content_and_search_share_one_fetch(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests))
+        content_service = ContentService(document_service=documents)
+        search_service = SearchService(document_service=documents)
+
+        text = await content_service.fetch_content("https://m.example.com/news/1?utm_source=x")
+        metadata = await search_service.get_metadata("https://www.example.com/news/1")
+
+        assert text == "First paragraph."
+        assert metadata["title"] == "Test Article"
+        assert len(requests) == 1
+        assert documents.stats()["hits"] == 1
+        await search_service.close()
+        await documents.close()
+
+    async def test_concurrent_requests_share_download(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, delay=0.02))
+        results = await asyncio.gather(*[documents.get_document("https://example.com/a") for _ in range(10)])
+        assert len(requests) == 1
+        assert all(result is results[0] for result in results)
+        await documents.close()
+
+    async def test_failed_fetch_not_cached(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, status_code=503))
+        assert (await documents.get_document("https://example.com/a"))["main_text"] == ""
+        await documents.get_document("https://example.com/a")
+        assert len(requests) == 2
+        assert documents.stats()["errors"] == 2
+        await documents.close()
+
+    async def test_expired_document_refetched(self, monkeypatch):
+        monkeypatch.setenv("DOCUMENT_CACHE_TTL", "0.01")
+        requests = []
+        documents = DocumentService(client=make_client(requests))
+        await documents.get_document("https://example.com/a")
+        await asyncio.sleep(0.02)
+        await documents.get_document("https://example.com/a")
+        assert len(requests) == 2
+        await documents.close()
+
+
+class TestConditionalRevalidation:
+    """Test ETag/Last-Modified revalidation of fetched pages"""
+
+    def make_origin(self, requests, headers, changed=lambda: False):
+        async def handler(request):
+            requests.append(dict(request.headers))
+            etag = headers.get("etag")
+            if not changed() and etag and request.headers.get("if-none-match") == etag:
+                return httpx.Response(304, headers={k: v for k, v in headers.items() if k != "content-length"})
+            last_modified = headers.get("last-modified")
+            if not changed() and last_modified and request.headers.get("if-modified-since") == last_modified:
+                return httpx.Response(304)
+            return httpx.Response(200, text=ARTICLE_HTML, headers=headers)
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    async def test_not_modified_reuses_parsed_document(self):
+        requests = []
+        documents = DocumentService(client=self.make_origin(
+            requests, {"etag": '"v1"', "cache-control": "max-age=0"}
+        ))
+
+        first = await documents.get_document("https://example.com/a")
+        second = await documents.get_document("https://example.com/a")
+
+        assert second is first
+        assert len(requests) == 2
+        assert requests[1]["if-none-match"] == '"v1"'
+        assert documents.stats()["parses"] == 1
+        stats = documents.stats()["revalidation"]["example.com"]
+        assert stats["not_modified"] == 1
+        assert stats["not_modified_rate"] == 1.0
+        assert stats["bytes_saved"] == len(ARTICLE_HTML.encode())
+        await documents.close()
+
+    async def test_last_modified_used_when_no_etag(self):
+        requests = []
+        modified = "Wed, 01 Oct 2025 00:00:00 GMT"
+        documents = DocumentService(client=self.make_origin(
+            requests, {"last-modified": modified, "cache-control": "no-cache"}
+        ))
+        await documents.get_document("https://example.com/a")
+        await documents.get_document("https://example.com/a")
+        assert requests[1]["if-modified-since"] == modified
+        assert documents.stats()["revalidation"]["example.com"]["not_modified"] == 1
+        await documents.close()
+
+    async def test_changed_page_reparsed(self):
+        requests = []
+        changed = [False]
+        documents = DocumentService(client=self.make_origin(
+            requests, {"etag": '"v1"', "cache-control": "max-age=0"}, changed=lambda: changed[0]
+        ))
+        first = await documents.get_document("https://example.com/a")
+        changed[0] = True
+        second = await documents.get_document("https://example.com/a")
+        assert second is not first
+        stats = documents.stats()["revalidation"]["example.com"]
+        assert stats == {"revalidations": 1, "not_modified": 0, "bytes_saved": 0, "not_modified_rate": 0.0}
+        await documents.close()
+
+    async def test_origin_max_age_served_without_request(self):
+        requests = []
+        documents = DocumentService(client=self.make_origin(requests, {"cache-control": "public, max-age=600"}))
+        await documents.get_document("https://example.com/a")
+        await documents.get_document("https://example.com/a")
+        assert len(requests) == 1
+        await documents.close()
+
+    async def test_no_store_not_cached(self):
+        requests = []
+        documents = DocumentService(client=self.make_origin(requests, {"cache-control": "no-store", "etag": '"v1"'}))
+        await documents.get_document("https://example.com/a")
+        await documents.get_document("https://example.com/a")
+        assert len(requests) == 2
+        assert "if-none-match" not in requests[1]
+        await documents.close()
+
+    def test_freshness_lifetime(self):
+        assert freshness_lifetime(httpx.Headers({"cache-control": "max-age=60"}), 300, 3600) == 60
+        assert freshness_lifetime(httpx.Headers({"cache-control": "s-maxage=10, max-age=60"}), 300, 3600) == 10
+        assert freshness_lifetime(httpx.Headers({"cache-control": "max-age=99999"}), 300, 3600) == 3600
+        assert freshness_lifetime(httpx.Headers({"expires": "0"}), 300, 3600) == 0
+        assert freshness_lifetime(httpx.Headers({}), 300, 3600) == 300
+        assert freshness_lifetime(httpx.Headers({"cache-control": "private, no-store"}), 300, 3600) is None
+
+
+class TestStreamingDownload:
+    """Test byte-capped streaming downloads"""
+
+    def make_origin(self, chunks, headers=None, served=None):
+        async def body():
+            for chunk in chunks:
+                if served is not None:
+                    served.append(len(chunk))
+                yield chunk
+
+        async def handler(request):
+            return httpx.Response(200, content=body(), headers=headers or {})
+        return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+    def long_article(self, paragraphs=2000):
+        yield b"<html><head><title>Long</title></head><body><article>"
+        for i in range(paragraphs):
+            yield f'<p>Paragraph {i} of a long article.<img src="/img/{i}.jpg"></p>'.encode()
+        yield b"</article></body></html>"
+
+    async def test_oversized_content_length_rejected(self, monkeypatch):
+        monkeypatch.setenv("DOCUMENT_MAX_BYTES", "1000")
+        served = []
+        documents = DocumentService(client=self.make_origin(
+            [b"x" * 5000], headers={"content-length": "5000"}, served=served
+        ))
+        document = await documents.get_document("https://example.com/a")
+        assert document["main_text"] == ""
+        assert documents.stats()["oversized"] == 1
+        assert served == []
+        await documents.close()
+
+    @pytest.mark.parametrize("backend", ["bs4", "stream"])
+    async def test_body_without_length_capped(self, monkeypatch, backend):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", backend)
+        monkeypatch.setenv("DOCUMENT_MAX_BYTES", "4096")
+        served = []
+        # No early stop possible: the page has no images
+        chunks = [b"<html><body><article>"] + [b"<p>filler text</p>" * 50] * 100
+        documents = DocumentService(client=self.make_origin(chunks, served=served))
+        document = await documents.get_document("https://example.com/a")
+        assert document["main_text"].startswith("filler text")
+        stats = documents.stats()
+        assert stats["truncated"] == 1
+        assert stats["bytes_read"] == 4096
+        assert len(served) < len(chunks)
+        await documents.close()
+
+    async def test_stream_backend_stops_download_early(self, monkeypatch):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", "stream")
+        served = []
+        chunks = list(self.long_article())
+        documents = DocumentService(client=self.make_origin(chunks, served=served))
+        document = await documents.get_document("https://example.com/a")
+        assert len(document["main_text"]) == 20000
+        assert len(document["images"]) == 5
+        assert documents.stats()["early_stops"] == 1
+        assert len(served) < len(chunks) / 2
+        await documents.close()
+
+    @pytest.mark.parametrize("backend", ["bs4", "stream"])
+    async def test_declared_charset_decoded_incrementally(self, monkeypatch, backend):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", backend)
+        html = "<html><head><title>台積電財報</title></head><body><article>營收創新高</article></body></html>"
+        data = html.encode("big5")
+        # Split inside multi-byte characters
+        chunks = [data[i:i + 3] for i in range(0, len(data), 3)]
+        documents = DocumentService(client=self.make_origin(
+            chunks, headers={"content-type": "text/html; charset=big5"}
+        ))
+        document = await documents.get_document("https://example.com/a")
+        assert document["title"] == "台積電財報"
+        assert document["main_text"] == "營收創新高"
+        await documents.close()
+
+
+class TestParseOffload:
+    """Test whole-page parses in the parse process pool"""
+
+    async def test_large_body_parsed_in_worker(self, monkeypatch):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", "bs4")
+        monkeypatch.setenv("DOCUMENT_PARSE_INLINE_BYTES", "0")
+        documents = DocumentService(client=make_client([]))
+        try:
+            document = await documents.get_document("https://example.com/news/1")
+            assert document == DocumentService.parse_html(ARTICLE_HTML, "https://example.com/news/1", "bs4")
+            assert documents.stats()["offloaded_parses"] == 1
+            assert executor_stats()["parse"]["completed"] == 1
+        finally:
+            await documents.close()
+            shutdown_executors(wait=True)
+
+    async def test_small_body_parsed_inline(self, monkeypatch):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", "bs4")
+        monkeypatch.setenv("DOCUMENT_PARSE_INLINE_BYTES", "1000000")
+        documents = DocumentService(client=make_client([]))
+        await documents.get_document("https://example.com/news/1")
+        assert documents.stats()["offloaded_parses"] == 0
+        await documents.close()
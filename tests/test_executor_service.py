@@ -0,0 +1,135 @@
+"""
+Test named executors and their queue metrics
+"""
+import asyncio
+import threading
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from app import app
+from services.executor_service import InstrumentedExecutor, InstrumentedProcessExecutor, get_executor
+from services.loop_monitor import EventLoopMonitor
+
+client = TestClient(app)
+
+
+class TestInstrumentedExecutor:
+    """Test executor counters"""
+
+    async def test_counts_queued_active_and_completed(self):
+        """Tasks beyond max_workers are reported as queued"""
+        executor = InstrumentedExecutor("test", max_workers=1)
+        release = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            first = loop.run_in_executor(executor, release.wait)
+            second = loop.run_in_executor(executor, lambda: 42)
+            await asyncio.sleep(0.05)
+
+            stats = executor.stats()
+            assert stats["active"] == 1
+            assert stats["queued"] == 1
+
+            release.set()
+            assert await second == 42
+            await first
+
+            stats = executor.stats()
+            assert stats["active"] == 0
+            assert stats["queued"] == 0
+            assert stats["completed"] == 2
+            assert stats["max_queue_wait_ms"] > 0
+        finally:
+            executor.shutdown(wait=True)
+
+    async def test_failed_tasks_counted(self):
+        """Exceptions propagate and are counted as failed"""
+        executor = InstrumentedExecutor("test", max_workers=1)
+        loop = asyncio.get_running_loop()
+        try:
+            with pytest.raises(ZeroDivisionError):
+                await loop.run_in_executor(executor, lambda: 1 / 0)
+            assert executor.stats()["failed"] == 1
+        finally:
+            executor.shutdown(wait=True)
+
+    async def test_cancelled_queued_task_leaves_queue(self):
+        """A task cancelled before a worker picks it up is no longer counted as queued"""
+        executor = InstrumentedExecutor("test", max_workers=1)
+        release = threading.Event()
+        loop = asyncio.get_running_loop()
+        try:
+            first = loop.run_in_executor(executor, release.wait)
+            with pytest.raises(asyncio.TimeoutError):
+                await asyncio.wait_for(loop.run_in_executor(executor, lambda: 42), timeout=0.05)
+            assert executor.stats()["queued"] == 0
+
+            release.set()
+            await first
+            stats = executor.stats()
+            assert stats["queued"] == 0
+            assert stats["completed"] == 1
+        finally:
+            release.set()
+            executor.shutdown(wait=True)
+
+    def test_named_executors_are_isolated(self):
+        """Each workload gets its own pool"""
+        assert get_executor("llm") is get_executor("llm")
+        assert get_executor("llm") is not get_executor("file_io")
+
+
+class TestInstrumentedProcessExecutor:
+    """Test process pool counters"""
+
+    async def test_counts_completed_and_failed(self):
+        executor = InstrumentedProcessExecutor("test", max_workers=1)
+        loop = asyncio.get_running_loop()
+        try:
+            assert await loop.run_in_executor(executor, abs, -3) == 3
+            with pytest.raises(TypeError):
+                await loop.run_in_executor(executor, abs, "x")
+            await asyncio.sleep(0.01)
+            stats = executor.stats()
+            assert stats["completed"] == 2
+            assert stats["failed"] == 1
+            assert stats["active"] == 0
+            assert stats["max_task_ms"] > 0
+        finally:
+            executor.shutdown(wait=True)
+
+
+class TestEventLoopMonitor:
+    """Test event-loop lag sampling"""
+
+    async def test_blocking_call_shows_as_lag(self):
+        monitor = EventLoopMonitor(interval=0.01)
+        monitor.start()
+        await asyncio.sleep(0.02)
+        time.sleep(0.05)
+        await asyncio.sleep(0.02)
+        await monitor.stop()
+        stats = monitor.stats()
+        assert stats["samples"] >= 2
+        assert stats["max_lag_ms"] >= 30
+
+    def test_disabled_with_zero_interval(self):
+        monitor = EventLoopMonitor(interval=0)
+        monitor.start()
+        assert monitor.stats()["samples"] == 0
+
+
+class TestMetricsEndpoint:
+    """Test /metrics endpoint"""
+
+    def test_metrics_requires_auth(self):
+        response = client.get("/metrics")
+        assert response.status_code == 401
+
+    def test_metrics_reports_executors(self, auth_headers):
+        get_executor("file_io")
+        response = client.get("/metrics", headers=auth_headers)
+        assert response.status_code == 200
+        assert "file_io" in response.json()["executors"]
+        assert "max_lag_ms" in response.json()["event_loop"]
@@ -0,0 +1,166 @@
+"""
+Test per-domain extraction rules and the fallback content scorer
+"""
+import json
+
+import httpx
+import pytest
+
+from services import extraction_rules
+from services.document_service import DocumentService
+from services.extraction_rules import CompiledSelector, ExtractionRules
+from services.html_extractor import EXTRACTORS, get_extractor
+
+PARAGRAPH = "<p>台積電今日公布營收，較去年同期成長三成，法人看好下半年需求，股價同步走揚。</p>"
+
+RULE_PAGE = f"""
+<html>
+<head>
+<title>Rule Page</title>
+<meta property="og:image" content="https://cdn.example.com/og.jpg">
+</head>
+<body>
+<article>Generic container text</article>
+<div class="story-body" data-role="article">
+{PARAGRAPH}
+<div class="ad">Advertisement</div> tail kept
+<img src="https://cdn.example.com/photo.jpg">
+</div>
+</body>
+</html>
+"""
+
+UNKNOWN_PAGE = f"""
+<html>
+<head><title>Unknown</title></head>
+<body>
+<div id="sidebar" class="widget">
+<p>Related links, more links, and even more links for you to click</p>
+<a href="/x">A list of links with quite long text inside of it</a>
+</div>
+<div class="story-body">{PARAGRAPH * 4}<div>Share</div></div>
+<div class="comments"><p>Great article, thanks, really, I loved it a lot!</p></div>
+</body>
+</html>
+"""
+
+
+@pytest.fixture
+def rules(monkeypatch):
+    registry = ExtractionRules({
+        "www.example.com": {
+            "content": "[data-role=article]",
+            "remove": [".ad"],
+            "images": ["img_tag"],
+            "rewrites": [[r"^https://www\.example\.com/news/", "https://m.example.com/news/"]],
+        },
+    })
+    monkeypatch.setattr(extraction_rules, "_registry", registry)
+    return registry
+
+
+class TestCompiledSelector:
+    """Test selector compilation for the three backends"""
+
+    def test_compound_selector(self):
+        selector = CompiledSelector('div.story.main#top[data-role="article"]')
+        assert selector.matches("div", {"class": "main story", "id": "top", "data-role": "article"})
+        assert not selector.matches("div", {"class": "story", "id": "top", "data-role": "article"})
+        assert not selector.matches("p", {"class": "main story", "id": "top", "data-role": "article"})
+        assert selector.xpath is not None
+
+    def test_attribute_presence(self):
+        selector = CompiledSelector("[itemprop]")
+        assert selector.matches("span", {"itemprop": "articleBody"})
+        assert not selector.matches("span", {})
+
+    @pytest.mark.parametrize("selector", ["div p", "div > p", "a:hover", "", ".a,.b"])
+    def test_unsupported_selector_rejected(self, selector):
+        with pytest.raises(ValueError):
+            CompiledSelector(selector)
+
+
+class TestExtractionRules:
+    """Test the per-domain rule registry"""
+
+    def test_rules_keyed_by_normalized_domain(self, rules):
+        assert rules.rule_for("https://m.example.com/a").domain == "example.com"
+        assert rules.rule_for("https://news.example.com/a").domain == "example.com"
+        assert rules.rule_for("https://example.org/a") is None
+
+    def test_invalid_rule_skipped(self):
+        registry = ExtractionRules({"a.com": {"content": "div > p"}, "b.com": {"images": ["gif"]}, "c.com": {}})
+        assert list(registry.rules) == ["c.com"]
+
+    def test_loaded_from_file(self, tmp_path):
+        path = tmp_path / "rules.json"
+        path.write_text(json.dumps({"cnyes.com": {"content": ["#article"]}}))
+        assert ExtractionRules.from_file(str(path)).rule_for("https://m.cnyes.com/news/1") is not None
+        assert len(ExtractionRules.from_file(str(tmp_path / "missing.json"))) == 0
+
+    def test_rewrite(self, rules):
+        rule = rules.rule_for("https://www.example.com/news/1")
+        assert rule.rewrite("https://www.example.com/news/1") == "https://m.example.com/news/1"
+        assert rule.rewrite("https://www.example.com/about") == "https://www.example.com/about"
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    def test_rule_applied_by_every_backend(self, rules, backend):
+        document = get_extractor(backend).extract(RULE_PAGE, "https://www.example.com/news/1")
+        assert document["main_text"].startswith("台積電今日公布營收")
+        assert document["main_text"].endswith("tail kept")
+        assert "Advertisement" not in document["main_text"]
+        assert "Advertisement" in document["text"]
+        assert [image["type"] for image in document["images"]] == ["img_tag", "og:image"]
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    def test_other_domains_use_generic_selectors(self, rules, backend):
+        document = get_extractor(backend).extract(RULE_PAGE, "https://example.org/news/1")
+        assert document["main_text"] == "Generic container text"
+        assert document["images"][0]["type"] == "og:image"
+
+
+class TestContentScorer:
+    """Test the readability-style fallback for pages without a known container"""
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    def test_scorer_picks_article_block(self, backend):
+        document = get_extractor(backend).extract(UNKNOWN_PAGE, "https://example.org/a")
+        assert document["main_text"].startswith("台積電今日公布營收")
+        assert document["main_text"].endswith("Share")
+        assert "Related links" not in document["main_text"]
+
+    def test_stream_matches_dom_after_early_stop(self):
+        images = "".join(f'<img src="/img/{i}.jpg">' for i in range(5))
+        html = UNKNOWN_PAGE.replace(PARAGRAPH * 4, images + PARAGRAPH * 2000)
+        data = html.encode()
+        extraction = get_extractor("stream").start("https://example.org/a")
+        assert any(extraction.feed(data[offset:offset + 4096]) for offset in range(0, len(data), 4096))
+        stream = extraction.close()
+        assert stream == get_extractor("lxml").extract(html, "https://example.org/a")
+        assert len(stream["main_text"]) == 20000
+
+
+class TestDocumentServiceRules:
+    """Test rule rewrites and per-domain extraction stats"""
+
+    async def test_rewritten_url_fetched_and_stats_recorded(self, rules):
+        requests = []
+
+        async def handler(request):
+            requests.append(str(request.url))
+            return httpx.Response(200, text=RULE_PAGE)
+
+        documents = DocumentService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        document = await documents.get_document("https://www.example.com/news/1")
+
+        assert requests == ["https://m.example.com/news/1"]
+        assert document["main_text"].startswith("台積電今日公布營收")
+        stats = documents.stats()
+        assert stats["rewritten"] == 1
+        domain = stats["extraction"]["example.com"]
+        assert domain["pages"] == 1
+        assert domain["rule"] == "example.com"
+        assert domain["avg_text_chars"] == len(document["main_text"])
+        assert domain["text_per_kib"] > 0
+        assert domain["empty"] == 0
+        await documents.close()
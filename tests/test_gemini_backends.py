@@ -0,0 +1,120 @@
+"""
+Test GeminiService call backends (native async vs executor fallback)
+"""
+import asyncio
+import time
+import pytest
+
+from services.gemini_service import GeminiService
+
+
+class FakeResponse:
+    """Minimal stand-in for a Gemini response"""
+
+    def __init__(self, text):
+        self.text = text
+
+
+class FakeAsyncStream:
+    """Async iterator over fake streamed chunks"""
+
+    def __init__(self, chunks):
+        self._chunks = iter(chunks)
+
+    def __aiter__(self):
+        return self
+
+    async def __anext__(self):
+        try:
+            return FakeResponse(next(self._chunks))
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class FakeModel:
+    """Fake GenerativeModel tracking concurrency on both code paths"""
+
+    def __init__(self, latency=0.05):
+        self.latency = latency
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.sync_calls = 0
+        self.async_calls = 0
+
+    def generate_content(self, prompt, stream=False, **kwargs):
+        self.sync_calls += 1
+        if stream:
+            return [FakeResponse("a"), FakeResponse("b")]
+        time.sleep(self.latency)
+        return FakeResponse("sync answer")
+
+    async def generate_content_async(self, prompt, stream=False, **kwargs):
+        self.async_calls += 1
+        if stream:
+            return FakeAsyncStream(["a", "b"])
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        await asyncio.sleep(self.latency)
+        self.in_flight -= 1
+        return FakeResponse("async answer")
+
+
+def make_service(monkeypatch, backend, max_concurrency="256"):
+    monkeypatch.setenv("GEMINI_BACKEND", backend)
+    monkeypatch.setenv("GEMINI_MAX_CONCURRENCY", max_concurrency)
+    service = GeminiService()
+    service.model = FakeModel()
+    return service
+
+
+class TestGeminiBackends:
+    """Test backend selection and concurrency cap"""
+
+    async def test_async_backend_uses_native_client(self, monkeypatch):
+        """Default backend awaits generate_content_async without threads"""
+        service = make_service(monkeypatch, "async")
+        result = await service.generate_answer(content="c", question="q")
+        assert result["answer"] == "async answer"
+        assert service.model.async_calls == 1
+        assert service.model.sync_calls == 0
+
+    async def test_executor_backend_fallback(self, monkeypatch):
+        """Executor backend runs the blocking client in a thread pool"""
+        service = make_service(monkeypatch, "executor")
+        result = await service.generate_answer(content="c", question="q")
+        assert result["answer"] == "sync answer"
+        assert service.model.sync_calls == 1
+        assert service.model.async_calls == 0
+
+    def test_unknown_backend_defaults_to_async(self, monkeypatch):
+        """Unknown GEMINI_BACKEND values fall back to async"""
+        service = make_service(monkeypatch, "bogus")
+        assert service.backend == "async"
+
+    async def test_concurrency_cap(self, monkeypatch):
+        """No more than GEMINI_MAX_CONCURRENCY calls are in flight"""
+        service = make_service(monkeypatch, "async", max_concurrency="3")
+        await asyncio.gather(*[
+            service.generate_answer(content="c", question="q") for _ in range(10)
+        ])
+        assert service.model.max_in_flight == 3
+
+    @pytest.mark.parametrize("backend", ["async", "executor"])
+    async def test_stream_answer_chunks(self, monkeypatch, backend):
+        """Both backends stream the same chunks"""
+        service = make_service(monkeypatch, backend)
+        chunks = [chunk async for chunk in service.stream_answer(content="c", question="q")]
+        assert chunks == ["a", "b"]
+
+    @pytest.mark.parametrize("backend", ["async", "executor"])
+    async def test_abandoned_stream_releases_slot(self, monkeypatch, backend):
+        """Closing a stream mid-way (client disconnect) frees its concurrency slot"""
+        service = make_service(monkeypatch, backend, max_concurrency="1")
+        stream = service.stream_answer(content="c", question="q")
+        assert await stream.__anext__() == "a"
+        assert service._semaphore.locked()
+        await stream.aclose()
+        assert not service._semaphore.locked()
+        # The next call is not starved
+        result = await asyncio.wait_for(service.generate_answer(content="c", question="q"), timeout=1)
+        assert result["answer"]
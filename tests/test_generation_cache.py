@@ -0,0 +1,109 @@
+"""
+Test generations shared by articles with the same content
+"""
+import asyncio
+import time
+from unittest.mock import AsyncMock
+
+import httpx
+import pytest
+
+from services.cache_service import CacheService
+from services.content_service import ContentService
+from services.content_store import MemoryContentStore
+from services.document_service import DocumentService
+from services.generation_cache import GenerationCache
+
+ARTICLE = "台積電今日公布營收，較去年同期成長三成。" * 50
+
+PAGE = "<html><head><title>Article</title></head><body><article><p>{text}</p></article></body></html>"
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    monkeypatch.setenv("CACHE_DIR", str(tmp_path))
+    monkeypatch.delenv("REDIS_URL", raising=False)
+    return tmp_path
+
+
+@pytest.fixture
+def generation_cache(cache_dir):
+    return GenerationCache(CacheService())
+
+
+class TestGenerationCache:
+    """Test content-hash keyed generation reuse"""
+
+    async def test_same_article_under_two_urls_generates_once(self, generation_cache):
+        # Both pages carry the article with different whitespace around it
+        async def handler(request):
+            padding = "\n\n" if request.url.path == "/a" else "   "
+            return httpx.Response(200, text=PAGE.format(text=padding + ARTICLE + padding))
+
+        documents = DocumentService(client=httpx.AsyncClient(transport=httpx.MockTransport(handler)))
+        content_service = ContentService(document_service=documents, store=MemoryContentStore(1 << 20, 10))
+        for content_id, url in (("id-a", "https://example.com/a"), ("id-b", "https://other.example.org/b")):
+            await content_service.save_content(content_id, await content_service.fetch_content(url), url)
+
+        generate = AsyncMock(return_value={"questions": ["q"]})
+        params = {"lang": "zh-tw", "prompt": ""}
+        for content_id in ("id-a", "id-b"):
+            content = await content_service.get_content(content_id)
+            assert await generation_cache.get_or_generate("questions", content, params, generate) == {"questions": ["q"]}
+
+        assert generate.await_count == 1
+        assert generation_cache.stats() == {"questions": {"lookups": 2, "generated": 1}}
+        await content_service.close()
+
+    @pytest.mark.parametrize("kind, params", [
+        ("tags", {"lang": "zh-tw", "prompt": ""}),
+        ("questions", {"lang": "en", "prompt": ""}),
+        ("questions", {"lang": "zh-tw", "prompt": "Ask about revenue"}),
+    ])
+    async def test_other_kind_or_params_generate_separately(self, generation_cache, kind, params):
+        base = {"lang": "zh-tw", "prompt": ""}
+        assert generation_cache.key(kind, ARTICLE, params) != generation_cache.key("questions", ARTICLE, base)
+
+        first = AsyncMock(return_value="first")
+        second = AsyncMock(return_value="second")
+        assert await generation_cache.get_or_generate("questions", ARTICLE, base, first) == "first"
+        assert await generation_cache.get_or_generate(kind, ARTICLE, params, second) == "second"
+        assert second.await_count == 1
+
+    async def test_empty_content_bypasses_cache(self, generation_cache, cache_dir):
+        generate = AsyncMock(return_value={"questions": []})
+        for _ in range(2):
+            await generation_cache.get_or_generate("questions", "", {"lang": "zh-tw"}, generate)
+        assert generate.await_count == 2
+        assert generation_cache.stats() == {}
+        assert not list(cache_dir.glob("*.json"))
+
+    async def test_endpoint_ttl_used(self, generation_cache, cache_dir):
+        cache_service = generation_cache.cache_service
+        await generation_cache.get_or_generate("answer", ARTICLE, {"query": "q"}, AsyncMock(return_value="a"), ttl=300)
+        key = generation_cache.key("answer", ARTICLE, {"query": "q"})
+        mtime = (cache_dir / f"{key}.json").stat().st_mtime
+        assert abs(mtime - (time.time() + 300 * cache_service.stale_ttl_factor)) < 5
+
+    async def test_response_refresh_regenerates_stale_generation(self, generation_cache, monkeypatch):
+        cache_service = generation_cache.cache_service
+        cache_service.xfetch_beta = 0.0  # Only soft-TTL expiry triggers refreshes here
+        versions = iter(["v1", "v2"])
+
+        async def generate():
+            return next(versions)
+
+        async def build_response():
+            # What an endpoint's build_response does around its generation
+            return await generation_cache.get_or_generate("questions", ARTICLE, {"lang": "zh-tw"}, generate, ttl=600)
+
+        assert await cache_service.get_or_compute("ai_questions", build_response, ttl=600) == "v1"
+
+        # Past the soft TTL of both the response and the generation
+        now = time.time() + 601
+        monkeypatch.setattr(time, "time", lambda: now)
+        assert await cache_service.get_or_compute("ai_questions", build_response, ttl=600) == "v1"
+        await asyncio.sleep(0.05)
+
+        assert await cache_service.get_or_compute("ai_questions", build_response, ttl=600) == "v2"
+        assert cache_service.stats()["refresh"]["nested_refreshes"] == 1
@@ -0,0 +1,129 @@
+"""
+Test that every HTML extraction backend matches the golden documents
+"""
+import json
+from pathlib import Path
+
+import pytest
+
+from services.document_service import DocumentService
+from services.html_extractor import EXTRACTORS, SoupExtractor, StreamExtractor, _TextBuffer, get_extractor
+
+PAGES_DIR = Path(__file__).parent / "fixtures" / "html"
+PAGES = sorted(path.stem for path in PAGES_DIR.glob("*.html"))
+PAGE_URL = "https://example.com/news/1"
+
+
+class TestHTMLExtractors:
+    """Test extraction backends against saved pages"""
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    @pytest.mark.parametrize("page", PAGES)
+    def test_matches_golden_document(self, backend, page):
+        html = (PAGES_DIR / f"{page}.html").read_text(encoding="utf-8")
+        expected = json.loads((PAGES_DIR / f"{page}.json").read_text(encoding="utf-8"))
+        assert get_extractor(backend).extract(html, PAGE_URL) == expected
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    @pytest.mark.parametrize("page", PAGES)
+    def test_heuristic_pass_matches_across_backends(self, backend, page):
+        html = (PAGES_DIR / f"{page}.html").read_text(encoding="utf-8")
+        expected = SoupExtractor().extract_html(html, PAGE_URL)
+        assert get_extractor(backend).extract_html(html, PAGE_URL) == expected
+
+    @pytest.mark.parametrize("backend", sorted(EXTRACTORS))
+    @pytest.mark.parametrize("html", ["", "   ", "<!-- nothing here -->"])
+    def test_empty_page(self, backend, html):
+        document = get_extractor(backend).extract(html, PAGE_URL)
+        assert document == {
+            "url": PAGE_URL, "title": "", "summary": "", "main_text": "", "text": "", "images": []
+        }
+
+    def test_backend_selected_by_env(self, monkeypatch):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", "bs4")
+        assert get_extractor().name == "bs4"
+        assert DocumentService.parse_html("<title>x</title>", PAGE_URL)["title"] == "x"
+
+    def test_unknown_backend_falls_back(self, monkeypatch):
+        monkeypatch.setenv("HTML_PARSER_BACKEND", "nope")
+        assert get_extractor().name in EXTRACTORS
+
+
+class TestStreamExtractor:
+    """Test the single-pass event-driven backend"""
+
+    def long_page(self, paragraphs=5000):
+        html = (PAGES_DIR / "cnyes_news.html").read_text(encoding="utf-8")
+        body = "".join(
+            f'<p>Paragraph {i} of a very long article.<img src="/img/{i}.jpg"></p>\n' for i in range(paragraphs)
+        )
+        return html.replace('<div class="tags">', body + '<div class="tags">')
+
+    def test_stops_early_once_budgets_are_full(self):
+        data = self.long_page().encode()
+        extraction = StreamExtractor().start(PAGE_URL)
+        chunks = range(0, len(data), 4096)
+        fed = 0
+        for offset in chunks:
+            fed += 1
+            if extraction.feed(data[offset:offset + 4096]):
+                break
+        document = extraction.close()
+        assert fed < len(chunks) / 2
+        assert len(document["main_text"]) == 20000
+        assert len(document["text"]) == 5000
+        assert len(document["images"]) == 5
+
+    def test_long_page_matches_dom_backend(self):
+        html = self.long_page()
+        assert get_extractor("stream").extract(html, PAGE_URL) == get_extractor("lxml").extract(html, PAGE_URL)
+
+    @pytest.mark.parametrize("pieces", [
+        ["a", "b", " c", "  ", "d "],
+        ["\n", "x", "\t\ty", " ", "", "z\n"],
+        ["word"] * 3,
+    ])
+    def test_text_buffer_normalizes_like_split_join(self, pieces):
+        buffer = _TextBuffer(100)
+        for piece in pieces:
+            buffer.add(piece)
+        assert buffer.text() == " ".join("".join(pieces).split())
+
+    def test_text_buffer_stops_growing_at_limit(self):
+        buffer = _TextBuffer(10)
+        for _ in range(100):
+            buffer.add("word ")
+        assert buffer.full
+        assert len(buffer.text()) < 20
+
+
+class TestStructuredData:
+    """Test the JSON-LD fast path"""
+
+    def page(self):
+        return (PAGES_DIR / "jsonld_article.html").read_text(encoding="utf-8")
+
+    def test_complete_article_skips_dom(self, monkeypatch):
+        def fail(*args):
+            raise AssertionError("DOM extraction should not run")
+        monkeypatch.setattr(SoupExtractor, "extract_html", fail)
+        document = SoupExtractor().extract(self.page(), PAGE_URL)
+        assert document["title"] == "聯發科10月營收年增18% 天璣旗艦晶片出貨暢旺"
+        assert document["images"][0]["type"] == "json_ld"
+
+    def test_stream_stops_after_json_ld_script(self):
+        data = self.page().encode()
+        head_end = data.index(b"</head>")
+        extraction = StreamExtractor().start(PAGE_URL)
+        assert extraction.feed(data[:head_end])
+        assert extraction.close()["main_text"].startswith("聯發科 (2454-TW)")
+
+    def test_short_body_uses_heuristics(self, monkeypatch):
+        monkeypatch.setenv("JSON_LD_MIN_BODY_CHARS", "10000")
+        document = SoupExtractor().extract(self.page(), PAGE_URL)
+        assert document["title"].endswith("鉅亨網 - 台股新聞")
+        assert document["images"][0]["type"] == "og:image"
+
+    def test_disabled(self, monkeypatch):
+        monkeypatch.setenv("JSON_LD_MIN_BODY_CHARS", "0")
+        assert StreamExtractor().extract(self.page(), PAGE_URL)["images"][0]["type"] == "og:image"
@@ -0,0 +1,291 @@
+"""
+Test lighter page-variant discovery, selection and savings
+"""
+import asyncio
+
+import httpx
+import pytest
+
+from services.document_service import DocumentService
+from services.page_variants import (
+    AMP_LINK, FEED_LINK, document_similarity, link_href, parse_feed, same_site, text_similarity
+)
+
+FILLER = "<script>" + "var x = 1;" * 3000 + "</script>"
+
+RSS_FEED = """<?xml version="1.0"?>
+<rss version="2.0" xmlns:content="http://purl.org/rss/1.0/modules/content/">
+<channel><title>News</title>
+{items}
+</channel></rss>
+"""
+
+
+def article_text(i, changed=False):
+    if changed:
+        return f"Story {i} is now a weather report: heavy rain and strong winds are expected across the north."
+    return f"Article {i} reports that chip demand stayed steady through the quarter, lifting supplier revenue."
+
+
+def desktop_page(i, head_links=""):
+    return (
+        f"<html><head><title>Article {i}</title>{head_links}</head>"
+        f"<body>{FILLER}<article><p>{article_text(i)}</p></article></body></html>"
+    )
+
+
+def light_page(i, changed=False):
+    return f"<html><head><title>Article {i}</title></head><body><article><p>{article_text(i, changed)}</p></article></body></html>"
+
+
+def make_client(requests, routes):
+    async def chunks(data):
+        # Arrives in pieces, like a real connection
+        for offset in range(0, len(data), 4096):
+            yield data[offset:offset + 4096]
+
+    async def handler(request):
+        url = str(request.url)
+        requests.append(url)
+        for prefix, respond in routes.items():
+            if url.startswith(prefix):
+                return httpx.Response(200, content=chunks(respond(url.rsplit("/", 1)[-1]).encode()))
+        return httpx.Response(404)
+    return httpx.AsyncClient(transport=httpx.MockTransport(handler))
+
+
+async def settle(documents):
+    while documents._background:
+        await asyncio.gather(*list(documents._background))
+
+
+@pytest.fixture(autouse=True)
+def variant_env(monkeypatch):
+    monkeypatch.setenv("VARIANT_TRIALS", "2")
+    monkeypatch.setenv("HTML_PARSER_BACKEND", "stream")
+
+
+class TestVariantHelpers:
+    """Test link discovery, text comparison and feed parsing"""
+
+    def test_link_href(self):
+        head = b"""<head><link href='/amp/1?a=1&amp;b=2' rel="amphtml">
+        <link rel="alternate" type="application/rss+xml" title="RSS" href="https://example.com/feed"></head>"""
+        assert link_href(AMP_LINK, head, "https://www.example.com/news/1") == "https://www.example.com/amp/1?a=1&b=2"
+        assert link_href(FEED_LINK, head, "https://www.example.com/news/1") == "https://example.com/feed"
+        assert link_href(AMP_LINK, b"<link rel=canonical href=/x>", "https://example.com/") is None
+
+    def test_text_similarity(self):
+        text = article_text(1)
+        assert text_similarity(text, f"Home {text} Share") == 1.0
+        assert text_similarity(text, article_text(1, changed=True)) < 0.8
+        assert text_similarity("台積電 營收 創新高", "台積電營收創新高") == 1.0
+        assert text_similarity(text, "") == 0.0
+
+    def test_same_site(self):
+        assert same_site("https://m.example.com/amp/1", "example.com")
+        assert not same_site("https://cdn.ampproject.org/c/s/example.com/amp/1", "example.com")
+
+    def test_document_similarity_covers_metadata(self):
+        page = {"title": "Article 1", "summary": "Chip demand", "main_text": article_text(1), "images": ["a.jpg"]}
+        assert document_similarity(page, {**page, "images": ["b.jpg"]}) == 1.0
+        assert document_similarity(page, {**page, "images": []}) == 0.0
+        assert document_similarity(page, {**page, "title": "Home"}) < 0.8
+        assert document_similarity(page, {**page, "summary": ""}) == 0.0
+
+    def test_parse_rss_and_atom(self):
+        rss = RSS_FEED.format(items="""
+            <item><title>One</title><link>https://www.example.com/news/1?utm_source=rss</link>
+            <description>Short</description><content:encoded><![CDATA[<p>Full body</p>]]></content:encoded></item>
+            <item><title>No body</title><link>https://www.example.com/news/2</link></item>
+        """).encode()
+        assert parse_feed(rss) == {"https://example.com/news/1": ("One", "<p>Full body</p>")}
+
+        atom = b"""<feed xmlns="http://www.w3.org/2005/Atom"><entry><title>A</title>
+            <link rel="alternate" href="https://example.com/a"/><summary>Summary</summary></entry></feed>"""
+        assert parse_feed(atom) == {"https://example.com/a": ("A", "Summary")}
+        assert parse_feed(b"not xml") == {}
+
+
+class TestVariantSelection:
+    """Test learning and serving variants through DocumentService"""
+
+    async def test_amp_variant_learned_and_preferred(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(i, f'<link rel="amphtml" href="/amp/{i}">'),
+            "https://www.example.com/amp/": light_page,
+        }))
+        for i in range(2):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        assert requests[1] == "https://www.example.com/amp/0"
+
+        requests.clear()
+        document = await documents.get_document("https://www.example.com/news/5")
+        assert document["main_text"] == article_text(5)
+        # Head probe of the page, then the AMP page
+        assert requests == ["https://www.example.com/news/5", "https://www.example.com/amp/5"]
+
+        stats = documents.stats()["variants"]["example.com"]
+        assert stats["preferred"] == "amp"
+        assert stats["variants"]["amp"] == {**stats["variants"]["amp"], "trials": 2, "served": 1}
+        assert stats["bytes_saved"] > 0
+        await documents.close()
+
+    async def test_variant_with_different_text_rejected(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(i, f'<link rel="amphtml" href="/amp/{i}">'),
+            "https://www.example.com/amp/": lambda i: light_page(i, changed=True),
+        }))
+        for i in range(3):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        # One trial, then no more AMP fetches
+        assert requests.count("https://www.example.com/amp/0") == 1
+        assert not any("/amp/1" in url or "/amp/2" in url for url in requests)
+        stats = documents.stats()["variants"]["example.com"]
+        assert stats["preferred"] == "original"
+        assert stats["variants"]["amp"]["rejected"]
+        await documents.close()
+
+    async def test_variant_losing_page_metadata_rejected(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(i, f'<link rel="amphtml" href="/amp/{i}">').replace(
+                "<article>", f'<article><img src="https://www.example.com/img/{i}.jpg">'
+            ),
+            "https://www.example.com/amp/": light_page,
+        }))
+        for i in range(3):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        # Same text, but metadata responses would lose the image
+        assert requests.count("https://www.example.com/amp/0") == 1
+        stats = documents.stats()["variants"]["example.com"]
+        assert stats["preferred"] == "original"
+        assert stats["variants"]["amp"]["rejected"]
+        await documents.close()
+
+    async def test_links_to_other_domains_ignored(self):
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(
+                i,
+                f'<link rel="amphtml" href="https://other.example.net/amp/{i}">'
+                '<link rel="alternate" type="application/rss+xml" href="https://other.example.net/feed.xml">'
+            ),
+            "https://other.example.net/": light_page,
+        }))
+        for i in range(3):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        assert not any("other.example.net" in url for url in requests)
+        assert documents.variants.domains["example.com"].feed_url is None
+        await documents.close()
+
+    async def test_variant_redirected_off_site_rejected(self, monkeypatch):
+        monkeypatch.setenv("MOBILE_VARIANT_DOMAINS", "example.com")
+        requests = []
+
+        async def handler(request):
+            url = str(request.url)
+            requests.append(url)
+            if url.startswith("https://m.example.com/"):
+                return httpx.Response(302, headers={"Location": "https://other.example.net/" + url.rsplit("/", 1)[-1]})
+            if url.startswith("https://other.example.net/"):
+                return httpx.Response(200, text=light_page(url.rsplit("/", 1)[-1]))
+            return httpx.Response(200, text=desktop_page(url.rsplit("/", 1)[-1]))
+
+        client = httpx.AsyncClient(transport=httpx.MockTransport(handler), follow_redirects=True)
+        documents = DocumentService(client=client)
+        for i in range(3):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        assert sum(url.startswith("https://m.example.com") for url in requests) == 1
+        assert documents.stats()["variants"]["example.com"]["variants"]["mobile"]["rejected"]
+        await documents.close()
+
+    async def test_feed_item_served_without_page_fetch(self):
+        requests = []
+        items = "".join(
+            f"<item><title>Article {i}</title><link>https://www.example.com/news/{i}</link>"
+            f"<description>{article_text(i)}</description></item>"
+            for i in range(10)
+        )
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(
+                i, '<link rel="alternate" type="application/rss+xml" href="/feed.xml">'
+            ),
+            "https://www.example.com/feed.xml": lambda _: RSS_FEED.format(items=items),
+        }))
+        for i in range(2):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        assert requests.count("https://www.example.com/feed.xml") == 1
+
+        requests.clear()
+        document = await documents.get_document("https://www.example.com/news/7")
+        assert document["title"] == "Article 7"
+        assert document["main_text"] == article_text(7)
+        assert requests == []
+        # Not in the feed: the page itself is fetched
+        await documents.get_document("https://www.example.com/news/42")
+        assert requests == ["https://www.example.com/news/42"]
+        assert documents.stats()["variants"]["example.com"]["preferred"] == "rss"
+        await documents.close()
+
+    async def test_known_mobile_host(self, monkeypatch):
+        monkeypatch.setenv("MOBILE_VARIANT_DOMAINS", "example.com")
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": desktop_page,
+            "https://m.example.com/news/": light_page,
+        }))
+        for i in range(2):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        requests.clear()
+        await documents.get_document("https://www.example.com/news/3")
+        assert requests == ["https://m.example.com/news/3"]
+        await documents.close()
+
+    async def test_unreachable_variant_not_retried(self, monkeypatch):
+        monkeypatch.setenv("MOBILE_VARIANT_DOMAINS", "example.com")
+        requests = []
+        documents = DocumentService(client=make_client(requests, {"https://www.example.com/news/": desktop_page}))
+        for i in range(3):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        assert sum(url.startswith("https://m.example.com") for url in requests) == 1
+        await documents.close()
+
+    async def test_verification_drops_stale_variant(self, monkeypatch):
+        monkeypatch.setenv("MOBILE_VARIANT_DOMAINS", "example.com")
+        monkeypatch.setenv("VARIANT_VERIFY_EVERY", "1")
+        changed = [False]
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": desktop_page,
+            "https://m.example.com/news/": lambda i: light_page(i, changed=changed[0]),
+        }))
+        for i in range(2):
+            await documents.get_document(f"https://www.example.com/news/{i}")
+            await settle(documents)
+        changed[0] = True
+        await documents.get_document("https://www.example.com/news/3")
+        await settle(documents)
+        assert documents.stats()["variants"]["example.com"]["preferred"] == "original"
+        await documents.close()
+
+    async def test_disabled(self, monkeypatch):
+        monkeypatch.setenv("PAGE_VARIANTS", "0")
+        requests = []
+        documents = DocumentService(client=make_client(requests, {
+            "https://www.example.com/news/": lambda i: desktop_page(i, f'<link rel="amphtml" href="/amp/{i}">'),
+        }))
+        await documents.get_document("https://www.example.com/news/1")
+        await settle(documents)
+        assert requests == ["https://www.example.com/news/1"]
+        await documents.close()
@@ -0,0 +1,100 @@
+"""
+Test in-process coalescing of identical in-flight requests
+"""
+import asyncio
+import httpx
+from unittest.mock import AsyncMock, patch
+
+from app import app
+from services.singleflight_service import SingleFlightService
+
+
+class TestSingleFlightService:
+    """Test SingleFlightService semantics"""
+
+    async def test_concurrent_calls_share_one_execution(self):
+        service = SingleFlightService()
+        calls = 0
+
+        async def work():
+            nonlocal calls
+            calls += 1
+            await asyncio.sleep(0.05)
+            return {"value": calls}
+
+        results = await asyncio.gather(*[service.do("key", work) for _ in range(10)])
+
+        assert calls == 1
+        assert all(result == {"value": 1} for result in results)
+        assert service.stats()["coalesced"] == 9
+        assert service.stats()["in_flight"] == 0
+
+    async def test_errors_propagate_and_are_not_cached(self):
+        service = SingleFlightService()
+
+        async def fail():
+            await asyncio.sleep(0.01)
+            raise ValueError("boom")
+
+        results = await asyncio.gather(
+            service.do("key", fail), service.do("key", fail), return_exceptions=True
+        )
+        assert all(isinstance(r, ValueError) for r in results)
+
+        async def succeed():
+            return "ok"
+
+        assert await service.do("key", succeed) == "ok"
+
+    async def test_cancelled_caller_does_not_cancel_shared_call(self):
+        service = SingleFlightService()
+
+        async def work():
+            await asyncio.sleep(0.05)
+            return "done"
+
+        leader = asyncio.ensure_future(service.do("key", work))
+        await asyncio.sleep(0)
+        follower = asyncio.ensure_future(service.do("key", work))
+        await asyncio.sleep(0)
+        leader.cancel()
+
+        assert await follower == "done"
+
+
+class TestEndpointCoalescing:
+    """Test endpoints coalesce identical concurrent misses"""
+
+    @patch('app.gemini_service.generate_questions', new_callable=AsyncMock)
+    @patch('app.content_service.reserve_content_id_from_url', new_callable=AsyncMock)
+    @patch('app.content_service.save_content', new_callable=AsyncMock)
+    @patch('app.cache_service.get', new_callable=AsyncMock)
+    @patch('app.cache_service.set', new_callable=AsyncMock)
+    async def test_identical_questions_requests_call_gemini_once(
+        self, mock_cache_set, mock_cache_get, mock_save_content,
+        mock_reserve_id, mock_gemini, auth_headers
+    ):
+        mock_cache_get.return_value = None
+
+        async def slow_generate(**kwargs):
+            await asyncio.sleep(0.05)
+            return {"questions": [{"text": "Shared question"}], "tokens_used": 10}
+
+        mock_gemini.side_effect = slow_generate
+        mock_reserve_id.return_value = "shared_content_id"
+
+        payload = {"inputs": {"context": "Popular article"}, "user": "test_user"}
+        transport = httpx.ASGITransport(app=app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://test") as client:
+            responses = await asyncio.gather(*[
+                client.post("/generateQuestions", json=payload, headers=auth_headers)
+                for _ in range(5)
+            ])
+
+        assert all(r.status_code == 200 for r in responses)
+        assert mock_gemini.call_count == 1
+        # One write per key: the rendered response and the generation
+        # shared by every source with the same article text
+        written = sorted(call.args[0].rsplit("_", 1)[0] for call in mock_cache_set.call_args_list)
+        assert written == ["ai_questions", "ai_questions_generation"]
+        assert len({r.json()["task_id"] for r in responses}) == 1